@@ -1,10 +1,7 @@
-import base64
-
 from django.contrib import admin
-from django.utils.html import format_html
 
-from FarmHouse_Website.forms import *
-from FarmHouse_Website.models import *
+from FarmHouse_Website.forms import BookingAdminForm, MenuAdminForm
+from FarmHouse_Website.models import Bookings, Menu, Reviews
 
 # Register your models here.
 
@@ -18,4 +15,4 @@ class MenuAdmin(admin.ModelAdmin):
 
 @admin.register(Reviews)
 class ReviewAdmin(admin.ModelAdmin):
-    pass
\ No newline at end of file
+    raw_id_fields = ['bookingId']
\ No newline at end of file
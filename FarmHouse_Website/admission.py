@@ -0,0 +1,100 @@
+"""
+Admission control for expensive work started by requests.
+
+Past its limit, a gate turns requests away with 503 and Retry-After instead
+of letting work pile up without bound:
+
+- `media_processing` counts the uploads this process has handed to the
+  compression pool and not seen finished yet (MEDIA_PROCESSING_MAX_PENDING).
+- `email` counts the PENDING emails of the outbox across processes
+  (OUTBOX_MAX_PENDING), with one bounded indexed query.
+
+A limit of 0 disables a gate.
+"""
+import threading
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from FarmHouse_Website_Backend import settings
+from . import instrumentation
+from .models import OutboundEmail
+
+ADMISSION_REJECTIONS = instrumentation.register(instrumentation.Counter(
+    'admission_rejections_total', 'Requests rejected with 503 by an admission gate.', ('gate',)))
+
+
+class Overloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The server is busy, please try again later.'
+    default_code = 'overloaded'
+
+    def __init__(self, wait, detail=None):
+        super().__init__(detail)
+        # Sent as Retry-After by DRF's exception handler
+        self.wait = wait
+
+
+class AdmissionGate:
+    """
+    Counts the units of work in flight in this process against the limit
+    in the `limit_setting` setting.
+    """
+
+    def __init__(self, name, limit_setting):
+        self.name = name
+        self.limit_setting = limit_setting
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    @property
+    def limit(self):
+        return getattr(settings, self.limit_setting)
+
+    def load(self):
+        return self._in_flight
+
+    def has_capacity(self, units=1):
+        return not self.limit or self.load() + units <= self.limit
+
+    def admit(self):
+        """
+        Raise Overloaded unless there is room for one more unit.
+        """
+        if not self.has_capacity():
+            ADMISSION_REJECTIONS.inc(gate=self.name)
+            raise Overloaded(settings.ADMISSION_RETRY_AFTER)
+
+    def try_enter(self, units=1):
+        with self._lock:
+            if not self.has_capacity(units):
+                return False
+            self._in_flight += units
+            return True
+
+    def leave(self, units=1):
+        with self._lock:
+            self._in_flight = max(self._in_flight - units, 0)
+
+
+class OutboxGate(AdmissionGate):
+
+    def __init__(self):
+        super().__init__('email', 'OUTBOX_MAX_PENDING')
+
+    def load(self):
+        # Counting stops at the limit, whatever the backlog
+        return OutboundEmail.objects.filter(status=OutboundEmail.PENDING)[:self.limit].count()
+
+
+media_processing = AdmissionGate('media_processing', 'MEDIA_PROCESSING_MAX_PENDING')
+email = OutboxGate()
+GATES = (media_processing, email)
+
+
+instrumentation.register(instrumentation.Gauge(
+    'admission_limit', 'Configured limit of an admission gate (0: disabled).', ('gate',),
+    collect=lambda: {(gate.name,): gate.limit for gate in GATES}))
+instrumentation.register(instrumentation.Gauge(
+    'admission_in_flight', 'Uploads this process has handed to the compression pool and not seen finished.',
+    ('gate',), collect=lambda: {(media_processing.name,): media_processing.load()}))
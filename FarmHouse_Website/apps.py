@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FarmhouseWebsiteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'FarmHouse_Website'
+
+    def ready(self):
+        from . import instrumentation, signals
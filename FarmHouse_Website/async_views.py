@@ -0,0 +1,208 @@
+"""
+Async versions of the read-heavy endpoints, for the ASGI application.
+
+They return the same payloads as the sync viewsets but read through the
+async ORM (`aiterator`, `afirst`, `aexists`, `aaggregate`) and stream media
+with an async iterator, so under ASGI a request waiting on the database or
+on a slow client does not hold a worker thread. They are mounted under
+NirmalFarms/api/async/; under WSGI they still work, one event loop per
+request.
+
+Listings are revalidated with ETag / Last-Modified like the viewsets but are
+not served from the response cache, and `?inline_media=` is not supported:
+clients that need the base64 payload keep using the sync endpoints.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+
+from . import availability, renderers, storage, streaming, utils
+from .filters import filter_menu
+from .mixins import build_validators, get_requested_fields, sparse_queryset, validator_aggregates
+from .models import Menu, Reviews, ReviewsMedia, ReviewsMediaVariant
+from .pagination import MenuCursorPagination, ReviewsCursorPagination
+from .serializer import MenuSerializer, ReviewsSerializer
+from .views import requested_variant, review_media_aggregates, review_queryset
+
+
+def json_response(data, status=200):
+    return HttpResponse(renderers.render_json(data), content_type='application/json', status=status)
+
+
+def set_validators(response, validators):
+    etag, last_modified = validators
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+async def get_validators(request, queryset, aggregates):
+    """
+    ETag / Last-Modified of the response, from one aggregate query over
+    `queryset` (see ConditionalGetMixin).
+    """
+    parts = await queryset.order_by().aaggregate(**aggregates)
+    return build_validators(request.get_full_path(), list(parts.values()))
+
+
+async def list_response(request, queryset, serializer_class, pagination_class, aggregates, extend=None):
+    """
+    Serialize `queryset`, paginated when the client asks for it. `extend`
+    is an async callable adding related data to the serialized rows.
+    """
+    validators = await get_validators(request, queryset, aggregates)
+    etag, last_modified = validators
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return set_validators(not_modified, validators)
+
+    paginator = pagination_class()
+    drf_request = Request(request)
+    if paginator.is_requested(request.GET):
+        # Cursor pages are cut by DRF's paginator, which only runs sync
+        instances = await sync_to_async(paginator.paginate_queryset)(queryset, drf_request)
+    else:
+        instances = [instance async for instance in queryset.aiterator()]
+
+    rows = serializer_class(instances, many=True, context={'request': drf_request}).data
+    if extend is not None:
+        await extend(request, instances, rows)
+    data = paginator.get_paginated_response(rows).data if paginator.is_requested(request.GET) else rows
+    return set_validators(json_response(data), validators)
+
+
+def wants_media(request):
+    requested_fields = get_requested_fields(request)
+    return not requested_fields or 'media_list' in requested_fields
+
+
+def review_aggregates(request):
+    aggregates = validator_aggregates()
+    if wants_media(request):
+        aggregates.update(review_media_aggregates())
+    return aggregates
+
+
+async def load_media(request, review_ids):
+    """
+    Metadata of the media of several reviews in a single query, linking to
+    the async media endpoint. Returns {review_id: [media entries]}.
+    """
+    media_map = {review_id: [] for review_id in review_ids}
+    if not media_map:
+        return media_map
+    media_entries = utils.mediaMetadataQueryset(
+        ReviewsMedia.objects.filter(reviewId__in=media_map.keys()).order_by('mediaId'))
+    async for media_entry in media_entries.aiterator():
+        media_map[media_entry.reviewId_id].append(
+            utils.mediaMetadataEntry(media_entry, request, route='async-reviews-media'))
+    return media_map
+
+
+async def add_media(request, instances, reviews):
+    if wants_media(request):
+        media_map = await load_media(request, [instance.reviewId for instance in instances])
+        for review, instance in zip(reviews, instances):
+            review['media_list'] = media_map[instance.reviewId]
+
+
+@require_safe
+async def menu_list(request):
+    try:
+        queryset = filter_menu(Menu.objects.all(), request.GET)
+    except ValidationError as exc:
+        return json_response(exc.detail, status=400)
+    queryset = sparse_queryset(queryset, get_requested_fields(request))
+    return await list_response(request, queryset, MenuSerializer, MenuCursorPagination, validator_aggregates())
+
+
+@require_safe
+async def reviews_list(request):
+    queryset = review_queryset(Reviews.objects.all(), get_requested_fields(request))
+    return await list_response(request, queryset, ReviewsSerializer, ReviewsCursorPagination,
+                               review_aggregates(request), extend=add_media)
+
+
+@require_safe
+async def review_detail(request, pk):
+    queryset = review_queryset(Reviews.objects.filter(reviewId=pk), get_requested_fields(request))
+    validators = await get_validators(request, queryset, review_aggregates(request))
+    etag, last_modified = validators
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return set_validators(not_modified, validators)
+
+    instance = await queryset.afirst()
+    if instance is None:
+        return json_response({'detail': 'Not found.'}, status=404)
+    review = ReviewsSerializer(instance, context={'request': Request(request)}).data
+    if wants_media(request):
+        review['media_list'] = (await load_media(request, [instance.reviewId]))[instance.reviewId]
+    return set_validators(json_response(review), validators)
+
+
+@require_safe
+async def review_media(request, pk, mediaId):
+    # Local file opens are quick but blocking: keep them off the event loop
+    open_blob = sync_to_async(storage.open_blob, thread_sensitive=False)
+
+    variant = requested_variant(request.GET, request.headers)
+    if variant is not None:
+        size, variant_format = variant
+        variant = await ReviewsMediaVariant.objects.filter(
+            mediaId__reviewId=pk, mediaId=mediaId, variantSize=size, variantFormat=variant_format
+        ).only('variantFile').afirst()
+        if variant is not None:
+            name = variant.variantFile.name
+            file_obj, size, etag = await open_blob(name)
+            response = streaming.media_response(request, file_obj, size, f'image/{variant_format}', etag, name,
+                                                asynchronous=True)
+            patch_vary_headers(response, ['Accept'])
+            return response
+
+    media_entry = await ReviewsMedia.objects.filter(reviewId=pk, mediaId=mediaId).afirst()
+    if media_entry is None:
+        return json_response({'detail': 'Not found.'}, status=404)
+    file_obj, size, etag = await sync_to_async(storage.open_media, thread_sensitive=False)(media_entry)
+    return streaming.media_response(request, file_obj, size, media_entry.mediaType or 'application/octet-stream',
+                                    etag, media_entry.mediaFile.name, asynchronous=True)
+
+
+@require_safe
+async def availability_view(request):
+    """
+    With ?check_in=&check_out=, whether that stay can be booked, checked
+    against the database. Otherwise the occupancy calendar of AvailabilityView.
+    """
+    check_in_date = request.GET.get('check_in')
+    check_out_date = request.GET.get('check_out')
+    if check_in_date or check_out_date:
+        if not (check_in_date and check_out_date):
+            return json_response({'error': 'Both check_in and check_out are required.'}, status=400)
+        valid, message = utils.validate_booking_dates(check_in_date, check_out_date)
+        if not valid:
+            return json_response({'error': message}, status=400)
+        conflicts = utils.booking_conflicts_queryset(check_in_date, check_out_date)
+        return json_response({'check_in': check_in_date, 'check_out': check_out_date,
+                              'available': not await conflicts.aexists()})
+
+    try:
+        start_date, end_date = availability.calendar_range(request.GET)
+    except ValueError:
+        return json_response({'error': 'Invalid date format. Please use YYYY-MM-DD.'}, status=400)
+
+    # The index is shared with the sync views and guarded by a thread lock
+    start_date, end_date, bitmap = await sync_to_async(availability.paid_stays.occupancy)(start_date, end_date)
+    etag = availability.calendar_etag(start_date, bitmap)
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponse(status=304)
+    else:
+        response = json_response(availability.calendar_payload(start_date, end_date, bitmap))
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
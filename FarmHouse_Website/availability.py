@@ -0,0 +1,203 @@
+import hashlib
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+
+from FarmHouse_Website_Backend import settings
+from .models import Bookings
+
+# Renders the occupancy bitmap as a string of '0'/'1', one character per night
+OCCUPANCY_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+
+# validate_booking_dates allows check-in up to 365 days ahead for at most 30 nights
+WINDOW_DAYS = 365 + 30 + 1
+
+
+def to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    return value
+
+
+def calendar_range(query_params):
+    """
+    The ?from= / ?to= dates of a calendar request, defaulting to the next 365
+    days. Raises ValueError on malformed dates.
+    """
+    today = date.today()
+    start_date = to_date(query_params.get('from') or today)
+    end_date = to_date(query_params.get('to') or today + timedelta(days=365))
+    return start_date, end_date
+
+
+def calendar_etag(start_date, bitmap):
+    return '"%s"' % hashlib.md5(start_date.isoformat().encode() + bitmap).hexdigest()
+
+
+def calendar_payload(start_date, end_date, bitmap):
+    return {
+        'from': start_date,
+        'to': end_date,
+        'occupancy': bitmap.translate(OCCUPANCY_DIGITS).decode('ascii'),
+        'booked': [start_date + timedelta(days=offset) for offset, booked in enumerate(bitmap) if booked],
+    }
+
+
+class PaidStayIndex:
+    """
+    In-process index of the PAID stays that overlap the bookable window.
+
+    Stays are kept sorted by check-in together with a running maximum of the
+    check-out dates, so "does anything overlap [check_in, check_out)" is a
+    bisection plus a walk over the actual conflicts. A per-day occupancy
+    count backs the availability calendar.
+
+    The Bookings save/delete signals of this process update the index
+    incrementally; BOOKING_AVAILABILITY_CACHE_TTL bounds how stale it can get
+    when another process writes bookings.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._window_start = None
+        self._window_end = None
+        self._stays_by_id = {}
+        self._occupancy = array('H')
+        self._sorted_dirty = True
+        self._stays = []
+        self._check_ins = []
+        self._max_check_outs = []
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _is_fresh(self):
+        return (self._loaded_at is not None
+                and self._window_start == date.today()
+                and time.monotonic() - self._loaded_at < settings.BOOKING_AVAILABILITY_CACHE_TTL)
+
+    def _ensure_loaded(self):
+        if self._is_fresh():
+            return
+
+        window_start = date.today()
+        window_end = window_start + timedelta(days=WINDOW_DAYS)
+        rows = (
+            Bookings.objects
+            .filter(paymentStatus="PAID", checkInDate__lt=window_end, checkOutDate__gt=window_start)
+            .values_list('bookingId', 'checkInDate', 'checkOutDate')
+        )
+
+        self._window_start = window_start
+        self._window_end = window_end
+        self._stays_by_id = {}
+        self._occupancy = array('H', bytes(2 * WINDOW_DAYS))
+        for booking_id, check_in, check_out in rows:
+            self._add(booking_id, (check_in, check_out))
+        self._sorted_dirty = True
+        self._loaded_at = time.monotonic()
+
+    def _day_offsets(self, check_in, check_out):
+        start = max((check_in - self._window_start).days, 0)
+        end = min((check_out - self._window_start).days, WINDOW_DAYS)
+        return range(start, end)
+
+    def _add(self, booking_id, stay):
+        check_in, check_out = stay
+        if check_in >= self._window_end or check_out <= self._window_start:
+            return
+        self._stays_by_id[booking_id] = stay
+        for offset in self._day_offsets(check_in, check_out):
+            self._occupancy[offset] += 1
+
+    def _remove(self, booking_id):
+        stay = self._stays_by_id.pop(booking_id, None)
+        if stay is not None:
+            for offset in self._day_offsets(*stay):
+                self._occupancy[offset] -= 1
+
+    def _ensure_sorted(self):
+        if not self._sorted_dirty:
+            return
+        stays = sorted((check_in, check_out, booking_id)
+                       for booking_id, (check_in, check_out) in self._stays_by_id.items())
+        max_check_outs = []
+        running_max = None
+        for _, check_out, _ in stays:
+            running_max = check_out if running_max is None else max(running_max, check_out)
+            max_check_outs.append(running_max)
+
+        self._stays = stays
+        self._check_ins = [stay[0] for stay in stays]
+        self._max_check_outs = max_check_outs
+        self._sorted_dirty = False
+
+    def record_saved(self, booking_id, payment_status, check_in_date, check_out_date):
+        """
+        Apply a saved booking to a loaded index without going back to the database.
+        """
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            self._remove(booking_id)
+            if payment_status == "PAID":
+                self._add(booking_id, (to_date(check_in_date), to_date(check_out_date)))
+            self._sorted_dirty = True
+
+    def record_deleted(self, booking_id):
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            self._remove(booking_id)
+            self._sorted_dirty = True
+
+    def conflicts(self, check_in_date, check_out_date, exclude_booking_id=None):
+        """
+        Return the PAID stays overlapping [check_in_date, check_out_date) ordered
+        by check-in, or None when the range is outside the indexed window.
+        """
+        check_in_date = to_date(check_in_date)
+        check_out_date = to_date(check_out_date)
+
+        with self._lock:
+            self._ensure_loaded()
+            if check_in_date < self._window_start or check_out_date > self._window_end:
+                return None
+            self._ensure_sorted()
+            stays, check_ins, max_check_outs = self._stays, self._check_ins, self._max_check_outs
+
+        conflicts = []
+        # Stays before this position start before the requested check-out
+        position = bisect_left(check_ins, check_out_date) - 1
+        while position >= 0 and max_check_outs[position] > check_in_date:
+            stay_check_in, stay_check_out, booking_id = stays[position]
+            if stay_check_out > check_in_date and booking_id != exclude_booking_id:
+                conflicts.append({'start': stay_check_in, 'end': stay_check_out})
+            position -= 1
+
+        conflicts.reverse()
+        return conflicts
+
+    def occupancy(self, start_date, end_date):
+        """
+        Return (start_date, end_date, bitmap) where bitmap holds one byte per
+        night in [start_date, end_date): 1 when a PAID stay covers it, else 0.
+        The range is clipped to the indexed window.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            start_date = max(start_date, self._window_start)
+            end_date = max(min(end_date, self._window_end), start_date)
+            start = (start_date - self._window_start).days
+            end = (end_date - self._window_start).days
+            bitmap = bytes(1 if count else 0 for count in self._occupancy[start:end])
+        return start_date, end_date, bitmap
+
+
+paid_stays = PaidStayIndex()
@@ -0,0 +1,829 @@
+"""
+Benchmark scenarios for `python manage.py benchmark <scenario>`.
+
+Every scenario receives the command options and returns a JSON-serialisable
+dict. Scenarios run against a throwaway test database, never the live one.
+"""
+import asyncio
+import io
+import itertools
+import json
+import os
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.db.models import Q
+from django.test import Client, RequestFactory
+from django.urls import reverse
+
+from rest_framework.renderers import JSONRenderer
+
+from FarmHouse_Website_Backend import settings
+from . import availability, booking_transfer, compressor, renderers, response_cache, storage, utils
+from .models import Bookings, Menu, Reviews, ReviewsMedia
+from .serializer import (BookingsSerializer, BookingsValuesSerializer, MenuSerializer, MenuValuesSerializer,
+                         ReviewsSerializer, ReviewsValuesSerializer)
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def time_call(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(samples):
+    if not samples:
+        return {'count': 0}
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(percentile(samples, 0.50), 3),
+        'p95_ms': round(percentile(samples, 0.95), 3),
+        'p99_ms': round(percentile(samples, 0.99), 3),
+        'max_ms': round(max(samples), 3),
+    }
+
+
+def summarize_queries(query_counts):
+    if not query_counts:
+        return {'count': 0}
+    return {'mean': round(statistics.fmean(query_counts), 2), 'max': max(query_counts)}
+
+
+def count_non_2xx(statuses):
+    return sum(count for status_code, count in statuses.items() if not 200 <= int(status_code) < 300)
+
+
+def seed_bookings(count, batch_size=5000, payment_status='PAID', spread_days=3650, day_step=1):
+    today = date.today()
+    Bookings.objects.bulk_create(
+        [
+            Bookings(
+                bookingDate=today,
+                checkInDate=today + timedelta(days=index % spread_days * day_step),
+                checkOutDate=today + timedelta(days=index % spread_days * day_step + 1),
+                paymentStatus=payment_status,
+                paymentType='UPI',
+                paymentAmount=10000,
+                guestName=f'Guest {index}',
+                guestEmail=f'guest{index}@example.com',
+                guestPhone=f'9{index:09d}',
+                guestAddress='Benchmark',
+                purposeOfStay='Leisure',
+            )
+            for index in range(count)
+        ],
+        batch_size=batch_size,
+    )
+
+
+# ISO base media header, so uploads sniff as video/mp4 and skip image processing
+MP4_HEADER = b'\x00\x00\x00\x18ftypmp42'
+
+
+def media_payload(size):
+    return MP4_HEADER + os.urandom(max(size - len(MP4_HEADER), 0))
+
+
+def seed_reviews(count, media_per_review=2, media_size=64 * 1024, batch_size=1000):
+    """
+    Create `count` reviews with `media_per_review` distinct media files of
+    `media_size` bytes each in the media storage. Reviews are spread over
+    the seeded bookings, if any. Returns the review ids.
+    """
+    today = date.today()
+    booking_ids = list(Bookings.objects.order_by('bookingId').values_list('bookingId', flat=True)[:count]) or [None]
+    Reviews.objects.bulk_create(
+        [
+            Reviews(bookingId_id=booking_ids[index % len(booking_ids)], reviewTitle=f'Review {index}', reviewDate=today - timedelta(days=index % 365),
+                    rating=1 + index % 5, reviewContent='Lovely stay. ' * 20)
+            for index in range(count)
+        ],
+        batch_size=batch_size,
+    )
+    # Re-read the ids: MySQL does not return them from bulk inserts
+    review_ids = list(Reviews.objects.order_by('reviewId').values_list('reviewId', flat=True))
+
+    media_entries = []
+    for review_id in review_ids:
+        for index in range(media_per_review):
+            media_file, media_size_stored = storage.save_media_bytes(media_payload(media_size))
+            media_entries.append(ReviewsMedia(reviewId_id=review_id, mediaName=f'{index}.mp4', mediaType='video/mp4',
+                                              mediaFile=media_file, mediaSize=media_size_stored))
+    ReviewsMedia.objects.bulk_create(media_entries, batch_size=batch_size)
+    return review_ids
+
+
+def seed_menu(count, batch_size=1000):
+    Menu.objects.bulk_create(
+        [
+            Menu(dishName=f'Dish {index}', dishDescription='Slow cooked. ' * 10, dishPrice=100 + index % 500,
+                 dishCategory=('Starters', 'Mains', 'Desserts')[index % 3], dishSource=('Farm', 'Local')[index % 2])
+            for index in range(count)
+        ],
+        batch_size=batch_size,
+    )
+
+
+def seed_fixtures(options):
+    # Mostly unpaid rows plus paid one-night stays on even days only, which
+    # leaves the odd nights free for bookings_create
+    seed_bookings(options['rows'], payment_status='PENDING')
+    seed_bookings(max(options['rows'] // 100, 1), spread_days=183, day_step=2)
+    review_ids = seed_reviews(options['reviews'], options['media_per_review'], options['media_size'])
+    seed_menu(options['menu_items'])
+    return review_ids
+
+
+def api_endpoints(review_ids, options):
+    """
+    Name -> callable(client) issuing one request of that kind. Creates use
+    fresh data on every call so they never conflict.
+    """
+    counter = itertools.count()
+    lock = threading.Lock()
+
+    def next_index():
+        with lock:
+            return next(counter)
+
+    def create_booking(client):
+        index = next_index()
+        check_in = date.today() + timedelta(days=1 + 2 * (index % 180))
+        return client.post(reverse('bookings-list'), {
+            'checkInDate': check_in.isoformat(),
+            'checkOutDate': (check_in + timedelta(days=1)).isoformat(),
+            # Unpaid, so creates never conflict with each other
+            'paymentStatus': 'PENDING', 'paymentType': 'UPI', 'paymentAmount': 10000,
+            'guestName': f'Load {index}', 'guestEmail': f'load{index}@example.com', 'guestPhone': '9000000000',
+            'guestAddress': 'Benchmark', 'purposeOfStay': 'Leisure',
+        })
+
+    def create_review(client):
+        return client.post(reverse('reviews-list'), {
+            'guestPhone': '9000000000', 'rating': 5, 'reviewTitle': 'Benchmark',
+            'media_list': [SimpleUploadedFile(f'{index}.mp4', media_payload(options['media_size']), 'video/mp4')
+                           for index in range(options['media_per_review'])],
+        })
+
+    def list_reviews(client):
+        return client.get(reverse('reviews-list'), {'page_size': options['page_size']})
+
+    def retrieve_review(client):
+        review_id = review_ids[next_index() % len(review_ids)]
+        return client.get(reverse('reviews-detail', kwargs={'pk': review_id}))
+
+    def list_menu(client):
+        return client.get(reverse('menu-list'))
+
+    return {
+        'bookings_create': create_booking,
+        'reviews_list': list_reviews,
+        'reviews_retrieve': retrieve_review,
+        'reviews_create': create_review,
+        'menu_list': list_menu,
+    }
+
+
+class QueryCounter:
+    """
+    connection.execute_wrapper that counts the queries of one thread.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_requests(endpoint, count, client=None, cold_cache=False):
+    """
+    Issue `count` requests; returns (latencies in ms, query counts, status counts).
+    """
+    client = client or Client()
+    latencies, query_counts, statuses = [], [], {}
+    for _ in range(count):
+        if cold_cache:
+            response_cache.get_cache().clear()
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            elapsed, response = time_call(endpoint, client)
+        latencies.append(elapsed)
+        query_counts.append(counter.count)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    return latencies, query_counts, statuses
+
+
+def measure_endpoint(endpoint, count, cold_cache=False):
+    start = time.perf_counter()
+    latencies, query_counts, statuses = run_requests(endpoint, count, cold_cache=cold_cache)
+    elapsed = time.perf_counter() - start
+
+    # tracemalloc slows every allocation down, so memory gets its own short pass
+    tracemalloc.start()
+    try:
+        run_requests(endpoint, min(count, 10), cold_cache=cold_cache)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        **summarize(latencies),
+        'throughput_rps': round(count / elapsed, 1),
+        'queries': summarize_queries(query_counts),
+        'statuses': statuses,
+        'peak_memory_bytes': peak,
+    }
+
+
+@scenario('api')
+def api_benchmark(options):
+    """
+    Latency, throughput, query count and peak traced Python memory of the main API
+    endpoints, one client, after seeding --rows bookings, --reviews reviews
+    with --media-per-review media of --media-size bytes and --menu-items dishes.
+    Listings are measured with a cold and a warm response cache.
+    """
+    review_ids = seed_fixtures(options)
+    endpoints = api_endpoints(review_ids, options)
+    repeat = options['repeat']
+
+    results = {}
+    for name, endpoint in endpoints.items():
+        if name in ('reviews_list', 'menu_list'):
+            results[f'{name}_cold'] = measure_endpoint(endpoint, repeat, cold_cache=True)
+            results[f'{name}_warm'] = measure_endpoint(endpoint, repeat)
+        else:
+            results[name] = measure_endpoint(endpoint, repeat)
+    return {'endpoints': results}
+
+
+@scenario('load')
+def load_benchmark(options):
+    """
+    Concurrent load: --concurrency threads, each with its own client and
+    database connection, issue --repeat requests of each endpoint in a
+    shuffled order. Writes need a database that allows concurrent writers
+    (MySQL, or SQLite with a file test database). Peak memory is the
+    process peak RSS reported by the command. Server errors are counted as
+    responses; a thread that dies is reported under `failed_threads`.
+    """
+    review_ids = seed_fixtures(options)
+    endpoints = api_endpoints(review_ids, options)
+    concurrency = options['concurrency']
+    per_thread = max(options['repeat'] // concurrency, 1)
+
+    samples = {name: {'latencies': [], 'queries': [], 'statuses': {}} for name in endpoints}
+    samples_lock = threading.Lock()
+    failed_threads = []
+
+    def worker(seed):
+        schedule = [name for name in endpoints for _ in range(per_thread)]
+        random.Random(seed).shuffle(schedule)
+        try:
+            # A 500 is a result to report, not an exception to die of
+            client = Client(raise_request_exception=False)
+            for name in schedule:
+                latencies, query_counts, statuses = run_requests(endpoints[name], 1, client)
+                with samples_lock:
+                    samples[name]['latencies'] += latencies
+                    samples[name]['queries'] += query_counts
+                    for status_code, count in statuses.items():
+                        samples[name]['statuses'][status_code] = samples[name]['statuses'].get(status_code, 0) + count
+        except Exception as error:
+            with samples_lock:
+                failed_threads.append({'thread': seed, 'error': repr(error)})
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(sample['latencies']) for sample in samples.values())
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 1),
+        'failed_threads': failed_threads,
+        'non_2xx': sum(count_non_2xx(sample['statuses']) for sample in samples.values()),
+        'endpoints': {
+            name: {
+                **summarize(sample['latencies']),
+                'queries': summarize_queries(sample['queries']),
+                'statuses': sample['statuses'],
+                'non_2xx': count_non_2xx(sample['statuses']),
+            }
+            for name, sample in samples.items()
+        },
+    }
+
+
+class ConnectionStats:
+    """
+    Per-connection timings of the `asgi` scenario, measured from the moment
+    every connection arrives at once.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.first_bytes = []
+        self.latencies = []
+        self.statuses = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def started(self):
+        with self.lock:
+            self.first_bytes.append((time.perf_counter() - self.origin) * 1000)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finished(self, status_code, streaming):
+        with self.lock:
+            self.latencies.append((time.perf_counter() - self.origin) * 1000)
+            self.statuses[status_code] = self.statuses.get(status_code, 0) + 1
+            if streaming:
+                self.in_flight -= 1
+
+    def report(self):
+        elapsed = (time.perf_counter() - self.origin)
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'connections_per_s': round(len(self.latencies) / elapsed, 1),
+            'max_in_flight': self.max_in_flight,
+            'time_to_first_byte': summarize(self.first_bytes),
+            'latency': summarize(self.latencies),
+            'statuses': self.statuses,
+        }
+
+
+def serve_wsgi(handler, url, stats, client_delay):
+    response_status = []
+
+    def start_response(status, headers, exc_info=None):
+        response_status.append(int(status.split()[0]))
+
+    body = handler(RequestFactory().get(url).environ, start_response)
+    started = False
+    try:
+        for chunk in body:
+            if not started:
+                stats.started()
+                started = True
+            # A slow client keeps the worker thread until it has read everything
+            time.sleep(client_delay)
+    finally:
+        body.close()
+        stats.finished(response_status[0], started)
+
+
+async def serve_asgi(application, url, stats, client_delay):
+    parts = urlsplit(url)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': parts.path, 'raw_path': parts.path.encode(), 'query_string': parts.query.encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver')], 'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    request_sent = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    response_status = []
+    started = False
+
+    async def send(message):
+        nonlocal started
+        if message['type'] == 'http.response.start':
+            response_status.append(message['status'])
+            return
+        if not started:
+            stats.started()
+            started = True
+        # Backpressure: the server's send() waits while a slow client reads
+        await asyncio.sleep(client_delay)
+
+    try:
+        await application(scope, receive, send)
+    finally:
+        disconnected.set()
+        stats.finished(response_status[0] if response_status else 500, started)
+
+
+@scenario('asgi')
+def asgi_benchmark(options):
+    """
+    Concurrent connection capacity of the WSGI and ASGI paths, in process:
+    --concurrency clients connect at once and read each response body chunk
+    with a --client-delay pause, like clients on slow links.
+
+    `wsgi` serves them with a pool of --workers threads, as a threaded WSGI
+    server would; `asgi_sync` runs the sync viewsets under the ASGI handler
+    and `asgi_async` the async views. Use a --media-size of a few
+    STREAM_CHUNK_SIZE chunks to see streams hold WSGI workers. The sync
+    listings are served from the response cache, the async ones are not.
+    For numbers
+    of a real server, run uvicorn or gunicorn against a test database and
+    point a load generator at it.
+    """
+    review_ids = seed_reviews(options['reviews'], options['media_per_review'], options['media_size'])
+    first_media = dict(ReviewsMedia.objects.order_by('-mediaId').values_list('reviewId', 'mediaId'))
+    media_keys = [{'pk': review_id, 'mediaId': first_media[review_id]} for review_id in review_ids]
+    concurrency = options['concurrency']
+    client_delay = options['client_delay']
+
+    def urls(route):
+        if route.endswith('media'):
+            return [reverse(route, kwargs=media_keys[index % len(media_keys)]) for index in range(concurrency)]
+        return [reverse(route) + '?page_size=20'] * concurrency
+
+    workloads = {'media': ('reviews-media', 'async-reviews-media'), 'listing': ('reviews-list', 'async-reviews-list')}
+    wsgi_handler = WSGIHandler()
+    asgi_handler = ASGIHandler()
+
+    def run_asgi(request_urls):
+        stats = ConnectionStats()
+
+        async def serve_all():
+            await asyncio.gather(*(serve_asgi(asgi_handler, url, stats, client_delay) for url in request_urls))
+
+        async_to_sync(serve_all)()
+        return stats.report()
+
+    results = {}
+    for workload, (sync_route, async_route) in workloads.items():
+        response_cache.get_cache().clear()
+
+        stats = ConnectionStats()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for future in [pool.submit(serve_wsgi, wsgi_handler, url, stats, client_delay) for url in urls(sync_route)]:
+                future.result()
+        results[workload] = {
+            'wsgi': stats.report(),
+            'asgi_sync': run_asgi(urls(sync_route)),
+            'asgi_async': run_asgi(urls(async_route)),
+        }
+
+    return {
+        'concurrency': concurrency,
+        'wsgi_workers': options['workers'],
+        'client_delay_s': client_delay,
+        'workloads': results,
+    }
+
+
+@scenario('connections')
+def connections_benchmark(options):
+    """
+    Per-request latency of --repeat bookings list requests through the WSGI
+    handler, whose request_finished signal closes or keeps the connection,
+    with each connection mode: a new connection per request
+    (CONN_MAX_AGE=0), persistent connections with and without health checks
+    and, with the pooled backend, the pool.
+
+    --connect-latency adds that many milliseconds to every new connection,
+    standing in for the TCP + auth handshake of a remote MySQL server. Run
+    against MySQL or a file SQLite database: in-memory SQLite connections are
+    never closed.
+    """
+    seed_bookings(200)
+    handler = WSGIHandler()
+    environ = RequestFactory().get(reverse('bookings-list'), {'page_size': 20}).environ
+    # Holding on to the connections keeps their ids unique
+    opened = {}
+
+    def simulate_handshake(sender, connection, **kwargs):
+        # Pooled connections are "created" again on every checkout
+        if id(connection.connection) not in opened:
+            opened[id(connection.connection)] = connection.connection
+            time.sleep(options['connect_latency'] / 1000)
+
+    modes = {
+        'per_request': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+        'persistent': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': False},
+        'persistent_health_checks': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True},
+    }
+    if hasattr(connection, 'get_pool'):
+        modes['pooled'] = {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': True}
+
+    original = {key: connection.settings_dict[key] for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+    results = {}
+    connection_created.connect(simulate_handshake)
+    try:
+        for mode, mode_settings in modes.items():
+            connection.close()
+            connection.settings_dict.update(mode_settings)
+            opened_before = len(opened)
+            latencies = []
+            statuses = {}
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                response = handler({**environ, 'wsgi.input': io.BytesIO()}, lambda status, headers, exc_info=None: None)
+                response.close()
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            results[mode] = {**summarize(latencies), 'connections_opened': len(opened) - opened_before,
+                             'statuses': statuses}
+    finally:
+        connection_created.disconnect(simulate_handshake)
+        connection.settings_dict.update(original)
+
+    return {'engine': connection.settings_dict['ENGINE'], 'connect_latency_ms': options['connect_latency'],
+            'modes': results}
+
+
+@scenario('transfer')
+def transfer_benchmark(options):
+    """
+    Import --rows bookings from JSON Lines (one in a thousand PAID, the
+    rest clashing with them now and then) and export the table back as
+    CSV, with the import's row rate and the export's peak traced memory.
+    """
+    today = date.today()
+    randomizer = random.Random(5)
+    lines = []
+    for index in range(options['rows']):
+        check_in = today + timedelta(days=randomizer.randrange(1, 365))
+        lines.append(json.dumps({
+            'checkInDate': check_in.isoformat(),
+            'checkOutDate': (check_in + timedelta(days=randomizer.randrange(1, 4))).isoformat(),
+            'paymentStatus': 'PAID' if index % 1000 == 0 else 'PENDING',
+            'paymentType': 'UPI', 'paymentAmount': 10000, 'guestName': f'Guest {index}',
+            'guestEmail': f'guest{index}@example.com', 'guestPhone': f'9{index:09d}', 'purposeOfStay': 'Leisure',
+        }) + '\n')
+
+    import_ms, report = time_call(booking_transfer.import_bookings, booking_transfer.read_records(lines, 'ndjson'))
+
+    tracemalloc.start()
+    try:
+        export_ms, exported = time_call(
+            lambda: sum(len(chunk) for chunk in booking_transfer.export_bookings(Bookings.objects.all(), 'csv')))
+        export_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'import': {
+            'rows': report['rows'],
+            'created': report['created'],
+            'rejected': len(report['errors']),
+            'elapsed_ms': round(import_ms, 1),
+            'rows_per_s': round(report['rows'] / (import_ms / 1000), 1),
+        },
+        'export': {
+            'rows': Bookings.objects.count(),
+            'bytes': exported,
+            'elapsed_ms': round(export_ms, 1),
+            'peak_memory_bytes': export_peak,
+        },
+    }
+
+
+SERIALIZER_PAIRS = {
+    'bookings': (Bookings, BookingsSerializer, BookingsValuesSerializer),
+    'menu': (Menu, MenuSerializer, MenuValuesSerializer),
+    'reviews': (Reviews, ReviewsSerializer, ReviewsValuesSerializer),
+}
+
+
+@scenario('serializers')
+def serializers_benchmark(options):
+    """
+    Serialize and render --rows bookings, menu items and reviews (all
+    linked to a booking) with the ModelSerializers and the `.values()` fast
+    path, each rendered by DRF's JSONRenderer and by the orjson renderer.
+    Timings cover the query, the serialization and the rendering of the
+    whole list; try --rows 10000 --repeat 10.
+    """
+    rows = options['rows']
+    seed_bookings(rows)
+    seed_menu(rows)
+    seed_reviews(rows, media_per_review=0)
+
+    json_renderers = {'drf_json': JSONRenderer(), 'orjson': renderers.FastJSONRenderer()}
+    if renderers.orjson is None:
+        del json_renderers['orjson']
+
+    results = {'rows': rows, 'orjson': renderers.orjson is not None}
+    for name, (model, serializer_class, values_serializer_class) in SERIALIZER_PAIRS.items():
+        def model_serializer():
+            queryset = model.objects.order_by('pk')
+            if model is Reviews:
+                queryset = queryset.select_related('bookingId')
+            return serializer_class(queryset, many=True).data
+
+        def values_serializer():
+            values_serializer = values_serializer_class()
+            return values_serializer.serialize(values_serializer.values(model.objects.order_by('pk')))
+
+        entry = {}
+        outputs = set()
+        for serializer_label, serialize in (('model_serializer', model_serializer), ('values', values_serializer)):
+            for renderer_label, renderer in json_renderers.items():
+                samples = []
+                for _ in range(options['repeat']):
+                    elapsed, content = time_call(lambda: renderer.render(serialize()))
+                    samples.append(elapsed)
+                outputs.add(content)
+                entry[f'{serializer_label}+{renderer_label}'] = summarize(samples)
+        entry['identical_output'] = len(outputs) == 1
+        results[name] = entry
+    return results
+
+
+@scenario('pagination')
+def pagination_benchmark(options):
+    """
+    Walk the whole bookings table with cursor pagination and report page
+    latency per depth decile. Keyset pages should cost the same at any depth.
+    """
+    rows = options['rows']
+    page_size = options['page_size']
+    seed_bookings(rows)
+
+    client = Client()
+    results = {'rows': rows, 'page_size': page_size}
+
+    for label, params in (('all_fields', {}), ('sparse_fields', {'fields': 'bookingId,checkInDate,checkOutDate'})):
+        deciles = [[] for _ in range(10)]
+        url = reverse('bookings-list')
+        query = {'page_size': page_size, **params}
+        pages = 0
+        while url:
+            elapsed, response = time_call(client.get, url, query)
+            query = None
+            deciles[min(9, pages * page_size * 10 // rows)].append(elapsed)
+            url = response.json()['next']
+            pages += 1
+        results[label] = {
+            'pages': pages,
+            'by_depth_decile': [summarize(samples) for samples in deciles],
+        }
+
+    elapsed, _ = time_call(client.get, reverse('bookings-list'))
+    results['unpaginated_list_ms'] = round(elapsed, 3)
+    return results
+
+
+def legacy_conflicts(check_in_date, check_out_date):
+    # The three-branch OR query check_booking_availability used to run
+    return list(Bookings.objects.filter(
+        Q(paymentStatus="PAID") &
+        (
+            (Q(checkInDate__gte=check_in_date) & Q(checkInDate__lt=check_out_date)) |
+            (Q(checkOutDate__gt=check_in_date) & Q(checkOutDate__lte=check_out_date)) |
+            (Q(checkInDate__lte=check_in_date) & Q(checkOutDate__gte=check_out_date))
+        )
+    ).order_by('checkInDate').values_list('checkInDate', 'checkOutDate'))
+
+
+@scenario('availability')
+def availability_benchmark(options):
+    """
+    Compare the legacy OR query, the single overlap predicate and the
+    in-process PAID stay index on random stays within the bookable window.
+    """
+    rows = options['rows']
+    repeat = options['repeat']
+    # Mostly non-PAID rows, like a real table full of abandoned checkouts
+    seed_bookings(rows, payment_status='PENDING', spread_days=3650)
+    seed_bookings(max(rows // 100, 1), spread_days=365)
+
+    today = date.today()
+    randomizer = random.Random(0)
+    stays = []
+    for _ in range(repeat):
+        check_in = today + timedelta(days=randomizer.randrange(365))
+        stays.append((check_in, check_in + timedelta(days=randomizer.randrange(1, 8))))
+
+    def run(func):
+        return summarize([time_call(func, check_in, check_out)[0] for check_in, check_out in stays])
+
+    availability.paid_stays.invalidate()
+    index_load_ms, _ = time_call(availability.paid_stays.conflicts, today, today + timedelta(days=1))
+
+    return {
+        'rows': rows,
+        'queries': repeat,
+        'legacy_or_query': run(legacy_conflicts),
+        'overlap_query': run(utils.query_booking_conflicts),
+        'index_load_ms': round(index_load_ms, 3),
+        'paid_stay_index': run(availability.paid_stays.conflicts),
+    }
+
+
+def generate_image(width, height, image_format, mode='RGB', orientation=None, quality=98):
+    """
+    Photo-like test image: a colour gradient with sensor-like noise, which
+    compresses about as badly as a real photo.
+    """
+    from PIL import Image
+
+    gradient = Image.linear_gradient('L').resize((width, height))
+    channels = [gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), Image.effect_noise((width, height), 64)]
+    noise = Image.effect_noise((width, height), 48)
+    image = Image.blend(Image.merge('RGB', channels), Image.merge('RGB', [noise] * 3), 0.35)
+    if mode != 'RGB':
+        image = image.convert(mode)
+
+    output = io.BytesIO()
+    save_kwargs = {'quality': quality} if image_format == 'JPEG' else {}
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        save_kwargs['exif'] = exif
+    image.save(output, format=image_format, **save_kwargs)
+    return output.getvalue()
+
+
+IMAGE_CORPUS = {
+    'jpeg_12mp': lambda: generate_image(4000, 3000, 'JPEG'),
+    'jpeg_24mp_rotated': lambda: generate_image(6000, 4000, 'JPEG', orientation=6),
+    'jpeg_40mp': lambda: generate_image(7744, 5184, 'JPEG'),
+    'png_rgba_8mp': lambda: generate_image(3264, 2448, 'PNG', mode='RGBA'),
+}
+
+
+def legacy_compress_image(image_bytes, max_size, max_quality=95, min_quality=10):
+    # compressImageWithBestQuality before the rework: re-decodes every step,
+    # float midpoints, never downscales
+    from PIL import Image
+
+    low, high = min_quality, max_quality
+    best_output = None
+    while low <= high:
+        mid = (low + high) / 2
+        input_image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+        output_image = io.BytesIO()
+        input_image.save(output_image, format='JPEG', quality=int(mid), optimize=True)
+        if output_image.tell() <= max_size:
+            best_output = output_image.getvalue()
+            low = mid + 1
+        else:
+            high = mid - 1
+    return best_output
+
+
+@scenario('compression')
+def compression_benchmark(options):
+    """
+    Encode time and output size of the image compressor over a generated
+    corpus, against the legacy algorithm.
+    """
+    max_size = options['max_size'] or settings.MAX_UPLOAD_SIZE()
+    results = {'max_size': max_size, 'images': {}}
+
+    for name, factory in IMAGE_CORPUS.items():
+        image_bytes = factory()
+        entry = {'input_bytes': len(image_bytes)}
+        for label, func in (('legacy', legacy_compress_image), ('current', compressor.compressImageWithBestQuality)):
+            elapsed, output = time_call(func, image_bytes, max_size=max_size)
+            entry[label] = {
+                'ms': round(elapsed, 1),
+                'output_bytes': len(output) if output else None,
+            }
+        results['images'][name] = entry
+
+    return results
@@ -0,0 +1,218 @@
+"""
+Bulk export and import of bookings as CSV or JSON Lines.
+
+Exports are generated in keyset-ordered chunks, so memory stays flat however
+large the table is. Imports validate every row like the booking API does,
+check availability against an in-memory calendar of the whole batch (PAID
+stays already booked plus the PAID rows accepted so far) and insert the
+valid rows with chunked bulk_create under the stay locks of the batch.
+"""
+import csv
+import json
+from array import array
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from . import availability, locking, utils
+from .models import Bookings
+
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_CHUNK_SIZE = 1000
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+FILE_EXTENSIONS = {'.csv': CSV, '.ndjson': NDJSON, '.jsonl': NDJSON}
+
+BOOKING_FIELDS = {field.name: field for field in Bookings._meta.concrete_fields}
+# Every column but the bookkeeping timestamp; imports always create new rows
+EXPORT_FIELDS = [name for name in BOOKING_FIELDS if name != 'updatedAt']
+IMPORT_FIELDS = [name for name in EXPORT_FIELDS if name != 'bookingId']
+
+
+class Echo:
+    """
+    File-like object handing back what csv.writer writes, so rows can be
+    yielded one by one.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    # Keyset chunks rather than .iterator(): mysqlclient buffers a whole
+    # result set on the client, server-side cursor or not
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(bookingId__gt=last_pk).order_by('bookingId')
+                    .values_list(*EXPORT_FIELDS)[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][0]
+
+
+def export_bookings(queryset, export_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the bookings of `queryset` as CSV (with a header row) or JSON
+    Lines, one string per chunk of rows.
+    """
+    writer = csv.writer(Echo())
+    if export_format == CSV:
+        yield writer.writerow(EXPORT_FIELDS)
+
+    lines = []
+    for row in iter_export_rows(queryset, chunk_size):
+        if export_format == CSV:
+            lines.append(writer.writerow(row))
+        else:
+            lines.append(json.dumps(dict(zip(EXPORT_FIELDS, row)), cls=DjangoJSONEncoder) + '\n')
+        if len(lines) == chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def detect_format(file_name):
+    """
+    The import format of a file by its extension, or None when unsupported.
+    """
+    for extension, import_format in FILE_EXTENSIONS.items():
+        if file_name.lower().endswith(extension):
+            return import_format
+    return None
+
+
+def read_records(lines, import_format):
+    """
+    Yield one dict per row of CSV (with a header row) or JSON Lines text.
+    Malformed JSON lines are yielded as the raw line, to be reported by
+    clean_record.
+    """
+    if import_format == CSV:
+        yield from csv.DictReader(lines)
+        return
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line
+
+
+def clean_record(record):
+    """
+    Validate one imported row. Returns (booking, None) with an unsaved
+    Bookings instance, or (None, errors) mapping field names to messages.
+    """
+    if not isinstance(record, dict):
+        return None, {'non_field_errors': ['Not a JSON object.']}
+
+    values = {}
+    errors = {}
+    for name in IMPORT_FIELDS:
+        raw_value = record.get(name)
+        if raw_value is None or raw_value == '':
+            continue
+        try:
+            values[name] = BOOKING_FIELDS[name].clean(raw_value, None)
+        except ValidationError as exc:
+            errors[name] = exc.messages
+    for name in ('checkInDate', 'checkOutDate'):
+        if name not in values and name not in errors:
+            errors[name] = ['This field is required.']
+    if errors:
+        return None, errors
+
+    valid, message = utils.validate_booking_dates(values['checkInDate'], values['checkOutDate'])
+    if not valid:
+        return None, {'non_field_errors': [message]}
+
+    values.setdefault('bookingDate', date.today())
+    return Bookings(**values), None
+
+
+class StayCalendar:
+    """
+    Interval set of the PAID stays between two dates, kept as one slot per
+    night holding the stay that covers it. Checking or adding a stay costs
+    one step per night, whatever the number of stays.
+    """
+
+    def __init__(self, start_date, end_date):
+        self.start_date = start_date
+        self.stays = [None]
+        self.nights = array('l', [0]) * max((end_date - start_date).days, 0)
+
+    def _offsets(self, check_in_date, check_out_date):
+        start = max((check_in_date - self.start_date).days, 0)
+        end = min((check_out_date - self.start_date).days, len(self.nights))
+        return range(start, end)
+
+    def add(self, check_in_date, check_out_date):
+        self.stays.append((check_in_date, check_out_date))
+        for offset in self._offsets(check_in_date, check_out_date):
+            self.nights[offset] = len(self.stays) - 1
+
+    def conflicts(self, check_in_date, check_out_date):
+        """
+        The stays overlapping [check_in_date, check_out_date), in the shape
+        of utils.check_booking_availability.
+        """
+        stay_indexes = dict.fromkeys(self.nights[offset] for offset in self._offsets(check_in_date, check_out_date))
+        return [{'start': start, 'end': end}
+                for start, end in (self.stays[index] for index in stay_indexes if index)]
+
+
+def import_bookings(records, dry_run=False, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Validate and insert bookings from an iterable of dicts. Rows that fail
+    validation or overlap a PAID stay (booked, or earlier in the batch) are
+    skipped and reported; the others are inserted together.
+
+    No confirmation emails are queued: imported bookings were confirmed by
+    the channel they came from. Returns {'rows', 'valid', 'created',
+    'errors'}, each error being {'row': <1-based row number>, 'errors': {...}}.
+    """
+    candidates = []
+    errors = []
+    row_count = 0
+    for row_count, record in enumerate(records, start=1):
+        booking, row_errors = clean_record(record)
+        if row_errors:
+            errors.append({'row': row_count, 'errors': row_errors})
+        else:
+            candidates.append((row_count, booking))
+
+    accepted = []
+    if candidates:
+        start_date = min(booking.checkInDate for _, booking in candidates)
+        end_date = max(booking.checkOutDate for _, booking in candidates)
+        # Holds off API bookings on these nights until the batch is in
+        with locking.locked_stay(start_date, end_date):
+            calendar = StayCalendar(start_date, end_date)
+            for check_in, check_out in utils.booking_conflicts_queryset(start_date, end_date) \
+                    .values_list('checkInDate', 'checkOutDate'):
+                calendar.add(check_in, check_out)
+
+            for row_number, booking in candidates:
+                conflicts = calendar.conflicts(booking.checkInDate, booking.checkOutDate)
+                if conflicts:
+                    errors.append({'row': row_number, 'errors': {'conflicts': conflicts}})
+                    continue
+                accepted.append(booking)
+                if booking.paymentStatus == 'PAID':
+                    calendar.add(booking.checkInDate, booking.checkOutDate)
+
+            if accepted and not dry_run:
+                Bookings.objects.bulk_create(accepted, batch_size=chunk_size)
+                # bulk_create sends no post_save to keep the index current
+                transaction.on_commit(availability.paid_stays.invalidate)
+
+    errors.sort(key=lambda error: error['row'])
+    return {'rows': row_count, 'created': 0 if dry_run else len(accepted), 'valid': len(accepted), 'errors': errors}
@@ -1,27 +1,192 @@
 import io
-from PIL import Image
+import logging
+import os
+import subprocess
+import tempfile
+
 from FarmHouse_Website_Backend import settings
 
-def compressImageWithBestQuality(image_bytes, max_quality=95, min_quality=10):
+# PIL and imageio-ffmpeg are imported by the functions using them: they add
+# tens of milliseconds to every cold start, and only the compression workers
+# ever need them.
+
+logger = logging.getLogger(__name__)
+
+# Longest edge kept once a photo has to be downscaled to fit
+MAX_IMAGE_DIMENSION = 4096
+MIN_IMAGE_DIMENSION = 320
+# Each downscale step shrinks a little more than the size estimate asks for
+DOWNSCALE_HEADROOM = 0.9
+
+# Responsive derivatives: size name -> longest edge, largest first
+IMAGE_VARIANT_SIZES = {
+    'full': 2048,
+    'medium': 1024,
+    'thumb': 320,
+}
+IMAGE_VARIANT_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+
+def _flatten(image):
+    """
+    JPEG has no alpha channel: composite transparent images onto white.
+    """
+    from PIL import Image
+
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    if image.mode != 'RGB':
+        return image.convert('RGB')
+    return image
 
-    print("input size : ", len(image_bytes))
 
-    low = min_quality
-    high = max_quality
-    best_output = None
+def _open_image(source):
+    """
+    Open image bytes, or a file path without reading the file into memory.
+    """
+    from PIL import Image
 
-    while low <= high :
+    return Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
 
-        mid = (low + high)/2
 
-        input_image = Image.open(io.BytesIO(image_bytes))
-        output_image = io.BytesIO()
-        input_image.save(output_image, format='JPEG', quality=int(mid), optimize=True)
+def _encode(image, quality, optimize=False):
+    output_image = io.BytesIO()
+    image.save(output_image, format='JPEG', quality=quality, optimize=optimize)
+    return output_image
 
-        if output_image.tell() <= settings.MAX_UPLOAD_SIZE() :
-            best_output = output_image.getvalue()
+
+def _best_quality(image, max_size, min_quality, max_quality):
+    """
+    Binary search the highest integer quality whose JPEG fits in max_size.
+    Returns None when even min_quality is too big.
+    """
+    best_quality = None
+    low, high = min_quality, max_quality
+
+    while low <= high:
+        mid = (low + high) // 2
+        if _encode(image, mid).tell() <= max_size:
+            best_quality = mid
             low = mid + 1
-        else :
+        else:
             high = mid - 1
 
-    return best_output
+    return best_quality
+
+
+def compressImageWithBestQuality(source, max_quality=95, min_quality=10, max_size=None):
+    """
+    Re-encode an image, given as bytes or a file path, as the best quality JPEG that fits in max_size
+    (MAX_UPLOAD_SIZE by default). The quality search runs at full resolution
+    first; only when even min_quality does not fit is the image downscaled,
+    to MAX_IMAGE_DIMENSION or less. The source is decoded once; EXIF
+    orientation is applied and transparency is flattened onto white.
+    Returns None if nothing fits.
+    """
+    from PIL import Image, ImageOps
+
+    max_size = max_size or settings.MAX_UPLOAD_SIZE()
+    image = _flatten(ImageOps.exif_transpose(_open_image(source)))
+    logger.debug('compressing %dx%d image', *image.size)
+
+    while True:
+        smallest = _encode(image, min_quality).tell()
+        if smallest <= max_size:
+            quality = _best_quality(image, max_size, min_quality + 1, max_quality) or min_quality
+            # optimize only ever makes the file smaller, so the search result still fits
+            return _encode(image, quality, optimize=True).getvalue()
+
+        if min(image.size) <= MIN_IMAGE_DIMENSION:
+            return None
+
+        # JPEG size grows roughly with the pixel count
+        width, height = image.size
+        scale = min((max_size / smallest) ** 0.5 * DOWNSCALE_HEADROOM, MAX_IMAGE_DIMENSION / max(width, height))
+        image = image.resize((max(int(width * scale), 1), max(int(height * scale), 1)), Image.LANCZOS)
+
+
+def buildImageVariants(source):
+    """
+    Render the responsive derivatives of an image, given as bytes or a file
+    path: every size in
+    IMAGE_VARIANT_SIZES as WebP plus a JPEG fallback. Images are never upscaled.
+    Returns a list of (size, format, width, height, bytes).
+    """
+    from PIL import Image, ImageOps
+
+    image = _open_image(source)
+    largest = max(IMAGE_VARIANT_SIZES.values())
+    if max(image.size) > largest:
+        image.draft('RGB', (largest, largest))
+    image = _flatten(ImageOps.exif_transpose(image))
+
+    variants = []
+    # Each size is resized from the previous one, which is cheaper than from the original
+    for size_name, dimension in IMAGE_VARIANT_SIZES.items():
+        image.thumbnail((dimension, dimension), Image.LANCZOS)
+        for format_name, save_options in IMAGE_VARIANT_FORMATS.items():
+            output_image = io.BytesIO()
+            image.save(output_image, **save_options)
+            variants.append((size_name, format_name, image.width, image.height, output_image.getvalue()))
+
+    return variants
+
+
+def compressVideo(video_bytes=None, max_size=None, audio_bitrate=96000, max_width=1280, path=None):
+    """
+    Re-encode a video to H.264/AAC with a bitrate chosen so the output fits
+    in `max_size` bytes, using the ffmpeg binary shipped with imageio-ffmpeg.
+    ffmpeg reads the file at `path` when given, otherwise `video_bytes`
+    written to a temporary file.
+    Returns the compressed bytes, or None if it cannot be made small enough.
+    """
+    import imageio_ffmpeg
+
+    max_size = max_size or settings.MAX_UPLOAD_SIZE()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        source_path = path or os.path.join(workdir, 'source')
+        output_path = os.path.join(workdir, 'output.mp4')
+        if path is None:
+            with open(source_path, 'wb') as source:
+                source.write(video_bytes)
+
+        # The first item yielded by read_frames is the stream metadata
+        reader = imageio_ffmpeg.read_frames(source_path)
+        try:
+            duration = next(reader).get('duration') or 0
+        finally:
+            reader.close()
+        if duration <= 0:
+            return None
+
+        # Leave headroom for the container and for the encoder overshooting
+        budget_bits = max_size * 8 * 0.9
+        for _ in range(3):
+            video_bitrate = max(int(budget_bits / duration) - audio_bitrate, 50000)
+            subprocess.run(
+                [
+                    imageio_ffmpeg.get_ffmpeg_exe(), '-y', '-loglevel', 'error',
+                    '-i', source_path,
+                    '-vf', f"scale='min({max_width},iw)':-2",
+                    '-c:v', 'libx264', '-preset', 'veryfast',
+                    '-b:v', str(video_bitrate), '-maxrate', str(video_bitrate), '-bufsize', str(2 * video_bitrate),
+                    '-c:a', 'aac', '-b:a', str(audio_bitrate),
+                    '-movflags', '+faststart',
+                    output_path,
+                ],
+                check=True,
+                capture_output=True,
+            )
+            if os.path.getsize(output_path) <= max_size:
+                with open(output_path, 'rb') as output:
+                    return output.read()
+            budget_bits *= 0.8
+
+    return None
@@ -0,0 +1,17 @@
+"""
+MySQL backend drawing its connections from FarmHouse_Website.db.pool.
+Use ENGINE 'FarmHouse_Website.db.mysql_pooled' with a POOL setting.
+"""
+from django.db.backends.mysql import base
+
+from ..pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+
+    def pooled_connection_is_usable(self, connection):
+        try:
+            connection.ping()
+        except base.Database.Error:
+            return False
+        return True
@@ -0,0 +1,144 @@
+"""
+Process-wide database connection pool.
+
+Django keeps one connection per thread and, with CONN_MAX_AGE, reuses it
+across that thread's requests. Servers that run requests on many short-lived
+or numerous threads (ASGI's sync_to_async executors, thread-per-request
+servers) still open a connection per thread. A pool caps the connections a
+process holds on the database and hands closed ones over to the next thread
+instead of reconnecting.
+
+Configure it with a `POOL` entry in the database settings:
+
+    'POOL': {'SIZE': 10, 'TIMEOUT': 10, 'MAX_LIFETIME': 240}
+
+SIZE bounds the open connections, TIMEOUT is how long a thread waits for a
+free one and MAX_LIFETIME recycles connections before the server's
+wait_timeout drops them. Use it with CONN_MAX_AGE = 0, as the settings do
+whenever DB_POOL_SIZE > 0: a connection then returns to the pool at the end
+of each request instead of staying with its thread.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """
+    A bounded set of DB-API connections. `acquire()` hands out an idle
+    connection, or opens a new one while fewer than `size` are out;
+    `release()` puts it back.
+    """
+
+    def __init__(self, size, timeout=10, max_lifetime=None):
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        # Most recently used last: the warmest connection is reused first
+        self._idle = deque()
+        self._opened_at = {}
+
+    def acquire(self, connect, is_usable=None):
+        if not self._slots.acquire(timeout=self.timeout):
+            logger.warning('connection pool exhausted: %s connections in use', self.size)
+            raise PoolTimeout(f'No database connection became free within {self.timeout}s.')
+        try:
+            while True:
+                with self._lock:
+                    connection = self._idle.pop() if self._idle else None
+                if connection is None:
+                    connection = connect()
+                    self._opened_at[id(connection)] = time.monotonic()
+                    return connection
+                if not self._expired(connection) and (is_usable is None or is_usable(connection)):
+                    return connection
+                self._discard(connection)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection, reusable=True):
+        try:
+            if reusable and not self._expired(connection):
+                with self._lock:
+                    self._idle.append(connection)
+            else:
+                self._discard(connection)
+        finally:
+            self._slots.release()
+
+    def close_idle(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection in idle:
+            self._discard(connection)
+
+    def stats(self):
+        with self._lock:
+            return {'size': self.size, 'open': len(self._opened_at), 'idle': len(self._idle)}
+
+    def _expired(self, connection):
+        opened_at = self._opened_at.get(id(connection))
+        return (self.max_lifetime is not None and opened_at is not None
+                and time.monotonic() - opened_at >= self.max_lifetime)
+
+    def _discard(self, connection):
+        self._opened_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            logger.debug('could not close a pooled connection', exc_info=True)
+
+
+def get_pool(alias, options):
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(options.get('SIZE', 10), options.get('TIMEOUT', 10),
+                                           options.get('MAX_LIFETIME'))
+        return _pools[alias]
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Makes a backend's DatabaseWrapper take its connections from the pool
+    and return them on close() instead of disconnecting. Backends implement
+    `pooled_connection_is_usable()` to health-check idle connections when
+    CONN_HEALTH_CHECKS is on.
+    """
+
+    def get_pool(self):
+        return get_pool(self.alias, self.settings_dict.get('POOL', {}))
+
+    def pooled_connection_is_usable(self, connection):
+        return True
+
+    def get_new_connection(self, conn_params):
+        connect = super().get_new_connection
+        is_usable = self.pooled_connection_is_usable if self.settings_dict['CONN_HEALTH_CHECKS'] else None
+        return self.get_pool().acquire(lambda: connect(conn_params), is_usable)
+
+    def _close(self):
+        if self.connection is None:
+            return
+        reusable = not self.errors_occurred
+        if reusable and not self.get_autocommit():
+            # Never hand an open transaction to the next thread
+            try:
+                self.connection.rollback()
+            except Exception:
+                reusable = False
+        self.get_pool().release(self.connection, reusable)
@@ -0,0 +1,53 @@
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+def split_values(raw_value):
+    return [value.strip() for value in raw_value.split(',') if value.strip()]
+
+
+def parse_price(query_params, name):
+    raw_value = query_params.get(name)
+    if not raw_value:
+        return None
+    try:
+        return int(raw_value)
+    except ValueError:
+        raise ValidationError({name: ['A whole number is required.']})
+
+
+def filter_menu(queryset, query_params):
+    """
+    Narrow the menu to ?category= and ?source= (comma-separated, exact),
+    ?min_price= / ?max_price= (inclusive) and ?search= (a substring of the
+    dish name or description). Raises ValidationError on malformed prices.
+    """
+    categories = split_values(query_params.get('category', ''))
+    if categories:
+        queryset = queryset.filter(dishCategory__in=categories)
+    sources = split_values(query_params.get('source', ''))
+    if sources:
+        queryset = queryset.filter(dishSource__in=sources)
+
+    min_price = parse_price(query_params, 'min_price')
+    if min_price is not None:
+        queryset = queryset.filter(dishPrice__gte=min_price)
+    max_price = parse_price(query_params, 'max_price')
+    if max_price is not None:
+        queryset = queryset.filter(dishPrice__lte=max_price)
+
+    search = query_params.get('search', '').strip()
+    if search:
+        # A few hundred dishes at most, narrowed by the indexed filters above
+        queryset = queryset.filter(Q(dishName__icontains=search) | Q(dishDescription__icontains=search))
+    return queryset
+
+
+class MenuFilter(BaseFilterBackend):
+    """
+    Server-side menu filters, see filter_menu.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        return filter_menu(queryset, request.query_params)
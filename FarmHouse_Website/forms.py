@@ -1,7 +1,7 @@
 from django import forms
 
-from FarmHouse_Website import compressor
-from FarmHouse_Website.models import *
+from FarmHouse_Website import media_processing
+from FarmHouse_Website.models import Bookings, Menu
 from FarmHouse_Website_Backend import settings
 
 
@@ -19,11 +19,9 @@ class BookingAdminForm(forms.ModelForm):
         if uploaded_file:
             uploaded_bytes = uploaded_file.read()
             if len(uploaded_bytes) >= settings.MAX_UPLOAD_SIZE():
-                if uploaded_file.name.endswith(".jpg"):
-                    uploaded_bytes = compressor.compressImageWithBestQuality(uploaded_bytes)
-                elif uploaded_file.name.endswith(".mp4"):
-                    uploaded_bytes = compressor.compressVideo(uploaded_bytes)
-                    instance.IDimage = uploaded_bytes
+                uploaded_bytes = media_processing.compress_media(
+                    uploaded_bytes, media_processing.sniff_media_type(uploaded_bytes[:media_processing.SNIFF_LENGTH]))
+                instance.IDimage = uploaded_bytes
             commit = True
         if commit:
             instance.save()
@@ -43,7 +41,8 @@ class MenuAdminForm(forms.ModelForm):
         if uploaded_file:
             uploaded_bytes = uploaded_file.read()
             if len(uploaded_bytes) >= settings.MAX_UPLOAD_SIZE():
-                uploaded_bytes = compressor.compressImageWithBestQuality(uploaded_bytes)
+                uploaded_bytes = media_processing.compress_media(
+                    uploaded_bytes, media_processing.sniff_media_type(uploaded_bytes[:media_processing.SNIFF_LENGTH]))
                 instance.dishImage = uploaded_bytes
             commit = True
         if commit:
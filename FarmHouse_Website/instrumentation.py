@@ -0,0 +1,325 @@
+"""
+Request metrics and request-scoped logging.
+
+`InstrumentationMiddleware` times every request, counts its database
+queries through an execute wrapper installed on every database connection
+and records the response size, under both WSGI and ASGI;
+code paths time their own phases (serialization, compression, email) with
+`phase()`. Everything is exposed in the Prometheus text format at /metrics.
+
+Metrics live in process memory: each worker process exposes its own.
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+from FarmHouse_Website_Backend import settings
+
+logger = logging.getLogger(__name__)
+
+request_id_var = contextvars.ContextVar('request_id', default='-')
+_request_stats = contextvars.ContextVar('request_stats', default=None)
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with labels, rendered in the Prometheus text format.
+    """
+
+    def __init__(self, name, documentation, labelnames, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, '')) for label in self.labelnames)
+        # Bucket i counts values <= buckets[i]; the last slot is +Inf
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.get(key, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._series[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((key, list(counts), total) for key, (counts, total) in self._series.items())
+        for key, counts, total in series:
+            labels = format_labels(self.labelnames, key)
+            separator = ',' if labels else ''
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}{separator}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return '\n'.join(lines)
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labelnames, key):
+    return ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(labelnames, key))
+
+
+class Counter:
+    """
+    Monotonic counter with labels, rendered in the Prometheus text format.
+    """
+    metric_type = 'counter'
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(label, '')) for label in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return sorted(self._values.items())
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        for key, value in self.samples():
+            lines.append(f'{self.name}{{{format_labels(self.labelnames, key)}}} {value}')
+        return '\n'.join(lines)
+
+
+class Gauge(Counter):
+    """
+    Value read at scrape time from `collect`, which returns
+    {label values tuple: value}.
+    """
+    metric_type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames, collect):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def samples(self):
+        return sorted((tuple(str(value) for value in key), value) for key, value in self.collect().items())
+
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Wall time of a request.',
+                             ('view', 'action', 'method', 'status'))
+REQUEST_QUERIES = Histogram('http_request_db_queries', 'Database queries run by a request.',
+                            ('view', 'action'), QUERY_COUNT_BUCKETS)
+REQUEST_DB_DURATION = Histogram('http_request_db_duration_seconds', 'Time a request spent in database queries.',
+                                ('view', 'action'))
+RESPONSE_SIZE = Histogram('http_response_size_bytes', 'Bytes sent in a response body.',
+                          ('view', 'action'), SIZE_BUCKETS)
+PHASE_DURATION = Histogram('phase_duration_seconds',
+                           'Time spent in an instrumented phase: serialization, compression, email.',
+                           ('phase',))
+
+REGISTRY = [REQUEST_DURATION, REQUEST_QUERIES, REQUEST_DB_DURATION, RESPONSE_SIZE, PHASE_DURATION]
+
+
+def register(metric):
+    """
+    Add a metric defined in another module to /metrics.
+    """
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics():
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+
+
+@contextmanager
+def phase(name):
+    """
+    Time a block as `name`: observed in phase_duration_seconds and added to
+    the current request's log line.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        PHASE_DURATION.observe(elapsed, phase=name)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats['phases'][name] = stats['phases'].get(name, 0.0) + elapsed
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Adds `request_id` to every log record, '-' outside of a request.
+    """
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class InstrumentationMiddleware:
+    """
+    Assigns a request ID (taken from X-Request-ID when valid), records the
+    request metrics and logs one line per request; slow requests at WARNING.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_id, stats, tokens = self.begin(request)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            return self.finish(request, response, request_id, stats, start)
+        finally:
+            self.end(tokens)
+
+    async def __acall__(self, request):
+        request_id, stats, tokens = self.begin(request)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            return self.finish(request, response, request_id, stats, start)
+        finally:
+            self.end(tokens)
+
+    def begin(self, request):
+        incoming_id = request.headers.get(REQUEST_ID_HEADER, '')
+        request_id = incoming_id if REQUEST_ID_PATTERN.match(incoming_id) else uuid.uuid4().hex
+        stats = {'view': '', 'action': '', 'queries': 0, 'db_seconds': 0.0, 'phases': {}}
+        tokens = request_id_var.set(request_id), _request_stats.set(stats)
+        return request_id, stats, tokens
+
+    def finish(self, request, response, request_id, stats, start):
+        response[REQUEST_ID_HEADER] = request_id
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def end(self, tokens):
+        request_id_token, stats_token = tokens
+        _request_stats.reset(stats_token)
+        request_id_var.reset(request_id_token)
+
+    def record(self, request, response, stats, elapsed):
+        labels = {'view': stats['view'], 'action': stats['action']}
+        REQUEST_DURATION.observe(elapsed, method=request.method, status=response.status_code, **labels)
+        REQUEST_QUERIES.observe(stats['queries'], **labels)
+        REQUEST_DB_DURATION.observe(stats['db_seconds'], **labels)
+
+        log_fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 1),
+            'queries': stats['queries'],
+            'db_ms': round(stats['db_seconds'] * 1000, 1),
+            **labels,
+            **{f'{name}_ms': round(seconds * 1000, 1) for name, seconds in stats['phases'].items()},
+        }
+        if response.streaming:
+            count = acount_streamed_bytes if response.is_async else count_streamed_bytes
+            response.streaming_content = count(response.streaming_content, labels)
+        else:
+            RESPONSE_SIZE.observe(len(response.content), **labels)
+            log_fields['bytes'] = len(response.content)
+
+        level = logging.WARNING if elapsed >= settings.SLOW_REQUEST_SECONDS else logging.INFO
+        logger.log(level, 'request %s', ' '.join(f'{key}={value}' for key, value in log_fields.items()),
+                   extra={'request_id': request_id_var.get()})
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = _request_stats.get()
+        if stats is None:
+            return None
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        stats['view'] = view_class.__name__ if view_class else getattr(view_func, '__name__', '')
+        # DRF viewsets map HTTP methods to actions (list, retrieve, media, ...)
+        actions = getattr(view_func, 'actions', None) or {}
+        stats['action'] = actions.get(request.method.lower(), request.method.lower())
+        return None
+
+
+def time_query(execute, sql, params, many, context):
+    # Attributed through the context, which sync_to_async carries over to the
+    # threads running the async ORM
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats['queries'] += 1
+        stats['db_seconds'] += time.perf_counter() - start
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # Connections are per thread, and the async ORM queries from worker threads
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def count_streamed_bytes(chunks, labels):
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        RESPONSE_SIZE.observe(size, **labels)
+
+
+async def acount_streamed_bytes(chunks, labels):
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        RESPONSE_SIZE.observe(size, **labels)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Requires `Authorization: Bearer <METRICS_TOKEN>`
+    when METRICS_TOKEN is set.
+    """
+    if settings.METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {settings.METRICS_TOKEN}':
+        return HttpResponse(status=403)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,78 @@
+import threading
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+
+from django.db import OperationalError, connection, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import BookingDateLock
+
+# MySQL's ER_LOCK_DEADLOCK and ER_LOCK_WAIT_TIMEOUT: InnoDB gave up on the
+# statement rather than make it wait any longer
+LOCK_CONFLICT_ERRORS = (1213, 1205)
+
+# Fallback for databases without SELECT ... FOR UPDATE (SQLite): SQLite has a
+# single writer anyway, so booking writes of this process take turns on one
+# lock, and the SQLite settings open transactions with BEGIN IMMEDIATE so
+# writers of other processes wait for the database lock instead of failing.
+_write_lock = threading.Lock()
+
+
+class StayContended(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'These dates are being booked right now, please try again.'
+    default_code = 'stay_contended'
+
+
+def is_lock_conflict(error):
+    return bool(error.args) and error.args[0] in LOCK_CONFLICT_ERRORS
+
+
+def stay_nights(check_in_date, check_out_date):
+    nights = (check_out_date - check_in_date).days
+    return [check_in_date + timedelta(days=offset) for offset in range(max(nights, 1))]
+
+
+def seed_nights(nights):
+    """
+    Make sure every night has its lock row, in autocommit and before the
+    locking transaction: INSERT IGNORE takes shared locks on the rows it
+    finds, and two stays holding those while waiting for each other's
+    exclusive locks would deadlock. Nights that already have a row, which
+    is most of them once the calendar has been booked, insert nothing.
+    """
+    existing = set(BookingDateLock.objects.filter(date__in=nights).values_list('date', flat=True))
+    missing = [BookingDateLock(date=night) for night in nights if night not in existing]
+    if missing:
+        BookingDateLock.objects.bulk_create(missing, ignore_conflicts=True)
+
+
+@contextmanager
+def locked_stay(check_in_date, check_out_date):
+    """
+    Open a transaction holding an exclusive lock on every night of the stay.
+    Locks are always taken in date order, so two overlapping stays cannot
+    deadlock; the second one waits until the first commits. Without row
+    locks, every stay waits for the process-wide write lock instead.
+
+    Should the database still give up on a lock (deadlock or lock wait
+    timeout), the transaction is rolled back and StayContended answers 409.
+    """
+    nights = stay_nights(check_in_date, check_out_date)
+
+    try:
+        with ExitStack() as stack:
+            if connection.features.has_select_for_update:
+                seed_nights(nights)
+            else:
+                stack.enter_context(_write_lock)
+
+            stack.enter_context(transaction.atomic())
+            if connection.features.has_select_for_update:
+                list(BookingDateLock.objects.select_for_update().filter(date__in=nights).order_by('date'))
+            yield
+    except OperationalError as error:
+        if is_lock_conflict(error):
+            raise StayContended() from error
+        raise
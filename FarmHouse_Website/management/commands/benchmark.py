@@ -0,0 +1,107 @@
+import json
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+from contextlib import contextmanager
+
+import django
+from django.conf import settings as django_settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from FarmHouse_Website.benchmarks import SCENARIOS
+from FarmHouse_Website_Backend import settings
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextmanager
+def write_limits_disabled():
+    """
+    Turn the throttles and admission gates off: the scenarios replay writes
+    from one client far faster than any rate allows, and would otherwise
+    time 429 and 503 responses.
+    """
+    saved = dict(settings.THROTTLE_RATES), settings.MEDIA_PROCESSING_MAX_PENDING, settings.OUTBOX_MAX_PENDING
+    settings.THROTTLE_RATES.update(dict.fromkeys(settings.THROTTLE_RATES))
+    settings.MEDIA_PROCESSING_MAX_PENDING = settings.OUTBOX_MAX_PENDING = 0
+    try:
+        yield
+    finally:
+        settings.THROTTLE_RATES.update(saved[0])
+        settings.MEDIA_PROCESSING_MAX_PENDING, settings.OUTBOX_MAX_PENDING = saved[1:]
+
+
+class Command(BaseCommand):
+    help = 'Run a benchmark scenario against a throwaway test database and print the results as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument('--rows', type=int, default=100000, help='Number of seeded bookings.')
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=200, help='Number of timed operations.')
+        parser.add_argument('--max-size', type=int, default=None,
+                            help='Compression target in bytes (defaults to MAX_UPLOAD_SIZE).')
+        parser.add_argument('--reviews', type=int, default=1000, help='Number of seeded reviews.')
+        parser.add_argument('--media-per-review', type=int, default=2)
+        parser.add_argument('--media-size', type=int, default=64 * 1024, help='Bytes per seeded media file.')
+        parser.add_argument('--menu-items', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Threads of the load scenario, simultaneous connections of the asgi scenario.')
+        parser.add_argument('--workers', type=int, default=4, help='WSGI worker threads of the asgi scenario.')
+        parser.add_argument('--client-delay', type=float, default=0.005,
+                            help='Seconds a simulated client of the asgi scenario spends reading each chunk.')
+        parser.add_argument('--connect-latency', type=float, default=0,
+                            help='Milliseconds added to each new database connection by the connections scenario.')
+        parser.add_argument('--output', help='Also write the results to this JSON file, to compare commits.')
+
+    def handle(self, *args, **options):
+        # Seeded media goes to a scratch directory, never to MEDIA_BLOB_ROOT
+        media_root = tempfile.mkdtemp(prefix='benchmark-media-')
+        media_storages = {
+            **django_settings.STORAGES,
+            'media_blobs': {**django_settings.STORAGES['media_blobs'], 'OPTIONS': {'location': media_root}},
+        }
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(STORAGES=media_storages), write_limits_disabled():
+                result = SCENARIOS[options['scenario']](options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        report = {
+            'scenario': options['scenario'],
+            'revision': git_revision(),
+            'timestamp': timezone.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'options': {key: options[key] for key in (
+                'rows', 'page_size', 'repeat', 'max_size', 'reviews', 'media_per_review', 'media_size',
+                'menu_items', 'concurrency', 'workers', 'client_delay', 'connect_latency')},
+            # ru_maxrss is in kilobytes on Linux
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'result': result,
+        }
+        output = json.dumps(report, indent=2, default=str)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output)
+        self.stdout.write(output)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from FarmHouse_Website import media_processing, storage
+
+
+class Command(BaseCommand):
+    help = ('Delete stored media files that no review media or variant points to any more, such as raw uploads '
+            'replaced by their compressed version.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='File names checked per query.')
+        parser.add_argument('--grace-seconds', type=int,
+                            help='Keep files written or reused this recently (MEDIA_BLOB_GRACE_SECONDS by default).')
+
+    def handle(self, *args, **options):
+        checked = deleted = 0
+        batch = []
+        for name in storage.stored_names():
+            batch.append(name)
+            if len(batch) == options['batch_size']:
+                deleted += len(media_processing.delete_unreferenced_files(batch, options['grace_seconds']))
+                checked += len(batch)
+                batch = []
+                self.stdout.write(f'checked={checked} deleted={deleted}')
+        deleted += len(media_processing.delete_unreferenced_files(batch, options['grace_seconds']))
+        checked += len(batch)
+        self.stdout.write(f'done checked={checked} deleted={deleted}')
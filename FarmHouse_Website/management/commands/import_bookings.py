@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from FarmHouse_Website import booking_transfer
+
+
+class Command(BaseCommand):
+    help = 'Import bookings from a CSV or JSON Lines file, reporting the rows that were rejected.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=[booking_transfer.CSV, booking_transfer.NDJSON],
+                            help='Defaults to the file extension.')
+        parser.add_argument('--dry-run', action='store_true', help='Validate without inserting anything.')
+        parser.add_argument('--chunk-size', type=int, default=booking_transfer.IMPORT_CHUNK_SIZE,
+                            help='Rows per INSERT.')
+
+    def handle(self, *args, **options):
+        import_format = options['format'] or booking_transfer.detect_format(options['path'])
+        if import_format is None:
+            raise CommandError('Cannot tell the format from the file name, pass --format.')
+
+        with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+            report = booking_transfer.import_bookings(booking_transfer.read_records(lines, import_format),
+                                                      options['dry_run'], options['chunk_size'])
+
+        for error in report['errors']:
+            self.stderr.write(json.dumps(error, cls=DjangoJSONEncoder))
+        self.stdout.write(f"rows={report['rows']} valid={report['valid']} created={report['created']} "
+                          f"errors={len(report['errors'])}")
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from FarmHouse_Website import storage
+from FarmHouse_Website.models import ReviewsMedia, ReviewsMediaVariant
+
+
+class Command(BaseCommand):
+    help = 'Move review media still stored in the database into the media storage.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Rows whose blobs are loaded into memory at a time.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        moved = 0
+        last_id = 0
+
+        while True:
+            # Walk by primary key so each batch is an index range scan and
+            # only batch_size blobs are ever held in memory
+            media_entries = list(
+                ReviewsMedia.objects.filter(mediaId__gt=last_id, mediaFile='')
+                .exclude(media=b'')
+                .order_by('mediaId')
+                .only('mediaId', 'media')[:batch_size]
+            )
+            if not media_entries:
+                break
+
+            for media_entry in media_entries:
+                name, size = storage.save_media_bytes(bytes(media_entry.media))
+                # Only clear the blob if nobody moved it meanwhile
+                ReviewsMedia.objects.filter(mediaId=media_entry.mediaId, mediaFile='') \
+                    .update(mediaFile=name, mediaSize=size, media=b'')
+                moved += 1
+            last_id = media_entries[-1].mediaId
+            self.stdout.write(f'moved={moved} last_id={last_id}')
+
+        # Variants rendered before the move have no file; they are cheap to render again
+        dropped, _ = ReviewsMediaVariant.objects.filter(variantFile='').delete()
+        if dropped:
+            self.stdout.write(f'dropped {dropped} variants without a file; '
+                              f'run `process_media --backfill-variants` to render them again.')
+        self.stdout.write(f'done moved={moved}')
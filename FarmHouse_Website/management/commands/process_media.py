@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from FarmHouse_Website import media_processing, response_cache
+from FarmHouse_Website.models import ReviewsMedia
+
+
+class Command(BaseCommand):
+    help = 'Compress review media that is still PENDING.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once no media is pending.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep when nothing is pending.')
+        parser.add_argument('--reset-processing', action='store_true',
+                            help='Requeue media left PROCESSING by a worker that died. '
+                                 'Only use when no other worker is running.')
+        parser.add_argument('--backfill-variants', action='store_true',
+                            help='Requeue processed images that have no responsive variants yet.')
+
+    def handle(self, *args, **options):
+        if options['reset_processing']:
+            requeued = ReviewsMedia.objects.filter(processingStatus=ReviewsMedia.PROCESSING) \
+                .update(processingStatus=ReviewsMedia.PENDING, updatedAt=timezone.now())
+            self.stdout.write(f'requeued={requeued}')
+            response_cache.invalidate('reviews')
+
+        if options['backfill_variants']:
+            requeued = ReviewsMedia.objects.filter(mediaType__in=media_processing.IMAGE_TYPES, processingStatus=ReviewsMedia.DONE, variants__isnull=True) \
+                .update(processingStatus=ReviewsMedia.PENDING, updatedAt=timezone.now())
+            self.stdout.write(f'requeued={requeued}')
+            response_cache.invalidate('reviews')
+
+        while True:
+            pending_ids = list(ReviewsMedia.objects.filter(processingStatus=ReviewsMedia.PENDING)
+                               .order_by('mediaId').values_list('mediaId', flat=True)[:100])
+            for media_id in pending_ids:
+                if media_processing.process_media(media_id):
+                    self.stdout.write(f'processed media {media_id}')
+
+            if not pending_ids:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from FarmHouse_Website import startup
+
+
+class Command(BaseCommand):
+    help = ('Time django.setup() and the URLconf import in fresh interpreters, break the import time down '
+            'by package and print the results as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help='Number of timed cold starts.')
+        parser.add_argument('--top', type=int, default=15, help='Number of packages in the import breakdown.')
+        parser.add_argument('--check', action='store_true',
+                            help='Fail when startup is over STARTUP_BUDGET_MS or imports a STARTUP_LAZY_MODULES '
+                                 'module.')
+        parser.add_argument('--output', help='Also write the results to this JSON file, to compare commits.')
+
+    def handle(self, *args, **options):
+        report = startup.profile(repeat=options['repeat'], top=options['top'])
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output)
+        self.stdout.write(output)
+
+        problems = startup.budget_problems(report)
+        if options['check'] and problems:
+            raise CommandError('; '.join(problems))
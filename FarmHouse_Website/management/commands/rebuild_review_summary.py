@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from FarmHouse_Website import response_cache, review_summary
+
+
+class Command(BaseCommand):
+    help = 'Recompute the review rating summary from the reviews, after writes that bypass the model signals.'
+
+    def handle(self, *args, **options):
+        summary = review_summary.rebuild()
+        response_cache.invalidate('reviews')
+        payload = review_summary.summary_payload(summary)
+        self.stdout.write(f"count={payload['count']} average={payload['average']}")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from FarmHouse_Website import response_cache
+from FarmHouse_Website.models import Bookings, Reviews
+
+
+class Command(BaseCommand):
+    help = ('Unlink reviews whose bookingId points at no booking. Run between making Reviews.bookingId '
+            'nullable and adding its foreign key constraint, which dangling ids would make fail.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only count the dangling reviews.')
+
+    def handle(self, *args, **options):
+        dangling = Reviews.objects.filter(bookingId__isnull=False) \
+            .exclude(bookingId__in=Bookings.objects.values('bookingId'))
+        if options['dry_run']:
+            self.stdout.write(f'dangling={dangling.count()}')
+            return
+
+        unlinked = dangling.update(bookingId=None)
+        if unlinked:
+            response_cache.invalidate('reviews')
+        self.stdout.write(f'unlinked={unlinked}')
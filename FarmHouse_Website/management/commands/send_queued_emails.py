@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from FarmHouse_Website import outbox
+from FarmHouse_Website_Backend import settings
+
+
+class Command(BaseCommand):
+    help = 'Send the emails queued in the outbox, retrying failures with exponential backoff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once no email is due.')
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=settings.OUTBOX_POLL_INTERVAL,
+                            help='Seconds to sleep when the outbox is empty.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = outbox.drain(batch_size=options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'sent={sent} failed={failed}')
+
+            # Keep draining while there is a backlog
+            if sent + failed < options['batch_size']:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
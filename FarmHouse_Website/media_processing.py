@@ -0,0 +1,302 @@
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from functools import partial
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from FarmHouse_Website_Backend import settings
+from . import admission, compressor, instrumentation, response_cache, storage
+from .models import ReviewsMedia, ReviewsMediaVariant
+
+IMAGE_TYPES = ('image/jpeg', 'image/png', 'image/webp')
+VIDEO_TYPES = ('video/mp4', 'video/quicktime')
+JPEG_MAGIC = b'\xff\xd8\xff'
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+# Major brands (bytes 8-12 of an ISO base media file) of the videos we take.
+# Other brands share the container but not the content: HEIC/AVIF images,
+# M4A audio, 3GP, ...
+FTYP_BRANDS = {
+    b'isom': 'video/mp4', b'iso2': 'video/mp4', b'mp41': 'video/mp4', b'mp42': 'video/mp4',
+    b'avc1': 'video/mp4', b'M4V ': 'video/mp4', b'qt  ': 'video/quicktime',
+}
+# Leading bytes sniff_media_type needs to tell every supported type apart
+SNIFF_LENGTH = 12
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class MediaProcessingError(Exception):
+    pass
+
+
+def sniff_media_type(header):
+    """
+    Identify media from its leading bytes instead of trusting the file name
+    or the client's content type. Returns one of IMAGE_TYPES or VIDEO_TYPES,
+    or None when the content is not supported.
+    """
+    if header.startswith(JPEG_MAGIC):
+        return 'image/jpeg'
+    if header.startswith(PNG_MAGIC):
+        return 'image/png'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    if header[4:8] == b'ftyp':
+        return FTYP_BRANDS.get(header[8:12])
+    return None
+
+
+def is_image(media_type):
+    return media_type in IMAGE_TYPES
+
+
+def compress_media(source, media_type):
+    """
+    Shrink an upload under MAX_UPLOAD_SIZE according to its type. `source` is
+    its bytes or the path of a local file holding it, which images and videos
+    are read from without loading the file into memory.
+    Pure function of its arguments so it can run in a worker process.
+    Returns None when the media could not be compressed enough.
+    """
+    in_file = isinstance(source, str)
+    if not in_file and len(source) < settings.MAX_UPLOAD_SIZE():
+        return source
+
+    if media_type in IMAGE_TYPES:
+        return compressor.compressImageWithBestQuality(source)
+    if media_type in VIDEO_TYPES:
+        return compressor.compressVideo(path=source) if in_file else compressor.compressVideo(source)
+    if in_file:
+        with open(source, 'rb') as media_file:
+            return media_file.read()
+    return source
+
+
+def process_media_source(source, media_type, media_size):
+    """
+    Compress an upload, given as bytes or a local file path (see
+    compress_media), and render its responsive variants.
+    Runs in a worker process. Returns {'media': bytes, or None when the
+    upload is kept as is, 'variants': [(size, format, width, height, bytes)]}.
+    """
+    media = None
+    if media_size >= settings.MAX_UPLOAD_SIZE():
+        media = compress_media(source, media_type)
+        if media is None:
+            raise MediaProcessingError('Could not compress media under the size limit.')
+
+    variants = compressor.buildImageVariants(source) if is_image(media_type) else []
+    return {'media': media, 'variants': variants}
+
+
+def process_stored_media(source, media_type):
+    """
+    process_media_source on an upload in the media storage, with the results
+    written back to it. Runs in a worker process: only file names cross the
+    process boundary, never the upload, and ffmpeg and PIL read the stored
+    file by path. `source` is a stored file name, or the bytes of a legacy
+    blob. Returns {'media': (name, size, type) or None,
+    'variants': [(size, format, width, height, name)]}.
+    """
+    if isinstance(source, str):
+        with storage.local_path(source) as path:
+            result = process_media_source(path, media_type, os.path.getsize(path))
+    else:
+        result = process_media_source(source, media_type, len(source))
+
+    media = None
+    if result['media'] is not None:
+        # Images come back as JPEG, videos as MP4, whatever was uploaded
+        output_type = sniff_media_type(result['media'][:SNIFF_LENGTH]) or media_type
+        media = (*storage.save_media_bytes(result['media']), output_type)
+    variants = [(size, variant_format, width, height, storage.save_media_bytes(data)[0])
+                for size, variant_format, width, height, data in result['variants']]
+    return {'media': media, 'variants': variants}
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Imported here: multiprocessing is only needed once an upload arrives
+            from concurrent.futures import ProcessPoolExecutor
+            _executor = ProcessPoolExecutor(max_workers=settings.MEDIA_PROCESSING_WORKERS)
+        return _executor
+
+
+def claim(media_id):
+    """
+    Move a media row from PENDING to PROCESSING. Only one caller can win.
+    """
+    claimed = ReviewsMedia.objects.filter(
+        mediaId=media_id, processingStatus=ReviewsMedia.PENDING
+    ).update(processingStatus=ReviewsMedia.PROCESSING, updatedAt=timezone.now()) == 1
+    if claimed:
+        # Queryset updates send no signals; the status is part of review listings
+        response_cache.invalidate_on_commit('reviews')
+    return claimed
+
+
+def store_result(media_id, result=None, error=None):
+    media_entries = ReviewsMedia.objects.filter(mediaId=media_id)
+    if error is not None:
+        # Keep the raw upload so nothing is lost; it can be reprocessed later
+        media_entries.update(processingStatus=ReviewsMedia.FAILED, processingError=str(error),
+                             updatedAt=timezone.now())
+        response_cache.invalidate_on_commit('reviews')
+        return
+
+    updates = {'processingStatus': ReviewsMedia.DONE, 'processingError': '', 'updatedAt': timezone.now()}
+    replaced = []
+    if result['media'] is not None:
+        updates['mediaFile'], updates['mediaSize'], updates['mediaType'] = result['media']
+        updates['media'] = b''
+        replaced = list(media_entries.values_list('mediaFile', flat=True))
+
+    variants = [
+        ReviewsMediaVariant(mediaId_id=media_id, variantSize=size, variantFormat=variant_format,
+                            width=width, height=height, variantFile=name)
+        for size, variant_format, width, height, name in result['variants']
+    ]
+    with transaction.atomic():
+        ReviewsMediaVariant.objects.filter(mediaId=media_id).delete()
+        ReviewsMediaVariant.objects.bulk_create(variants)
+        media_entries.update(**updates)
+        response_cache.invalidate_on_commit('reviews')
+        # The raw upload; the old variants' files go through post_delete
+        transaction.on_commit(partial(delete_unreferenced_files, replaced), robust=True)
+
+
+def delete_unreferenced_files(names, grace_seconds=None):
+    """
+    Delete the stored files among `names` that no ReviewsMedia or
+    ReviewsMediaVariant row points to and that were not written or reused in
+    the last MEDIA_BLOB_GRACE_SECONDS. Identical content shares one file, so
+    a file only goes with its last reference. Returns the deleted names.
+    """
+    names = {name for name in names if name}
+    if not names:
+        return []
+    referenced = set(ReviewsMedia.objects.filter(mediaFile__in=names).values_list('mediaFile', flat=True))
+    referenced.update(ReviewsMediaVariant.objects.filter(variantFile__in=names).values_list('variantFile', flat=True))
+
+    grace = timedelta(seconds=settings.MEDIA_BLOB_GRACE_SECONDS if grace_seconds is None else grace_seconds)
+    media_storage = storage.get_media_storage()
+    deleted = []
+    for name in sorted(names - referenced):
+        try:
+            if timezone.now() - media_storage.get_modified_time(name) < grace:
+                continue
+        except FileNotFoundError:
+            continue
+        media_storage.delete(name)
+        deleted.append(name)
+    if deleted:
+        logger.info('deleted %d unreferenced media files', len(deleted))
+    return deleted
+
+
+def load_raw_media(media_id):
+    """
+    Where the upload of a media row lives, without reading a stored file:
+    (stored file name or legacy blob bytes, media type, size).
+    """
+    media_entry = ReviewsMedia.objects.only('mediaFile', 'mediaSize', 'mediaType').get(mediaId=media_id)
+    if media_entry.mediaFile:
+        name = media_entry.mediaFile.name
+        return name, media_entry.mediaType, media_entry.mediaSize or storage.get_media_storage().size(name)
+    media_bytes = storage.read_media(media_entry)
+    return media_bytes, media_entry.mediaType, len(media_bytes)
+
+
+def finish_if_trivial(media_id, media_size, media_type):
+    """
+    Mark small non-image uploads as DONE without rewriting the blob:
+    there is nothing to compress and no variant to render.
+    """
+    if media_size >= settings.MAX_UPLOAD_SIZE() or is_image(media_type):
+        return False
+    ReviewsMedia.objects.filter(mediaId=media_id).update(processingStatus=ReviewsMedia.DONE, updatedAt=timezone.now())
+    response_cache.invalidate_on_commit('reviews')
+    return True
+
+
+def process_media(media_id):
+    """
+    Claim and process one media row in the current process.
+    Returns False when another worker already owns it.
+    """
+    if not claim(media_id):
+        return False
+
+    try:
+        source, media_type, media_size = load_raw_media(media_id)
+        if finish_if_trivial(media_id, media_size, media_type):
+            return True
+        with instrumentation.phase('media_processing'):
+            result = process_stored_media(source, media_type)
+    except Exception as e:
+        logger.exception('could not process media %s', media_id)
+        store_result(media_id, error=e)
+    else:
+        store_result(media_id, result)
+    return True
+
+
+def _store_future_result(media_id, submitted_at, future):
+    # Queueing included: how long an upload waits for its variants
+    instrumentation.PHASE_DURATION.observe(time.perf_counter() - submitted_at, phase='media_processing')
+    try:
+        store_result(media_id, future.result())
+    except Exception as e:
+        logger.exception('could not process media %s', media_id)
+        store_result(media_id, error=e)
+    finally:
+        admission.media_processing.leave()
+        connection.close()
+
+
+def _on_future_done(media_id, submitted_at, future):
+    # Done callbacks may run in the submitting request thread; write from a
+    # dedicated thread so that thread's connection and transaction are untouched.
+    threading.Thread(target=_store_future_result, args=(media_id, submitted_at, future), daemon=True).start()
+
+
+def submit(media_ids):
+    """
+    Hand freshly uploaded media to the background worker pool.
+    With MEDIA_PROCESSING_MODE = 'queue', and past MEDIA_PROCESSING_MAX_PENDING
+    uploads in the pool, the rows stay PENDING until
+    `python manage.py process_media` picks them up.
+    """
+    if settings.MEDIA_PROCESSING_MODE != 'pool':
+        return
+
+    for media_id in media_ids:
+        if not admission.media_processing.try_enter():
+            logger.warning('media processing pool full, leaving media %s PENDING', media_id)
+            continue
+        try:
+            if not claim(media_id):
+                admission.media_processing.leave()
+                continue
+            source, media_type, media_size = load_raw_media(media_id)
+            if finish_if_trivial(media_id, media_size, media_type):
+                admission.media_processing.leave()
+                continue
+            future = get_executor().submit(process_stored_media, source, media_type)
+        except Exception:
+            admission.media_processing.leave()
+            raise
+        future.add_done_callback(partial(_on_future_done, media_id, time.perf_counter()))
+
+
+def submit_on_commit(media_ids):
+    transaction.on_commit(partial(submit, list(media_ids)))
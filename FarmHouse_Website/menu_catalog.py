@@ -0,0 +1,69 @@
+"""
+The whole menu grouped by category, serialized once per menu version.
+
+The version is read from the database, so a dish changed through any worker
+process is seen by all of them whatever the cache backend: the dish count
+and the latest `updatedAt`, which every save bumps and every delete or
+insert changes. A request runs that one aggregate query and, while the
+version is unchanged, returns the prebuilt JSON bytes without loading a row
+or running the serializer.
+"""
+import hashlib
+import threading
+from collections import namedtuple
+
+from django.db.models import Count, Max
+
+from . import instrumentation, renderers
+from .models import Menu
+from .serializer import MenuSerializer
+
+Snapshot = namedtuple('Snapshot', ['version', 'content', 'etag', 'last_modified'])
+
+
+def current_version():
+    aggregates = Menu.objects.aggregate(count=Count('pk'), last_modified=Max('updatedAt'))
+    return aggregates['count'], aggregates['last_modified']
+
+
+def build_payload(version):
+    count, last_modified = version
+    categories = {}
+    for dish in MenuSerializer(Menu.objects.order_by('dishCategory', 'dishId'), many=True).data:
+        categories.setdefault(dish['dishCategory'], []).append(dish)
+    return {
+        'version': f'{count}-{last_modified.timestamp() if last_modified else 0:.6f}',
+        'categories': [{'category': category, 'dishes': dishes} for category, dishes in categories.items()],
+    }
+
+
+class MenuCatalog:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def get(self):
+        # Read the version before the rows: a change committed in between
+        # labels newer rows with the older version and is rebuilt next time
+        version = current_version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is None or self._snapshot.version != version:
+                payload = build_payload(version)
+                with instrumentation.phase('serialization'):
+                    content = renderers.render_json(payload)
+                last_modified = version[1]
+                self._snapshot = Snapshot(version, content, '"%s"' % hashlib.md5(content).hexdigest(),
+                                          int(last_modified.timestamp()) if last_modified else 0)
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+
+catalog = MenuCatalog()
@@ -0,0 +1,195 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from .throttling import TokenBucketThrottle
+
+FIELDS_QUERY_PARAM = 'fields'
+
+
+def get_requested_fields(request):
+    """
+    Parse the `?fields=a,b,c` sparse fieldset parameter.
+    Returns a set of field names, or None when every field was requested.
+    Writes always work on the full field set.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    query_params = getattr(request, 'query_params', request.GET)
+    raw_fields = query_params.get(FIELDS_QUERY_PARAM)
+    if not raw_fields:
+        return None
+    return {field.strip() for field in raw_fields.split(',') if field.strip()}
+
+
+def sparse_queryset(queryset, requested_fields, always_select_fields=()):
+    """
+    Restrict `queryset` to the primary key, `always_select_fields` and the
+    requested concrete fields.
+    """
+    if not requested_fields:
+        return queryset
+    model = queryset.model
+    concrete_fields = {field.name for field in model._meta.concrete_fields}
+    columns = {model._meta.pk.name, *always_select_fields}
+    columns.update(requested_fields & concrete_fields)
+    return queryset.only(*columns)
+
+
+def validator_aggregates(last_modified_field='updatedAt'):
+    """
+    max(pk), count and the newest `last_modified_field`: inserts move max(pk),
+    deletes move the count and updates move the timestamp.
+    """
+    return {'max_pk': Max('pk'), 'count': Count('pk'), 'last_modified': Max(last_modified_field)}
+
+
+def build_validators(full_path, parts):
+    """
+    ETag and Last-Modified (a POSIX timestamp, or None) for the response at
+    `full_path` whose content is summarized by the aggregate values `parts`.
+    """
+    # The query string picks the page, the fields and the ordering
+    fingerprint = '|'.join(str(part) for part in [full_path, *parts])
+    etag = '"%s"' % hashlib.md5(fingerprint.encode()).hexdigest()
+    timestamps = [part for part in parts if hasattr(part, 'timestamp')]
+    last_modified = int(max(timestamps).timestamp()) if timestamps else None
+    return etag, last_modified
+
+
+class SparseFieldsetMixin:
+    """
+    Narrows the SELECT list to the columns named in `?fields=`.
+    The primary key and the fields in `always_select_fields` (e.g. the
+    pagination ordering) are always loaded.
+    """
+    always_select_fields = ()
+
+    def get_requested_fields(self):
+        return get_requested_fields(self.request)
+
+    def get_queryset(self):
+        return sparse_queryset(super().get_queryset(), self.get_requested_fields(), self.always_select_fields)
+
+
+class ValuesListMixin:
+    """
+    Serves `list` through `values_serializer_class` (see
+    serializer.ValuesSerializer): same payload, rows read with `.values()`.
+    """
+    values_serializer_class = None
+
+    def get_values_serializer(self):
+        # The paginator reads its ordering from the rows
+        ordering = [field.lstrip('-') for field in getattr(self.paginator, 'ordering', None) or ()]
+        return self.values_serializer_class(self.get_requested_fields(), (*self.always_select_fields, *ordering))
+
+    def list_rows(self):
+        """
+        The serialized rows of the (filtered) list and whether they are a page.
+        """
+        values_serializer = self.get_values_serializer()
+        queryset = values_serializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        return values_serializer.serialize(page if page is not None else queryset), page is not None
+
+    def list(self, request, *args, **kwargs):
+        rows, paginated = self.list_rows()
+        if paginated:
+            return self.get_paginated_response(rows)
+        return Response(rows)
+
+
+class WriteLimitsMixin:
+    """
+    Guards the `create` action, before its body is parsed: `admission_gates`
+    answer 503 while the work behind it is backed up, then the token buckets
+    of `throttle_scope` answer 429 (see throttling.py).
+    """
+    throttle_scope = None
+    admission_gates = ()
+
+    def get_throttles(self):
+        if self.action == 'create':
+            return [TokenBucketThrottle()]
+        return []
+
+    def check_throttles(self, request):
+        if self.action == 'create':
+            for gate in self.admission_gates:
+                gate.admit()
+        super().check_throttles(request)
+
+
+class ConditionalResponse(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified validators for list and retrieve, computed from one
+    aggregate over the filtered queryset: max(pk), count and the newest
+    `last_modified_field`. Inserts move max(pk), deletes move the count and
+    updates move the timestamp. If-None-Match / If-Modified-Since are answered
+    with 304 (If-Match / If-Unmodified-Since with 412) in `initial()`, before
+    any row is loaded or serialized. Actions wrapped by
+    response_cache.cached_list are left alone: their ETag and Last-Modified
+    come from the cached entry, so a cache hit runs no query at all.
+    """
+    last_modified_field = 'updatedAt'
+    conditional_actions = ('list', 'retrieve')
+
+    def get_validator_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.action == 'retrieve':
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return queryset
+
+    def get_validator_aggregates(self):
+        """
+        Aggregates whose values change whenever the response would. Extend to
+        cover related rows included in the payload.
+        """
+        return validator_aggregates(self.last_modified_field)
+
+    def get_validator_parts(self):
+        aggregates = self.get_validator_queryset().order_by().aggregate(**self.get_validator_aggregates())
+        return list(aggregates.values())
+
+    def get_validators(self):
+        return build_validators(self.request.get_full_path(), self.get_validator_parts())
+
+    def is_conditional(self, request):
+        if request.method not in ('GET', 'HEAD') or self.action not in self.conditional_actions:
+            return False
+        return not hasattr(getattr(self, self.action, None), 'cached_scopes')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.validators = None
+        if self.is_conditional(request):
+            self.validators = self.get_validators()
+            etag, last_modified = self.validators
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                raise ConditionalResponse(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, ConditionalResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'validators', None) and response.status_code in (200, 304):
+            etag, last_modified = self.validators
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -1,4 +1,7 @@
 from django.db import models
+from django.utils import timezone
+
+from .storage import get_media_storage
 
 class Bookings(models.Model):
     bookingId = models.AutoField(primary_key=True)
@@ -15,21 +18,99 @@ class Bookings(models.Model):
     totalGuestsAdults = models.IntegerField(default=0)
     totalGuestsChildren = models.IntegerField(default=0)
     purposeOfStay = models.CharField(max_length=50)
+    # Last-Modified marker for conditional GETs
+    updatedAt = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Availability checks: paymentStatus = 'PAID' AND checkInDate < ? AND checkOutDate > ?
+            models.Index(fields=['paymentStatus', 'checkInDate', 'checkOutDate']),
+            models.Index(fields=['paymentStatus', 'checkOutDate']),
+            # Guest lookups when a review is posted; the primary key rides along for the latest booking
+            models.Index(fields=['guestPhone']),
+            models.Index(fields=['guestEmail']),
+        ]
+
+class BookingDateLock(models.Model):
+    """
+    One row per night. Booking writes lock the rows of the nights they cover,
+    so overlapping bookings serialize while disjoint ones run in parallel.
+    """
+    date = models.DateField(primary_key=True)
 
 class Reviews(models.Model):
     reviewId = models.AutoField(primary_key=True)
-    bookingId = models.IntegerField()
+    # Reviews outlive deleted bookings
+    bookingId = models.ForeignKey(Bookings, on_delete=models.SET_NULL, null=True, blank=True, db_column='bookingId',
+                                  related_name='reviews')
     reviewTitle = models.CharField(max_length=50, default="")
     reviewDate = models.DateField()
     rating = models.IntegerField()
     reviewContent = models.TextField(default="")
+    updatedAt = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Latest reviews, optionally above a rating: ORDER BY reviewDate DESC, reviewId DESC
+            models.Index(fields=['reviewDate', 'rating']),
+        ]
+
+class ReviewSummary(models.Model):
+    """
+    Denormalized rating totals of all reviews, kept in a single row by the
+    Reviews save/delete signals (see review_summary.py).
+    """
+    summaryId = models.IntegerField(primary_key=True)
+    reviewCount = models.IntegerField(default=0)
+    ratingSum = models.IntegerField(default=0)
+    oneStarCount = models.IntegerField(default=0)
+    twoStarCount = models.IntegerField(default=0)
+    threeStarCount = models.IntegerField(default=0)
+    fourStarCount = models.IntegerField(default=0)
+    fiveStarCount = models.IntegerField(default=0)
+    updatedAt = models.DateTimeField(auto_now=True)
 
 class ReviewsMedia(models.Model):
+    PENDING = "PENDING"
+    PROCESSING = "PROCESSING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
     mediaId = models.AutoField(primary_key=True)
     reviewId = models.ForeignKey(Reviews, on_delete=models.CASCADE)
     mediaName = models.CharField(max_length=50, default="")
     mediaType = models.CharField(max_length=20)
-    media = models.BinaryField()
+    # Legacy inline blob; new media lives in mediaFile (see `manage.py migrate_media_blobs`)
+    media = models.BinaryField(default=b"", blank=True)
+    mediaFile = models.FileField(storage=get_media_storage, max_length=100, blank=True, default="")
+    mediaSize = models.IntegerField(default=0)
+    # Uploads are stored raw and compressed in the background by media_processing
+    processingStatus = models.CharField(max_length=10, default=DONE)
+    processingError = models.TextField(default="", blank=True)
+    # auto_now is skipped by queryset.update(); set it there explicitly
+    updatedAt = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['processingStatus']),
+        ]
+
+class ReviewsMediaVariant(models.Model):
+    """
+    A resized/re-encoded derivative of an image in ReviewsMedia.
+    """
+    variantId = models.AutoField(primary_key=True)
+    mediaId = models.ForeignKey(ReviewsMedia, on_delete=models.CASCADE, related_name='variants')
+    variantSize = models.CharField(max_length=10)
+    variantFormat = models.CharField(max_length=10)
+    width = models.IntegerField()
+    height = models.IntegerField()
+    variantFile = models.FileField(storage=get_media_storage, max_length=100)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['mediaId', 'variantSize', 'variantFormat'], name='unique_media_variant'),
+        ]
 
 class Menu(models.Model):
     dishId = models.AutoField(primary_key=True)
@@ -39,5 +120,34 @@ class Menu(models.Model):
     # dishImage = models.BinaryField()
     dishCategory = models.CharField(max_length=30, default="")
     dishSource = models.CharField(max_length=30, default="")
+    updatedAt = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # ?category= / ?source= filters, optionally with a price range
+            models.Index(fields=['dishCategory', 'dishPrice']),
+            models.Index(fields=['dishSource', 'dishPrice']),
+        ]
+
+
+class OutboundEmail(models.Model):
+    PENDING = "PENDING"
+    SENT = "SENT"
+    FAILED = "FAILED"
 
+    emailId = models.AutoField(primary_key=True)
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    fromEmail = models.CharField(max_length=100)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    nextAttemptAt = models.DateTimeField(default=timezone.now)
+    lastError = models.TextField(default="", blank=True)
+    createdAt = models.DateTimeField(auto_now_add=True)
+    sentAt = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'nextAttemptAt']),
+        ]
@@ -0,0 +1,108 @@
+import logging
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from FarmHouse_Website_Backend import settings
+from . import instrumentation
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(messages):
+    """
+    Persist EmailMessages in the outbox instead of sending them.
+    Returns the created OutboundEmail rows.
+    """
+    return OutboundEmail.objects.bulk_create([
+        OutboundEmail(
+            subject=message.subject,
+            body=message.body,
+            fromEmail=message.from_email,
+            recipients=list(message.to),
+        )
+        for message in messages
+    ])
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff: base, 2*base, 4*base... capped at OUTBOX_MAX_RETRY_DELAY.
+    """
+    delay = settings.OUTBOX_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(delay, settings.OUTBOX_MAX_RETRY_DELAY))
+
+
+def _to_message(outbound_email, connection):
+    return EmailMessage(
+        subject=outbound_email.subject,
+        body=outbound_email.body,
+        from_email=outbound_email.fromEmail,
+        to=outbound_email.recipients,
+        connection=connection,
+    )
+
+
+def _record_failure(outbound_email, error, now):
+    outbound_email.attempts += 1
+    outbound_email.lastError = str(error)
+    if outbound_email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        outbound_email.status = OutboundEmail.FAILED
+    else:
+        outbound_email.nextAttemptAt = now + retry_delay(outbound_email.attempts)
+    outbound_email.save(update_fields=['attempts', 'lastError', 'status', 'nextAttemptAt'])
+
+
+def drain(batch_size=None):
+    """
+    Send every due email in the outbox over a single SMTP connection.
+    Rows are locked while they are sent, so several workers can drain the
+    same outbox without sending an email twice.
+    Returns (sent, failed) counts for this batch.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    now = timezone.now()
+    sent = failed = 0
+
+    with transaction.atomic():
+        due_emails = list(
+            OutboundEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=OutboundEmail.PENDING, nextAttemptAt__lte=now)
+            .order_by('nextAttemptAt')[:batch_size]
+        )
+        if not due_emails:
+            return sent, failed
+
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as e:
+            logger.exception('could not open the email connection')
+            for outbound_email in due_emails:
+                _record_failure(outbound_email, e, now)
+            return sent, len(due_emails)
+
+        try:
+            for outbound_email in due_emails:
+                try:
+                    with instrumentation.phase('email'):
+                        connection.send_messages([_to_message(outbound_email, connection)])
+                except Exception as e:
+                    logger.exception('could not send email %s', outbound_email.emailId)
+                    _record_failure(outbound_email, e, now)
+                    failed += 1
+                    continue
+
+                outbound_email.status = OutboundEmail.SENT
+                outbound_email.attempts += 1
+                outbound_email.sentAt = timezone.now()
+                outbound_email.save(update_fields=['status', 'attempts', 'sentAt'])
+                sent += 1
+        finally:
+            connection.close()
+
+    return sent, failed
@@ -0,0 +1,32 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OptInCursorPagination(CursorPagination):
+    """
+    Keyset pagination that only kicks in when the client asks for it with
+    `?page_size=` or follows a `?cursor=` link, so existing clients that expect
+    a plain list keep working.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def is_requested(self, query_params):
+        return self.cursor_query_param in query_params or self.page_size_query_param in query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request.query_params):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class BookingsCursorPagination(OptInCursorPagination):
+    ordering = ('bookingId',)
+
+
+class MenuCursorPagination(OptInCursorPagination):
+    ordering = ('dishId',)
+
+
+class ReviewsCursorPagination(OptInCursorPagination):
+    ordering = ('-reviewDate', '-reviewId')
@@ -0,0 +1,124 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from FarmHouse_Website_Backend import settings
+from . import instrumentation, renderers
+
+GENERATION_KEY = 'response-generation:{}'
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def generations(scopes):
+    """
+    Current generation of every scope. A generation is the time_ns() of the
+    last change, so it doubles as the Last-Modified date of the scope.
+    """
+    cache = get_cache()
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            # First request after a restart or an eviction: start a new generation
+            cache.add(key, time.time_ns(), None)
+            values[key] = cache.get(key) or time.time_ns()
+    return [values[key] for key in keys]
+
+
+def invalidate(*scopes):
+    """
+    Start a new generation for each scope. Entries of older generations are
+    never read again and expire on their own.
+    """
+    get_cache().set_many({GENERATION_KEY.format(scope): time.time_ns() for scope in scopes}, None)
+
+
+def invalidate_on_commit(*scopes):
+    # Bumping before commit would let a concurrent reader cache the old rows
+    # under the new generation
+    transaction.on_commit(lambda: invalidate(*scopes))
+
+
+def response_key(request, scopes, scope_generations):
+    query = sorted(request.GET.lists())
+    fingerprint = hashlib.md5(f'{request.get_host()}{request.path}?{query}'.encode()).hexdigest()
+    versions = '.'.join(f'{scope}{generation}' for scope, generation in zip(scopes, scope_generations))
+    return f'response:{versions}:{fingerprint}'
+
+
+def build_once(cache, key, build):
+    """
+    Build and store a cache entry, letting a single caller at a time do the
+    work: the others wait for its result instead of all hitting the database.
+    """
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, settings.RESPONSE_CACHE_LOCK_TIMEOUT):
+        try:
+            entry = build()
+            if entry is not None:
+                cache.set(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+            return entry
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        if cache.get(lock_key) is None:
+            break
+    # The builder failed or took too long: build without caching
+    return build()
+
+
+def cached_list(*scopes):
+    """
+    Cache the rendered JSON of a list action per host, path and query string.
+    `scopes` name the data the response depends on; `invalidate(scope)`
+    makes every cached response of that scope stale. Responses carry an
+    ETag and a Last-Modified date and answer conditional requests with 304.
+    """
+    def decorator(list_action):
+        @wraps(list_action)
+        def wrapper(self, request, *args, **kwargs):
+            cache = get_cache()
+            scope_generations = generations(scopes)
+            key = response_key(request, scopes, scope_generations)
+
+            uncacheable = []
+
+            def build():
+                response = list_action(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    uncacheable.append(response)
+                    return None
+                with instrumentation.phase('serialization'):
+                    content = renderers.render_json(response.data)
+                return {'content': content, 'etag': '"%s"' % hashlib.md5(content).hexdigest()}
+
+            entry = cache.get(key) or build_once(cache, key, build)
+            if entry is None:
+                return uncacheable[0] if uncacheable else list_action(self, request, *args, **kwargs)
+
+            last_modified = max(scope_generations) // 1_000_000_000
+            response = HttpResponse(entry['content'], content_type='application/json')
+            response['ETag'] = entry['etag']
+            response['Last-Modified'] = http_date(last_modified)
+            response['Cache-Control'] = 'no-cache'
+            return get_conditional_response(request, etag=entry['etag'], last_modified=last_modified,
+                                            response=response)
+        # Tells ConditionalGetMixin to leave the validators of this action to us
+        wrapper.cached_scopes = scopes
+        return wrapper
+    return decorator
@@ -0,0 +1,99 @@
+"""
+The rating summary of the landing page: review count, average and a
+histogram per star, read from the single ReviewSummary row.
+
+The Reviews save/delete signals apply each change to the row as an F()
+update inside the review's own transaction, so the row never drifts from
+the reviews it summarizes. Writes that bypass signals (bulk_create,
+queryset.update of ratings) need `python manage.py rebuild_review_summary`.
+"""
+from django.db.models import Count, F, Q, Sum
+from django.urls import reverse
+from django.utils import timezone
+
+from . import media_processing
+from .models import Reviews, ReviewsMedia, ReviewSummary
+
+SUMMARY_ID = 1
+STAR_FIELDS = {1: 'oneStarCount', 2: 'twoStarCount', 3: 'threeStarCount', 4: 'fourStarCount', 5: 'fiveStarCount'}
+
+TOP_REVIEWS_LIMIT = 6
+TOP_REVIEWS_MAX_LIMIT = 50
+
+
+def rebuild():
+    """
+    Recompute the summary from the reviews with one aggregate query.
+    """
+    totals = Reviews.objects.aggregate(
+        reviewCount=Count('pk'),
+        ratingSum=Sum('rating', default=0),
+        **{field: Count('pk', filter=Q(rating=stars)) for stars, field in STAR_FIELDS.items()},
+    )
+    summary, _ = ReviewSummary.objects.update_or_create(summaryId=SUMMARY_ID, defaults=totals)
+    return summary
+
+
+def get_summary():
+    try:
+        return ReviewSummary.objects.get(summaryId=SUMMARY_ID)
+    except ReviewSummary.DoesNotExist:
+        return rebuild()
+
+
+def apply_change(old_rating=None, new_rating=None):
+    """
+    Move the totals from a review rated `old_rating` (None when it is new)
+    to one rated `new_rating` (None when it was deleted).
+    """
+    changes = {}
+    for rating, sign in ((old_rating, -1), (new_rating, 1)):
+        if rating is None:
+            continue
+        changes['reviewCount'] = changes.get('reviewCount', 0) + sign
+        changes['ratingSum'] = changes.get('ratingSum', 0) + sign * rating
+        if rating in STAR_FIELDS:
+            changes[STAR_FIELDS[rating]] = changes.get(STAR_FIELDS[rating], 0) + sign
+    changes = {field: delta for field, delta in changes.items() if delta}
+    if not changes:
+        return
+
+    updated = ReviewSummary.objects.filter(summaryId=SUMMARY_ID).update(
+        updatedAt=timezone.now(), **{field: F(field) + delta for field, delta in changes.items()})
+    if not updated:
+        # First change since the table was created: count what is there, this change included
+        rebuild()
+
+
+def summary_payload(summary):
+    return {
+        'count': summary.reviewCount,
+        'average': round(summary.ratingSum / summary.reviewCount, 2) if summary.reviewCount else None,
+        'histogram': {str(stars): getattr(summary, field) for stars, field in STAR_FIELDS.items()},
+    }
+
+
+def top_reviews(request, limit=TOP_REVIEWS_LIMIT, min_rating=None):
+    """
+    The latest `limit` reviews rated at least `min_rating`, each with the
+    thumbnail URL of its first image (None for reviews without images).
+    Two queries, the first one walking the (reviewDate, rating) index.
+    """
+    reviews = Reviews.objects.order_by('-reviewDate', '-reviewId')
+    if min_rating is not None:
+        reviews = reviews.filter(rating__gte=min_rating)
+    reviews = list(reviews.values('reviewId', 'reviewTitle', 'reviewDate', 'rating', 'reviewContent')[:limit])
+
+    first_images = {}
+    images = ReviewsMedia.objects.filter(
+        reviewId__in=[review['reviewId'] for review in reviews], mediaType__in=media_processing.IMAGE_TYPES,
+    ).order_by('mediaId').values_list('reviewId', 'mediaId')
+    for review_id, media_id in images:
+        first_images.setdefault(review_id, media_id)
+
+    for review in reviews:
+        media_id = first_images.get(review['reviewId'])
+        review['thumbnail_url'] = request.build_absolute_uri(
+            reverse('reviews-media', kwargs={'pk': review['reviewId'], 'mediaId': media_id}) + '?size=thumb'
+        ) if media_id else None
+    return reviews
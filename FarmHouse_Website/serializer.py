@@ -1,7 +1,10 @@
 import base64
+import functools
+
 from rest_framework import serializers
-from . import utils
-from FarmHouse_Website.models import *
+from . import instrumentation, utils
+from .mixins import get_requested_fields
+from FarmHouse_Website.models import Bookings, Menu, Reviews
 
 
 class EncodeWhileWriteOnly(serializers.Field):
@@ -16,23 +19,69 @@ class EncodeWhileWriteOnly(serializers.Field):
         return None
 
 
-class BookingsSerializer(serializers.ModelSerializer):
+class InstrumentedListSerializer(serializers.ListSerializer):
+
+    @property
+    def data(self):
+        with instrumentation.phase('serialization'):
+            return super().data
+
+
+class InstrumentedSerializerMixin:
+    """
+    Times `.data` as the 'serialization' phase. Set
+    `Meta.list_serializer_class = InstrumentedListSerializer` to time lists too.
+    """
+
+    @property
+    def data(self):
+        with instrumentation.phase('serialization'):
+            return super().data
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Drops every field not named in the request's `?fields=` parameter.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested_fields = get_requested_fields(self.context.get('request'))
+        if requested_fields:
+            for field_name in list(self.fields):
+                if field_name not in requested_fields:
+                    self.fields.pop(field_name)
+
+
+class OptionalFieldsMixin:
+    """
+    Makes every model field optional while the fields are built, instead of
+    walking `self.fields` after each instantiation.
+    """
+
+    def build_field(self, *args, **kwargs):
+        field_class, field_kwargs = super().build_field(*args, **kwargs)
+        if not field_kwargs.get('read_only'):
+            field_kwargs['required'] = False
+        return field_class, field_kwargs
+
+
+class BookingsSerializer(InstrumentedSerializerMixin, SparseFieldsetSerializerMixin, OptionalFieldsMixin,
+                         serializers.ModelSerializer):
 
     class Meta:
         model = Bookings
-        fields = '__all__'
-        
-    def __init__(self, *args, **kwargs):
-        super(BookingsSerializer, self).__init__(*args, **kwargs)
-        for field in self.fields.values():
-            field.required = False
+        exclude = ['updatedAt']
+        list_serializer_class = InstrumentedListSerializer
 
 
-class MenuSerializer(serializers.ModelSerializer):
+class MenuSerializer(InstrumentedSerializerMixin, SparseFieldsetSerializerMixin, OptionalFieldsMixin,
+                     serializers.ModelSerializer):
     dishImage = EncodeWhileWriteOnly(required=False)
 
     class Meta:
         model = Menu
+        list_serializer_class = InstrumentedListSerializer
         fields = [
             'dishId',
             'dishName',
@@ -42,22 +91,93 @@ class MenuSerializer(serializers.ModelSerializer):
             'dishSource',
             'dishCategory',
         ]
-        
-    def __init__(self, *args, **kwargs):
-        super(MenuSerializer, self).__init__(*args, **kwargs)
-        for field in self.fields.values():
-            field.required = False
 
-class ReviewsSerializer(serializers.ModelSerializer):
-    bookingId = serializers.IntegerField(required=False)
+class StaySerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Bookings
+        fields = ['checkInDate', 'checkOutDate']
+
+
+class ReviewsSerializer(InstrumentedSerializerMixin, SparseFieldsetSerializerMixin, OptionalFieldsMixin,
+                        serializers.ModelSerializer):
+    # Set from the guest's latest booking when the review is created
+    bookingId = serializers.PrimaryKeyRelatedField(read_only=True)
+    # Joined by the views' select_related; null once the booking is deleted
+    stay = StaySerializer(source='bookingId', read_only=True)
 
     class Meta:
         model = Reviews
-        fields = '__all__'
-        
-    def __init__(self, *args, **kwargs):
-        super(ReviewsSerializer, self).__init__(*args, **kwargs)
-        for field in self.fields.values():
-            field.required = False
+        exclude = ['updatedAt']
+        list_serializer_class = InstrumentedListSerializer
+
+
+class ValuesSerializer:
+    """
+    Read-only fast path of `serializer_class` for list endpoints. Rows are
+    read with `.values()` and passed to the renderer as they are, without
+    building field objects or running a to_representation per field. The
+    output matches `serializer_class` for the model's columns and for the
+    nested objects declared in `related_fields`.
+    """
+    serializer_class = None
+    # Output name -> (foreign key, {key: related column lookup})
+    related_fields = {}
+
+    @classmethod
+    @functools.cache
+    def field_names(cls):
+        return list(cls.serializer_class().fields)
+
+    def __init__(self, requested_fields=None, always_select_fields=()):
+        model = self.serializer_class.Meta.model
+        columns = {field.name for field in model._meta.concrete_fields}
+        self.output_fields = [name for name in self.field_names()
+                              if (name in columns or name in self.related_fields)
+                              and (not requested_fields or name in requested_fields)]
+        self.related = {name: self.related_fields[name] for name in self.output_fields if name in self.related_fields}
+
+        # The primary key and the pagination ordering are read even when not shown
+        self.columns = [name for name in self.output_fields if name in columns]
+        for name in (model._meta.pk.name, *always_select_fields, *(key for key, _ in self.related.values())):
+            if name not in self.columns:
+                self.columns.append(name)
+        for _, lookups in self.related.values():
+            self.columns.extend(lookups.values())
+        self.passthrough = self.columns == self.output_fields
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def to_representation(self, row):
+        data = {}
+        for name in self.output_fields:
+            if name in self.related:
+                foreign_key, lookups = self.related[name]
+                data[name] = None if row[foreign_key] is None else {
+                    key: row[lookup] for key, lookup in lookups.items()}
+            else:
+                data[name] = row[name]
+        return data
+
+    def serialize(self, rows):
+        with instrumentation.phase('serialization'):
+            if self.passthrough:
+                return list(rows)
+            # New dicts: the paginator still reads its ordering from the rows
+            return [self.to_representation(row) for row in rows]
+
+
+class BookingsValuesSerializer(ValuesSerializer):
+    serializer_class = BookingsSerializer
+
+
+class MenuValuesSerializer(ValuesSerializer):
+    serializer_class = MenuSerializer
 
 
+class ReviewsValuesSerializer(ValuesSerializer):
+    serializer_class = ReviewsSerializer
+    related_fields = {
+        'stay': ('bookingId', {'checkInDate': 'bookingId__checkInDate', 'checkOutDate': 'bookingId__checkOutDate'}),
+    }
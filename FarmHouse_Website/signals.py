@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import availability, media_processing, response_cache, review_summary
+from .models import Bookings, Menu, Reviews, ReviewsMedia, ReviewsMediaVariant
+
+
+@receiver(post_save, sender=Bookings)
+def update_paid_stays_on_save(sender, instance, **kwargs):
+    # Apply after commit so a rolled back booking never reaches the index
+    transaction.on_commit(lambda: availability.paid_stays.record_saved(
+        instance.bookingId, instance.paymentStatus, instance.checkInDate, instance.checkOutDate))
+
+
+@receiver(post_delete, sender=Bookings)
+def update_paid_stays_on_delete(sender, instance, **kwargs):
+    booking_id = instance.bookingId
+    transaction.on_commit(lambda: availability.paid_stays.record_deleted(booking_id))
+
+
+@receiver(post_save, sender=Menu)
+@receiver(post_delete, sender=Menu)
+def invalidate_menu_responses(sender, **kwargs):
+    response_cache.invalidate_on_commit('menu')
+
+
+@receiver(post_save, sender=Reviews)
+@receiver(post_delete, sender=Reviews)
+@receiver(post_save, sender=ReviewsMedia)
+@receiver(post_delete, sender=ReviewsMedia)
+def invalidate_review_responses(sender, **kwargs):
+    response_cache.invalidate_on_commit('reviews')
+
+
+@receiver(post_delete, sender=ReviewsMedia)
+@receiver(post_delete, sender=ReviewsMediaVariant)
+def delete_unreferenced_file(sender, instance, **kwargs):
+    # Also reached through the cascade of a deleted review or media row
+    name = (instance.mediaFile if sender is ReviewsMedia else instance.variantFile).name
+    if name:
+        transaction.on_commit(lambda: media_processing.delete_unreferenced_files([name]), robust=True)
+
+
+@receiver(pre_save, sender=Reviews)
+def remember_previous_rating(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._previous_rating = None
+    if raw or instance.pk is None or (update_fields is not None and 'rating' not in update_fields):
+        return
+    instance._previous_rating = Reviews.objects.filter(pk=instance.pk).values_list('rating', flat=True).first()
+
+
+@receiver(post_save, sender=Reviews)
+def update_summary_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'rating' not in update_fields):
+        return
+    review_summary.apply_change(None if created else instance._previous_rating, instance.rating)
+
+
+@receiver(post_delete, sender=Reviews)
+def update_summary_on_delete(sender, instance, **kwargs):
+    review_summary.apply_change(instance.rating, None)
@@ -0,0 +1,128 @@
+"""
+Cold start profiling for `python manage.py profile_startup`.
+
+Every measurement runs in a fresh interpreter with the current settings
+module: `django.setup()` (settings, logging, app registry, admin
+autodiscovery) then the URLconf, which imports every view, as the first
+request of a new worker would. A separate `-X importtime` run breaks the
+import time down by package.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings as django_settings
+
+from FarmHouse_Website_Backend import settings
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+ready = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+loaded = time.perf_counter()
+print(json.dumps({
+    'setup_ms': (ready - start) * 1000,
+    'urlconf_ms': (loaded - ready) * 1000,
+    'total_ms': (loaded - start) * 1000,
+    'modules': sorted(sys.modules),
+}))
+'''
+
+
+def probe_environment():
+    environment = dict(os.environ)
+    environment['DJANGO_SETTINGS_MODULE'] = django_settings.SETTINGS_MODULE
+    # The same import path as this process, wherever the settings module lives
+    environment['PYTHONPATH'] = os.pathsep.join(path for path in sys.path if path)
+    return environment
+
+
+def run_probe(importtime=False):
+    """
+    Start a fresh interpreter on PROBE. Returns the probe's measurements,
+    its wall time as `process_ms` and, with `importtime`, its stderr.
+    """
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', PROBE]
+    start = time.perf_counter()
+    completed = subprocess.run(command, capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+                               env=probe_environment())
+    result = json.loads(completed.stdout.splitlines()[-1])
+    result['process_ms'] = (time.perf_counter() - start) * 1000
+    if importtime:
+        result['importtime'] = completed.stderr
+    return result
+
+
+def parse_importtime(output):
+    """
+    Lines of `-X importtime` -> [(module, depth, self_us, cumulative_us)].
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        stripped = name.rstrip().lstrip(' ')
+        depth = (len(name.rstrip()) - len(stripped) - 1) // 2
+        imports.append((stripped, depth, int(self_us), int(cumulative_us)))
+    return imports
+
+
+def package_breakdown(imports, top):
+    """
+    Self import time summed by top-level package, slowest first.
+    """
+    packages = defaultdict(int)
+    for name, _depth, self_us, _cumulative_us in imports:
+        packages[name.split('.')[0]] += self_us
+    ordered = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {package: round(self_us / 1000, 1) for package, self_us in ordered}
+
+
+def project_breakdown(imports):
+    """
+    Cumulative import time of this project's modules: what each one pulls in.
+    """
+    return {name: round(cumulative_us / 1000, 1) for name, _depth, _self_us, cumulative_us in imports
+            if name.split('.')[0] in ('FarmHouse_Website', 'FarmHouse_Website_Backend')}
+
+
+def profile(repeat=3, top=15):
+    runs = [run_probe() for _ in range(repeat)]
+    traced = run_probe(importtime=True)
+    imports = parse_importtime(traced['importtime'])
+    loaded = set(runs[-1]['modules'])
+    return {
+        'settings': probe_environment()['DJANGO_SETTINGS_MODULE'],
+        'repeat': repeat,
+        'median_ms': {key: round(statistics.median(run[key] for run in runs), 1)
+                      for key in ('setup_ms', 'urlconf_ms', 'total_ms', 'process_ms')},
+        'budget_ms': settings.STARTUP_BUDGET_MS,
+        'modules_loaded': len(loaded),
+        'eager_modules': [module for module in settings.STARTUP_LAZY_MODULES if module in loaded],
+        'import_ms': round(sum(cumulative_us for _name, depth, _self_us, cumulative_us in imports
+                               if depth == 0) / 1000, 1),
+        'packages_ms': package_breakdown(imports, top),
+        'project_modules_ms': project_breakdown(imports),
+    }
+
+
+def budget_problems(report):
+    """
+    Human readable reasons why `report` breaks the startup budget, if any.
+    """
+    problems = []
+    if report['median_ms']['total_ms'] > report['budget_ms']:
+        problems.append(f"startup took {report['median_ms']['total_ms']} ms, over the "
+                        f"{report['budget_ms']} ms budget")
+    if report['eager_modules']:
+        problems.append('imported at startup instead of on first use: ' + ', '.join(report['eager_modules']))
+    return problems
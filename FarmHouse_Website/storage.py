@@ -0,0 +1,177 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage, storages
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def get_media_storage():
+    """
+    The storage review media is written to: STORAGES['media_blobs'].
+    Used as a callable FileField storage so it can be swapped in settings.
+    """
+    return storages['media_blobs']
+
+
+def content_name(digest):
+    return f'{digest[:2]}/{digest[2:4]}/{digest}'
+
+
+def digest_from_name(name):
+    return name.rsplit('/', 1)[-1]
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Filesystem storage where a file's name is the SHA-256 of its content,
+    fanned out as ab/cd/abcd.... Saving content that is already stored only
+    bumps the file's modification time, so identical uploads share one file
+    and a file being reused is never collected as unreferenced.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Same name means same content: never rename, reuse the existing file
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if self._reuse(full_path):
+            return name
+
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        if hasattr(content, 'temporary_file_path'):
+            # Uploads already spooled to disk are hard-linked, not copied, when
+            # they live on the same filesystem; the upload handler still owns
+            # and removes the temporary name
+            try:
+                os.chmod(content.temporary_file_path(), self.file_permissions_mode or 0o644)
+                os.link(content.temporary_file_path(), full_path)
+                return name
+            except FileExistsError:
+                self._reuse(full_path)
+                return name
+            except OSError:
+                pass
+
+        # Write to a temporary file and rename it into place, so concurrent
+        # uploads of the same content never expose a half-written file
+        fd, temporary_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                for chunk in content.chunks():
+                    output.write(chunk)
+            os.chmod(temporary_path, self.file_permissions_mode or 0o644)
+            os.replace(temporary_path, full_path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.unlink(temporary_path)
+            raise
+        return name
+
+    def _reuse(self, full_path):
+        try:
+            os.utime(full_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+
+def hash_file(file_obj):
+    digest = hashlib.sha256()
+    file_obj.seek(0)
+    for chunk in iter(lambda: file_obj.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def save_media_file(file_obj, digest=None):
+    """
+    Store a file-like object under its content hash, reading it in chunks.
+    Returns (name, size).
+    """
+    digest = digest or hash_file(file_obj)
+    media_storage = get_media_storage()
+    name = media_storage.save(content_name(digest), file_obj if isinstance(file_obj, File) else File(file_obj))
+    return name, media_storage.size(name)
+
+
+def save_media_bytes(data):
+    """
+    Store bytes under their content hash. Returns (name, size).
+    """
+    name = get_media_storage().save(content_name(hashlib.sha256(data).hexdigest()), ContentFile(data))
+    return name, len(data)
+
+
+def stored_names():
+    """
+    Every file name in the media storage, walking the ab/cd/ fan-out.
+    """
+    media_storage = get_media_storage()
+    if not media_storage.exists(''):
+        return
+    for first in media_storage.listdir('')[0]:
+        for second in media_storage.listdir(first)[0]:
+            for digest in media_storage.listdir(f'{first}/{second}')[1]:
+                # Skip temporary files of a save in progress
+                if len(digest) == 64:
+                    yield f'{first}/{second}/{digest}'
+
+
+def open_blob(name):
+    """
+    Open a stored file by name. Returns (file_obj, size, etag).
+    """
+    media_storage = get_media_storage()
+    return media_storage.open(name, 'rb'), media_storage.size(name), '"%s"' % digest_from_name(name)
+
+
+@contextmanager
+def local_path(name):
+    """
+    A filesystem path holding the stored file `name`, for readers that take
+    a path (ffmpeg, PIL) so the file never has to be read into memory: the
+    file itself on a local storage, else a temporary copy removed on exit.
+    """
+    media_storage = get_media_storage()
+    try:
+        path = media_storage.path(name)
+    except NotImplementedError:
+        path = None
+    if path is not None:
+        yield path
+        return
+
+    with tempfile.NamedTemporaryFile() as copy, media_storage.open(name, 'rb') as file_obj:
+        shutil.copyfileobj(file_obj, copy)
+        copy.flush()
+        yield copy.name
+
+
+def open_media(media_entry):
+    """
+    Open the content of a ReviewsMedia row, whether it lives in the media
+    storage or still in the legacy BinaryField.
+    Returns (file_obj, size, etag).
+    """
+    if media_entry.mediaFile:
+        return open_blob(media_entry.mediaFile.name)
+
+    data = media_entry.media or b''
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return io.BytesIO(data), len(data), '"%s"' % hashlib.md5(data).hexdigest()
+
+
+def read_media(media_entry):
+    file_obj, _, _ = open_media(media_entry)
+    with file_obj:
+        return file_obj.read()
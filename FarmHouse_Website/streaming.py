@@ -0,0 +1,161 @@
+import re
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from FarmHouse_Website_Backend import settings
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+RANGE_HEADER_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class PassthroughRenderer(BaseRenderer):
+    """
+    Lets binary actions pass DRF content negotiation for any Accept header
+    (e.g. `video/mp4` from a <video> tag). Error payloads still go out as JSON.
+    """
+    media_type = '*/*'
+    format = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (bytes, bytearray)):
+            return data
+        return JSONRenderer().render(data)
+
+
+class CSVRenderer(PassthroughRenderer):
+    """
+    Selects `?format=csv` / `Accept: text/csv` for actions that stream CSV
+    themselves.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(PassthroughRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+def parse_range_header(range_header, size):
+    """
+    Parse a single `bytes=` range against a resource of `size` bytes.
+    Returns (start, end) inclusive, None when the header should be ignored
+    (absent, malformed or multi-range) and False when it is unsatisfiable.
+    """
+    if not range_header:
+        return None
+
+    match = RANGE_HEADER_PATTERN.match(range_header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if first == '' and last == '':
+        return None
+
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        # An empty resource has no last byte to serve
+        if length == 0 or size == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = size - 1 if last == '' else min(int(last), size - 1)
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def iter_file_range(file_obj, start, end, chunk_size=STREAM_CHUNK_SIZE):
+    file_obj.seek(start)
+    remaining = end - start + 1
+    try:
+        while remaining > 0:
+            chunk = file_obj.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file_obj.close()
+
+
+async def aiter_file_range(file_obj, start, end, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Async twin of iter_file_range for ASGI: reads run in the default executor
+    and the event loop serves other connections while a slow client drains
+    the previous chunk.
+    """
+    read = sync_to_async(file_obj.read, thread_sensitive=False)
+    await sync_to_async(file_obj.seek, thread_sensitive=False)(start)
+    remaining = end - start + 1
+    try:
+        while remaining > 0:
+            chunk = await read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file_obj.close()
+
+
+def media_response(request, file_obj, size, content_type, etag, name=None, asynchronous=False):
+    """
+    Serve a stored media file: hand it to the front web server when
+    MEDIA_SENDFILE_HEADER is set, stream it from here otherwise.
+    """
+    if name and settings.MEDIA_SENDFILE_HEADER:
+        # The front web server sends the file itself, including Range requests
+        file_obj.close()
+        response = HttpResponse(content_type=content_type)
+        response[settings.MEDIA_SENDFILE_HEADER] = settings.MEDIA_SENDFILE_PREFIX + name
+        response['ETag'] = etag
+        return response
+    return ranged_response(request, file_obj, size, content_type, etag, asynchronous)
+
+
+def ranged_response(request, file_obj, size, content_type, etag, asynchronous=False):
+    """
+    Stream `file_obj` honouring If-None-Match, If-Range and single byte ranges.
+    `etag` must be a quoted strong validator. `asynchronous` streams through
+    an async iterator, for views served by the ASGI application.
+    """
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+        file_obj.close()
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+
+    byte_range = parse_range_header(request.headers.get('Range'), size)
+
+    if_range = request.headers.get('If-Range')
+    if byte_range and if_range and if_range.strip() != etag:
+        byte_range = None
+
+    if byte_range is False:
+        file_obj.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    iter_range = aiter_file_range if asynchronous else iter_file_range
+    if byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(iter_range(file_obj, start, end), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        start, end = 0, size - 1
+        response = StreamingHttpResponse(iter_range(file_obj, start, end), content_type=content_type)
+
+    response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    return response
+
@@ -1,7 +1,1387 @@
+import csv
+import io
+import json
 import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-from django.test import TestCase
-from . import views
+from asgiref.sync import async_to_sync
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http.multipartparser import MultiPartParser
+from django.db import OperationalError, connection
+from django.conf import settings as django_settings
+from django.contrib.auth.models import User
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from . import (admission, availability, booking_transfer, compressor, instrumentation, locking, media_processing,
+               menu_catalog, outbox, renderers, response_cache, review_summary, startup, storage, throttling, uploads, utils, views)
+from .db.pool import ConnectionPool, PoolTimeout
+from .models import BookingDateLock, Bookings, Menu, OutboundEmail, Reviews, ReviewsMedia, ReviewsMediaVariant, ReviewSummary
+from .serializer import (BookingsSerializer, BookingsValuesSerializer, MenuSerializer, MenuValuesSerializer,
+                         ReviewsSerializer, ReviewsValuesSerializer)
 
 class Randomtests(TestCase):
-    print(os.environ.get('GMAIL_app_password'))
\ No newline at end of file
+    print(os.environ.get('GMAIL_app_password'))
+
+
+class TemporaryMediaStorageMixin:
+    """
+    Point the media_blobs storage at a temporary directory for each test.
+    """
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_storages = {
+            **django_settings.STORAGES,
+            'media_blobs': {**django_settings.STORAGES['media_blobs'], 'OPTIONS': {'location': media_root}},
+        }
+        storage_override = override_settings(STORAGES=media_storages)
+        storage_override.enable()
+        self.addCleanup(storage_override.disable)
+
+
+class ReviewsMediaLoaderTests(TemporaryMediaStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        response_cache.get_cache().clear()
+
+    def create_reviews(self, count, media_per_review=2):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_reviews(count, media_per_review)
+
+    def _create_reviews(self, count, media_per_review):
+        for _ in range(count):
+            review = Reviews.objects.create(reviewDate=date.today(), rating=5)
+            for index in range(media_per_review):
+                ReviewsMedia.objects.create(reviewId=review, mediaType='image/jpeg',
+                                            mediaName=f'{index}.jpg', media=b'x' * 1024)
+
+    def test_list_query_count_is_constant(self):
+        # Reviews, media
+        self.create_reviews(1)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('reviews-list'))
+        self.assertEqual(len(response.json()[0]['media_list']), 2)
+
+        self.create_reviews(9)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('reviews-list'))
+        self.assertEqual(len(response.json()), 10)
+
+    def test_inline_list_query_count_is_constant(self):
+        self.create_reviews(5)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('reviews-list'), {'inline_media': 'true'})
+        self.assertIn('media', response.json()[0]['media_list'][0])
+
+    def test_metadata_query_skips_blob_column(self):
+        self.create_reviews(1)
+        with self.assertNumQueries(2) as context:
+            self.client.get(reverse('reviews-list'))
+        media_query = context.captured_queries[-1]['sql']
+        self.assertNotIn('"media",', media_query.replace('`', '"'))
+
+
+def booking_payload(check_in_offset=10, nights=2, **overrides):
+    check_in = date.today() + timedelta(days=check_in_offset)
+    payload = {
+        'checkInDate': check_in.isoformat(),
+        'checkOutDate': (check_in + timedelta(days=nights)).isoformat(),
+        'paymentStatus': 'PAID',
+        'paymentType': 'UPI',
+        'paymentAmount': 10000,
+        'guestName': 'Test Guest',
+        'guestEmail': 'guest@example.com',
+        'guestPhone': '9000000000',
+        'guestAddress': 'Somewhere',
+        'purposeOfStay': 'Leisure',
+    }
+    payload.update(overrides)
+    return payload
+
+
+class OutboxTests(TestCase):
+
+    def test_booking_queues_emails_without_sending(self):
+        response = self.client.post(reverse('bookings-list'), booking_payload())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.PENDING).count(), 2)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_drain_sends_over_one_connection(self):
+        self.client.post(reverse('bookings-list'), booking_payload())
+        with mock.patch('FarmHouse_Website.outbox.get_connection', wraps=outbox.get_connection) as get_connection:
+            call_command('send_queued_emails', '--once', stdout=io.StringIO())
+        self.assertEqual(get_connection.call_count, 1)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ['guest@example.com'])
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.SENT).count(), 2)
+
+    def test_failed_send_is_retried_with_backoff(self):
+        outbox.enqueue(views.utils.buildConfirmationEmails('guest@example.com', 'Guest', 'in', 'out', '9000000000')[:1])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            self.assertEqual(outbox.drain(), (0, 1))
+
+        outbound_email = OutboundEmail.objects.get()
+        self.assertEqual(outbound_email.status, OutboundEmail.PENDING)
+        self.assertEqual(outbound_email.attempts, 1)
+        self.assertGreater(outbound_email.nextAttemptAt, timezone.now())
+        self.assertEqual(outbox.drain(), (0, 0))
+
+        OutboundEmail.objects.update(nextAttemptAt=timezone.now())
+        self.assertEqual(outbox.drain(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_email_is_dropped_after_max_attempts(self):
+        outbox.enqueue(views.utils.buildConfirmationEmails('guest@example.com', 'Guest', 'in', 'out', '9000000000')[:1])
+        OutboundEmail.objects.update(attempts=outbox.settings.OUTBOX_MAX_ATTEMPTS - 1)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            outbox.drain()
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.FAILED)
+
+
+class AvailabilityTests(TestCase):
+
+    def setUp(self):
+        randomizer = random.Random(7)
+        today = date.today()
+        for index in range(60):
+            check_in = today + timedelta(days=randomizer.randrange(-10, 380))
+            Bookings.objects.create(
+                bookingDate=today, checkInDate=check_in,
+                checkOutDate=check_in + timedelta(days=randomizer.randrange(1, 10)),
+                paymentStatus=randomizer.choice(['PAID', 'PAID', 'PENDING']),
+                guestPhone=str(index),
+            )
+        availability.paid_stays.invalidate()
+
+    def test_index_matches_database(self):
+        randomizer = random.Random(11)
+        today = date.today()
+        for _ in range(300):
+            check_in = today + timedelta(days=randomizer.randrange(365))
+            check_out = check_in + timedelta(days=randomizer.randrange(1, 31))
+            expected = utils.query_booking_conflicts(check_in, check_out)
+            actual = availability.paid_stays.conflicts(check_in, check_out)
+            self.assertEqual(sorted((c['start'], c['end']) for c in actual),
+                             sorted((c['start'], c['end']) for c in expected))
+
+    def test_index_is_invalidated_on_save(self):
+        check_in = date.today() + timedelta(days=400)
+        self.assertIsNone(availability.paid_stays.conflicts(check_in, check_in + timedelta(days=1)))
+
+        check_in = date.today() + timedelta(days=200)
+        with self.captureOnCommitCallbacks(execute=True):
+            Bookings.objects.filter(checkInDate__lte=check_in, checkOutDate__gt=check_in).delete()
+        self.assertEqual(availability.paid_stays.conflicts(check_in, check_in + timedelta(days=1)), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Bookings.objects.create(bookingDate=date.today(), checkInDate=check_in,
+                                    checkOutDate=check_in + timedelta(days=1), paymentStatus='PAID')
+        self.assertEqual(len(availability.paid_stays.conflicts(check_in, check_in + timedelta(days=1))), 1)
+
+    def test_calendar_matches_bookings_and_revalidates(self):
+        response = self.client.get(reverse('availability'))
+        self.assertEqual(response.status_code, 200)
+        booked = set(response.json()['booked'])
+        for offset, digit in enumerate(response.json()['occupancy']):
+            night = date.today() + timedelta(days=offset)
+            has_stay = Bookings.objects.filter(paymentStatus='PAID', checkInDate__lte=night, checkOutDate__gt=night).exists()
+            self.assertEqual(digit == '1', has_stay)
+            self.assertEqual(night.isoformat() in booked, has_stay)
+
+        etag = response['ETag']
+        self.assertEqual(self.client.get(reverse('availability'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        night = date.today() + timedelta(days=300)
+        with self.captureOnCommitCallbacks(execute=True):
+            Bookings.objects.filter(checkInDate__lte=night, checkOutDate__gt=night).delete()
+            Bookings.objects.create(bookingDate=date.today(), checkInDate=night,
+                                    checkOutDate=night + timedelta(days=1), paymentStatus='PAID')
+        response = self.client.get(reverse('availability'), {'from': night.isoformat(), 'to': (night + timedelta(days=1)).isoformat()},
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['occupancy'], '1')
+
+
+@mock.patch.dict(throttling.settings.THROTTLE_RATES, {'bookings_ip': None, 'bookings_guest': None})
+class ConcurrentBookingTests(TransactionTestCase):
+    """
+    Stress test for locking.locked_stay. Needs a database that threads can
+    share: MySQL, or SQLite on a file (the DB_ENGINE=sqlite test database).
+    Only in-memory SQLite, whose connections are per thread, is skipped.
+    """
+    threads = 8
+    bookings_per_thread = 6
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('in-memory SQLite cannot be shared between threads')
+
+    def post_concurrently(self, payloads_per_thread):
+        statuses = []
+        barrier = threading.Barrier(len(payloads_per_thread))
+
+        def worker(payloads):
+            try:
+                barrier.wait()
+                client = self.client_class()
+                for payload in payloads:
+                    statuses.append(client.post(reverse('bookings-list'), payload).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(payloads,)) for payloads in payloads_per_thread]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses, time.perf_counter() - start
+
+    def assert_no_double_booking(self):
+        stays = sorted(Bookings.objects.filter(paymentStatus='PAID').values_list('checkInDate', 'checkOutDate'))
+        for (_, previous_check_out), (check_in, _) in zip(stays, stays[1:]):
+            self.assertLessEqual(previous_check_out, check_in)
+
+    def test_overlapping_bookings_never_double_book(self):
+        # Every thread competes for the same few nights
+        payloads = [
+            [booking_payload(check_in_offset=20 + (thread + attempt) % 4, nights=2, guestPhone=f'{thread}{attempt}')
+             for attempt in range(self.bookings_per_thread)]
+            for thread in range(self.threads)
+        ]
+        statuses, elapsed = self.post_concurrently(payloads)
+
+        self.assertEqual(len(statuses), self.threads * self.bookings_per_thread)
+        self.assertEqual(set(statuses) - {200, 409}, set())
+        self.assert_no_double_booking()
+        self.assertEqual(statuses.count(200), Bookings.objects.count())
+        print(f'overlapping: {len(statuses) / elapsed:.1f} bookings/s')
+
+    def test_disjoint_bookings_all_succeed(self):
+        payloads = [
+            [booking_payload(check_in_offset=10 + 2 * (thread * self.bookings_per_thread + attempt), nights=2,
+                             guestPhone=f'{thread}{attempt}')
+             for attempt in range(self.bookings_per_thread)]
+            for thread in range(self.threads)
+        ]
+        statuses, elapsed = self.post_concurrently(payloads)
+
+        self.assertEqual(statuses, [200] * self.threads * self.bookings_per_thread)
+        self.assert_no_double_booking()
+        print(f'disjoint: {len(statuses) / elapsed:.1f} bookings/s')
+
+
+class RowLockTests(TestCase):
+    """
+    The SELECT ... FOR UPDATE path of locking.locked_stay, run on any
+    database by claiming row lock support and reading the rows unlocked.
+    """
+
+    def setUp(self):
+        for patcher in (mock.patch.object(connection.features, 'has_select_for_update', True),
+                        mock.patch.object(BookingDateLock.objects, 'select_for_update',
+                                          side_effect=BookingDateLock.objects.all)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_lock_rows_are_seeded_before_the_transaction(self):
+        BookingDateLock.objects.create(date=date.today() + timedelta(days=10))
+        with mock.patch.object(locking.transaction, 'atomic', wraps=locking.transaction.atomic) as atomic, \
+                mock.patch.object(BookingDateLock.objects, 'bulk_create',
+                                  side_effect=lambda *args, **kwargs: self.assertFalse(atomic.called)) as bulk_create:
+            self.assertEqual(self.client.post(reverse('bookings-list'), booking_payload(nights=3)).status_code, 200)
+        # Only the two nights without a row are inserted
+        self.assertEqual(len(bulk_create.call_args.args[0]), 2)
+
+        self.assertEqual(self.client.post(reverse('bookings-list'), booking_payload(check_in_offset=11)).status_code,
+                         409)
+        self.assertEqual(Bookings.objects.count(), 1)
+
+    def test_deadlock_answers_conflict(self):
+        deadlock = OperationalError(1213, 'Deadlock found when trying to get lock; try restarting transaction')
+        with mock.patch.object(BookingDateLock.objects, 'select_for_update', side_effect=deadlock):
+            response = self.client.post(reverse('bookings-list'), booking_payload())
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['detail'], locking.StayContended.default_detail)
+        self.assertFalse(Bookings.objects.exists())
+
+        with mock.patch.object(BookingDateLock.objects, 'select_for_update',
+                               side_effect=OperationalError(2006, 'MySQL server has gone away')), \
+                self.assertRaises(OperationalError):
+            self.client.post(reverse('bookings-list'), booking_payload())
+
+
+def jpeg_bytes(width=1600, height=1200):
+    from PIL import Image
+
+    image = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 120, 40)).save(image, format='JPEG')
+    return image.getvalue()
+
+
+def mp4_bytes(payload=b''):
+    return b'\x00\x00\x00\x18ftypmp42' + payload
+
+
+class CompressorTests(SimpleTestCase):
+
+    def decode(self, image_bytes):
+        from PIL import Image
+
+        return Image.open(io.BytesIO(image_bytes))
+
+    def test_exif_orientation_is_applied(self):
+        from PIL import Image
+
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise to display
+        image = io.BytesIO()
+        Image.new('RGB', (400, 200), (200, 120, 40)).save(image, format='JPEG', exif=exif.tobytes())
+
+        compressed = self.decode(compressor.compressImageWithBestQuality(image.getvalue(), max_size=1 << 20))
+        self.assertEqual(compressed.size, (200, 400))
+        self.assertNotIn(0x0112, compressed.getexif())
+        self.assertEqual([variant[2:4] for variant in compressor.buildImageVariants(image.getvalue())][-1], (160, 320))
+
+    def test_transparency_is_flattened_onto_white(self):
+        from PIL import Image
+
+        image = io.BytesIO()
+        transparent = Image.new('RGBA', (64, 64), (0, 0, 0, 0))
+        transparent.paste((255, 0, 0, 255), (0, 0, 32, 64))
+        transparent.save(image, format='PNG')
+
+        compressed = self.decode(compressor.compressImageWithBestQuality(image.getvalue(), max_size=1 << 20))
+        self.assertEqual(compressed.format, 'JPEG')
+        self.assertEqual(compressed.mode, 'RGB')
+        self.assertTrue(all(channel > 245 for channel in compressed.getpixel((48, 32))))
+        red, green, blue = compressed.getpixel((16, 32))
+        self.assertGreater(red, 245)
+        self.assertLess(green, 10)
+
+    def test_large_image_is_only_downscaled_when_it_does_not_fit(self):
+        image_bytes = jpeg_bytes(5000, 400)
+        self.assertEqual(self.decode(compressor.compressImageWithBestQuality(image_bytes, max_size=1 << 20)).size,
+                         (5000, 400))
+
+        large = len(compressor.compressImageWithBestQuality(image_bytes, min_quality=95, max_size=1 << 20))
+        downscaled = self.decode(compressor.compressImageWithBestQuality(image_bytes, min_quality=95,
+                                                                         max_size=large - 1))
+        self.assertLessEqual(max(downscaled.size), compressor.MAX_IMAGE_DIMENSION)
+
+
+class MediaProcessingTests(TemporaryMediaStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        Bookings.objects.create(bookingDate=date.today(), checkInDate=date.today(),
+                                checkOutDate=date.today(), guestPhone='9000000000')
+
+    @mock.patch.object(media_processing.settings, 'MEDIA_PROCESSING_MODE', 'queue')
+    def test_uploads_are_stored_raw_and_processed_by_worker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('reviews-list'), {
+                'guestPhone': '9000000000', 'rating': 4,
+                'media_list': [SimpleUploadedFile('photo.jpg', jpeg_bytes(), 'image/jpeg')],
+            })
+        self.assertEqual(response.status_code, 200)
+
+        media_list = self.client.get(reverse('reviews-list')).json()[0]['media_list']
+        self.assertEqual(media_list[0]['processing_status'], ReviewsMedia.PENDING)
+
+        call_command('process_media', '--once', stdout=io.StringIO())
+        media_entry = ReviewsMedia.objects.get()
+        self.assertEqual(media_entry.processingStatus, ReviewsMedia.DONE)
+        self.assertEqual(storage.read_media(media_entry), jpeg_bytes())
+
+    def test_image_variants_are_negotiated(self):
+        from PIL import Image
+
+        image_bytes = jpeg_bytes()
+        review = Reviews.objects.create(reviewDate=date.today(), rating=5)
+        media_entry = ReviewsMedia.objects.create(reviewId=review, mediaType='image/jpeg', mediaName='photo.jpg',
+                                                  media=image_bytes, processingStatus=ReviewsMedia.PENDING)
+        media_processing.process_media(media_entry.mediaId)
+        self.assertEqual(media_entry.variants.count(), 6)
+
+        url = reverse('reviews-media', kwargs={'pk': review.reviewId, 'mediaId': media_entry.mediaId})
+        response = self.client.get(url, {'size': 'thumb'}, HTTP_ACCEPT='image/webp,*/*')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(Image.open(io.BytesIO(b''.join(response.streaming_content))).size, (320, 240))
+
+        response = self.client.get(url, {'size': 'medium'}, HTTP_ACCEPT='image/jpeg')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('Accept', response['Vary'])
+
+        # An explicit choice wins over Accept, on the sync and the async endpoint
+        async_url = reverse('async-reviews-media', kwargs={'pk': review.reviewId, 'mediaId': media_entry.mediaId})
+        for variant_format, accept in (('webp', 'image/jpeg'), ('jpeg', 'image/webp,*/*')):
+            params = {'size': 'thumb', 'variant_format': variant_format}
+            for response in (self.client.get(url, params, HTTP_ACCEPT=accept),
+                             async_to_sync(self.async_client.get)(async_url, params, headers={'Accept': accept})):
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], f'image/{variant_format}')
+
+        response = self.client.get(url)
+        self.assertEqual(int(response['Content-Length']), len(image_bytes))
+
+    def test_failed_compression_keeps_raw_upload(self):
+        review = Reviews.objects.create(reviewDate=date.today(), rating=5)
+        media_entry = ReviewsMedia.objects.create(reviewId=review, mediaType='image/jpeg', mediaName='photo.jpg',
+                                                  media=b'raw-bytes', processingStatus=ReviewsMedia.PENDING)
+        with mock.patch.object(media_processing, 'compress_media', return_value=None), \
+                mock.patch.object(media_processing.settings, 'MAX_UPLOAD_SIZE', lambda: 4):
+            self.assertTrue(media_processing.process_media(media_entry.mediaId))
+        self.assertFalse(media_processing.process_media(media_entry.mediaId))
+
+        media_entry.refresh_from_db()
+        self.assertEqual(media_entry.processingStatus, ReviewsMedia.FAILED)
+        self.assertEqual(storage.read_media(media_entry), b'raw-bytes')
+
+    @mock.patch.object(media_processing.settings, 'MEDIA_PROCESSING_MODE', 'pool')
+    def test_pool_workers_read_uploads_from_storage(self):
+        review = Reviews.objects.create(reviewDate=date.today(), rating=5)
+        name, size = storage.save_media_bytes(jpeg_bytes())
+        media_entry = ReviewsMedia.objects.create(reviewId=review, mediaType='image/jpeg', mediaName='photo.jpg',
+                                                  mediaFile=name, mediaSize=size,
+                                                  processingStatus=ReviewsMedia.PENDING)
+        with mock.patch.object(media_processing, 'get_executor') as get_executor:
+            media_processing.submit([media_entry.mediaId])
+        self.addCleanup(admission.media_processing.leave)
+        # Only the file name is pickled to the worker process
+        get_executor.return_value.submit.assert_called_once_with(media_processing.process_stored_media, name,
+                                                                 'image/jpeg')
+
+        media_processing.store_result(media_entry.mediaId, media_processing.process_stored_media(name, 'image/jpeg'))
+        self.assertEqual(media_entry.variants.count(), 6)
+
+    def test_stored_uploads_are_read_by_path(self):
+        name, _ = storage.save_media_bytes(mp4_bytes(b'large'))
+        with mock.patch.object(media_processing.settings, 'MAX_UPLOAD_SIZE', lambda: 4), \
+                mock.patch.object(compressor, 'compressVideo', return_value=mp4_bytes(b'small')) as compress_video, \
+                mock.patch.object(media_processing.storage.ContentAddressedStorage, 'open') as storage_open:
+            result = media_processing.process_stored_media(name, 'video/mp4')
+        compress_video.assert_called_once_with(path=storage.get_media_storage().path(name))
+        storage_open.assert_not_called()
+        with storage.open_blob(result['media'][0])[0] as compressed:
+            self.assertEqual(compressed.read(), mp4_bytes(b'small'))
+
+        name, size = storage.save_media_bytes(jpeg_bytes())
+        with mock.patch.object(media_processing.settings, 'MAX_UPLOAD_SIZE', lambda: size), \
+                mock.patch.object(media_processing.storage.ContentAddressedStorage, 'open') as storage_open:
+            result = media_processing.process_stored_media(name, 'image/jpeg')
+        storage_open.assert_not_called()
+        self.assertEqual(result['media'][2], 'image/jpeg')
+        self.assertEqual(len(result['variants']), 6)
+
+    def test_unreferenced_files_are_deleted(self):
+        def stored(name):
+            return storage.get_media_storage().exists(name)
+
+        raw_name, raw_size = storage.save_media_bytes(mp4_bytes(b'raw'))
+        review = Reviews.objects.create(reviewDate=date.today(), rating=5)
+        media_entry, shared_entry = (
+            ReviewsMedia.objects.create(reviewId=review, mediaType='video/mp4', mediaName='clip.mp4',
+                                        mediaFile=raw_name, mediaSize=raw_size, processingStatus=status)
+            for status in (ReviewsMedia.PENDING, ReviewsMedia.DONE))
+        with mock.patch.object(media_processing.settings, 'MEDIA_BLOB_GRACE_SECONDS', 0), \
+                self.captureOnCommitCallbacks(execute=True):
+            media_processing.store_result(media_entry.mediaId, {'media': (*storage.save_media_bytes(
+                mp4_bytes(b'small')), 'video/mp4'), 'variants': []})
+        # The raw upload is still the file of another row
+        self.assertTrue(stored(raw_name))
+
+        with mock.patch.object(media_processing.settings, 'MEDIA_BLOB_GRACE_SECONDS', 0), \
+                self.captureOnCommitCallbacks(execute=True):
+            shared_entry.delete()
+        self.assertFalse(stored(raw_name))
+
+        # Files written or reused within the grace period are kept
+        media_entry.refresh_from_db()
+        compressed_name = media_entry.mediaFile.name
+        with self.captureOnCommitCallbacks(execute=True):
+            review.delete()
+        self.assertTrue(stored(compressed_name))
+
+        orphan_name, _ = storage.save_media_bytes(b'orphan')
+        kept_name, kept_size = storage.save_media_bytes(mp4_bytes(b'kept'))
+        ReviewsMedia.objects.create(reviewId=Reviews.objects.create(reviewDate=date.today(), rating=4),
+                                    mediaType='video/mp4', mediaFile=kept_name, mediaSize=kept_size)
+        output = io.StringIO()
+        call_command('collect_media_blobs', grace_seconds=0, stdout=output)
+        self.assertIn('done checked=3 deleted=2', output.getvalue())
+        self.assertEqual(list(storage.stored_names()), [kept_name])
+
+    def test_reencoded_video_takes_the_output_type(self):
+        review = Reviews.objects.create(reviewDate=date.today(), rating=5)
+        media_entry = ReviewsMedia.objects.create(reviewId=review, mediaType='video/quicktime', mediaName='clip.mov',
+                                                  media=b'raw-quicktime', processingStatus=ReviewsMedia.PENDING)
+        with mock.patch.object(media_processing, 'compress_media', return_value=mp4_bytes(b'small')), \
+                mock.patch.object(media_processing.settings, 'MAX_UPLOAD_SIZE', lambda: 4):
+            media_processing.process_media(media_entry.mediaId)
+
+        media_entry.refresh_from_db()
+        self.assertEqual(media_entry.mediaType, 'video/mp4')
+        self.assertEqual(storage.read_media(media_entry), mp4_bytes(b'small'))
+
+    def test_identical_uploads_share_one_file(self):
+        with self.captureOnCommitCallbacks(execute=True), \
+                mock.patch.object(media_processing.settings, 'MEDIA_PROCESSING_MODE', 'queue'):
+            self.client.post(reverse('reviews-list'), {
+                'guestPhone': '9000000000', 'rating': 4,
+                'media_list': [SimpleUploadedFile('a.mp4', mp4_bytes(b'same'), 'video/mp4'),
+                               SimpleUploadedFile('b.mp4', mp4_bytes(b'same'), 'video/mp4')],
+            })
+        first, second = ReviewsMedia.objects.order_by('mediaId')
+        self.assertEqual(first.mediaFile.name, second.mediaFile.name)
+        self.assertEqual(bytes(first.media), b'')
+        self.assertEqual(first.mediaSize, len(mp4_bytes(b'same')))
+
+    def test_legacy_blobs_are_migrated_to_storage(self):
+        review = Reviews.objects.create(reviewDate=date.today(), rating=5)
+        media_entries = [ReviewsMedia.objects.create(reviewId=review, mediaType='video/mp4', mediaName=f'{index}.mp4',
+                                                     media=b'legacy-%d' % index) for index in range(3)]
+        ReviewsMediaVariant.objects.create(mediaId=media_entries[0], variantSize='thumb', variantFormat='jpeg',
+                                           width=1, height=1)
+
+        call_command('migrate_media_blobs', '--batch-size', '2', stdout=io.StringIO())
+        for index, media_entry in enumerate(media_entries):
+            media_entry.refresh_from_db()
+            self.assertEqual(bytes(media_entry.media), b'')
+            self.assertEqual(storage.read_media(media_entry), b'legacy-%d' % index)
+        self.assertFalse(ReviewsMediaVariant.objects.exists())
+
+        url = reverse('reviews-media', kwargs={'pk': review.reviewId, 'mediaId': media_entries[1].mediaId})
+        response = self.client.get(url, HTTP_RANGE='bytes=0-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'legacy')
+
+    def test_ranges_of_empty_media_are_unsatisfiable(self):
+        review = Reviews.objects.create(reviewDate=date.today(), rating=5)
+        media_entry = ReviewsMedia.objects.create(reviewId=review, mediaType='video/mp4', mediaName='empty.mp4',
+                                                  media=b'')
+        url = reverse('reviews-media', kwargs={'pk': review.reviewId, 'mediaId': media_entry.mediaId})
+        for byte_range in ('bytes=-500', 'bytes=0-'):
+            response = self.client.get(url, HTTP_RANGE=byte_range)
+            self.assertEqual(response.status_code, 416)
+            self.assertEqual(response['Content-Range'], 'bytes */0')
+
+
+class MultipartStream:
+    """
+    A multipart/form-data body with one large file, generated as it is read.
+    """
+    boundary = 'farmhouse-boundary'
+
+    def __init__(self, megabytes, header=b''):
+        self.parts = [
+            (f'--{self.boundary}\r\nContent-Disposition: form-data; name="media_list"; filename="video.mp4"\r\n'
+             f'Content-Type: video/mp4\r\n\r\n').encode() + header,
+            (b'x' * (1024 * 1024) for _ in range(megabytes)),
+            f'\r\n--{self.boundary}--\r\n'.encode(),
+        ]
+        self.file_size = len(header) + megabytes * 1024 * 1024
+        self.length = len(self.parts[0]) + megabytes * 1024 * 1024 + len(self.parts[2])
+        self.buffer = b''
+
+    def chunks(self):
+        yield self.parts[0]
+        yield from self.parts[1]
+        yield self.parts[2]
+
+    def read(self, size=-1):
+        if not hasattr(self, 'iterator'):
+            self.iterator = self.chunks()
+        while size < 0 or len(self.buffer) < size:
+            chunk = next(self.iterator, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        size = len(self.buffer) if size < 0 else size
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def meta(self):
+        return {
+            'CONTENT_TYPE': f'multipart/form-data; boundary={self.boundary}',
+            'CONTENT_LENGTH': str(self.length),
+        }
+
+
+class StreamingUploadTests(TemporaryMediaStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        Bookings.objects.create(bookingDate=date.today(), checkInDate=date.today(),
+                                checkOutDate=date.today(), guestPhone='9000000000')
+
+    def post_review(self, *media):
+        return self.client.post(reverse('reviews-list'), {'guestPhone': '9000000000', 'rating': 4,
+                                                          'media_list': list(media)})
+
+    def test_type_is_sniffed_from_content(self):
+        response = self.post_review(SimpleUploadedFile('clip.jpg', mp4_bytes(b'video'), 'image/jpeg'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ReviewsMedia.objects.get().mediaType, 'video/mp4')
+
+    def test_unsupported_upload_is_rejected(self):
+        response = self.post_review(SimpleUploadedFile('notes.jpg', b'#!/bin/sh\nrm -rf /\n', 'image/jpeg'))
+        self.assertEqual(response.status_code, 415)
+        self.assertFalse(Reviews.objects.exists())
+
+    def test_only_video_brands_of_iso_media_are_accepted(self):
+        for brand, media_type in ((b'isom', 'video/mp4'), (b'M4V ', 'video/mp4'), (b'qt  ', 'video/quicktime'),
+                                  (b'heic', None), (b'M4A ', None)):
+            self.assertEqual(media_processing.sniff_media_type(b'\x00\x00\x00\x18ftyp' + brand), media_type)
+
+        for name, header in (('photo.heic', b'\x00\x00\x00\x18ftypheic'), ('song.m4a', b'\x00\x00\x00\x20ftypM4A ')):
+            response = self.post_review(SimpleUploadedFile(name, header + b'\x00' * 64, 'video/mp4'))
+            self.assertEqual(response.status_code, 415)
+        self.assertFalse(Reviews.objects.exists())
+
+    def test_size_limits_are_enforced(self):
+        with mock.patch.object(uploads.settings, 'MEDIA_UPLOAD_MAX_FILE_SIZE', 1024):
+            response = self.post_review(SimpleUploadedFile('a.mp4', mp4_bytes(b'x' * 2048), 'video/mp4'))
+        self.assertEqual(response.status_code, 413)
+
+        with mock.patch.object(uploads.settings, 'MEDIA_UPLOAD_MAX_REQUEST_SIZE', 3000):
+            response = self.post_review(SimpleUploadedFile('a.mp4', mp4_bytes(b'a' * 1500), 'video/mp4'),
+                                        SimpleUploadedFile('b.mp4', mp4_bytes(b'b' * 1500), 'video/mp4'))
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(ReviewsMedia.objects.exists())
+
+    def test_peak_memory_is_independent_of_upload_size(self):
+        review = Reviews.objects.create(reviewDate=date.today(), rating=5)
+        peaks = {}
+        for megabytes in (1, 100):
+            stream = MultipartStream(megabytes, header=mp4_bytes())
+            request = mock.Mock(META=stream.meta())
+            tracemalloc.start()
+            try:
+                _, files = MultiPartParser(stream.meta(), stream, [uploads.MediaUploadHandler(request)]).parse()
+                self.assertTrue(utils.setMedia(files.getlist('media_list'), review))
+                peaks[megabytes] = tracemalloc.get_traced_memory()[1]
+                files['media_list'].close()
+            finally:
+                tracemalloc.stop()
+
+        self.assertEqual(ReviewsMedia.objects.order_by('mediaId').last().mediaSize, stream.file_size)
+        # A 100x larger upload may not cost more than a few chunks of extra memory
+        print(f'peak traced memory: 1 MB upload {peaks[1]} B, 100 MB upload {peaks[100]} B')
+        self.assertLess(peaks[100], peaks[1] + 4 * 1024 * 1024)
+
+
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+
+    def create_dish(self, name):
+        with self.captureOnCommitCallbacks(execute=True):
+            Menu.objects.create(dishName=name, dishDescription='', dishPrice=100)
+
+    def test_listing_is_served_from_cache_until_invalidated(self):
+        self.create_dish('Dal')
+        self.client.get(reverse('menu-list'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('menu-list'))
+        self.assertEqual([dish['dishName'] for dish in response.json()], ['Dal'])
+
+        self.create_dish('Roti')
+        response = self.client.get(reverse('menu-list'))
+        self.assertEqual([dish['dishName'] for dish in response.json()], ['Dal', 'Roti'])
+
+        # Query strings are cached separately
+        response = self.client.get(reverse('menu-list'), {'fields': 'dishName'})
+        self.assertEqual(response.json()[0], {'dishName': 'Dal'})
+
+    def test_conditional_requests(self):
+        self.create_dish('Dal')
+        response = self.client.get(reverse('menu-list'))
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(reverse('menu-list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(reverse('menu-list'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        self.create_dish('Roti')
+        response = self.client.get(reverse('menu-list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    @mock.patch.object(media_processing.settings, 'MEDIA_PROCESSING_MODE', 'queue')
+    def test_media_processing_invalidates_reviews(self):
+        review = Reviews.objects.create(reviewDate=date.today(), rating=5)
+        media_entry = ReviewsMedia.objects.create(reviewId=review, mediaType='video/mp4', mediaName='clip.mp4',
+                                                  media=mp4_bytes(), processingStatus=ReviewsMedia.PENDING)
+        response = self.client.get(reverse('reviews-list'))
+        self.assertEqual(response.json()[0]['media_list'][0]['processing_status'], ReviewsMedia.PENDING)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            media_processing.process_media(media_entry.mediaId)
+        response = self.client.get(reverse('reviews-list'))
+        self.assertEqual(response.json()[0]['media_list'][0]['processing_status'], ReviewsMedia.DONE)
+
+    def test_concurrent_misses_wait_for_one_build(self):
+        cache = response_cache.get_cache()
+        cache.add('entry:lock', 1)
+        threading.Timer(0.1, cache.set, ('entry', {'content': b'[]'})).start()
+
+        build = mock.Mock(return_value={'content': b'rebuilt'})
+        self.assertEqual(response_cache.build_once(cache, 'entry', build), {'content': b'[]'})
+        build.assert_not_called()
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+        self.booking = Bookings.objects.create(bookingDate=date.today(), checkInDate=date.today(),
+                                               checkOutDate=date.today(), guestPhone='9000000000')
+
+    def assert_not_modified(self, url, etag, queries=1, **params):
+        # Answered from the validator query alone, or from the response cache
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_list_validators_track_inserts_updates_and_deletes(self):
+        url = reverse('bookings-list')
+        etag = self.client.get(url)['ETag']
+        self.assert_not_modified(url, etag)
+
+        self.booking.paymentStatus = 'PAID'
+        self.booking.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        other = Bookings.objects.create(bookingDate=date.today(), checkInDate=date.today(),
+                                        checkOutDate=date.today(), guestPhone='9000000001')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(response.json()), 2)
+        etag = response['ETag']
+
+        other.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_query_string_and_retrieve_have_their_own_validators(self):
+        url = reverse('bookings-list')
+        full = self.client.get(url)['ETag']
+        sparse = self.client.get(url, {'fields': 'bookingId'})['ETag']
+        self.assertNotEqual(full, sparse)
+        self.assert_not_modified(url, sparse, fields='bookingId')
+
+        detail_url = reverse('bookings-detail', kwargs={'pk': self.booking.bookingId})
+        response = self.client.get(detail_url)
+        self.assert_not_modified(detail_url, response['ETag'])
+        response = self.client.get(detail_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_review_validators_follow_media_processing(self):
+        review = Reviews.objects.create(reviewDate=date.today(), rating=5)
+        media_entry = ReviewsMedia.objects.create(reviewId=review, mediaType='video/mp4', mediaName='clip.mp4',
+                                                  media=mp4_bytes(), processingStatus=ReviewsMedia.PENDING)
+        url = reverse('reviews-list')
+        etag = self.client.get(url)['ETag']
+        self.assert_not_modified(url, etag, queries=0)
+
+        with mock.patch.object(media_processing.settings, 'MEDIA_PROCESSING_MODE', 'queue'), \
+                self.captureOnCommitCallbacks(execute=True):
+            media_processing.process_media(media_entry.mediaId)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['media_list'][0]['processing_status'], ReviewsMedia.DONE)
+
+
+class InstrumentationTests(TestCase):
+
+    def test_requests_are_timed_and_exposed_as_metrics(self):
+        Bookings.objects.create(bookingDate=date.today(), checkInDate=date.today(),
+                                checkOutDate=date.today(), guestPhone='9000000000')
+        with self.assertLogs('FarmHouse_Website.instrumentation', 'INFO') as logs:
+            response = self.client.get(reverse('bookings-list'), HTTP_X_REQUEST_ID='trace-123')
+        self.assertEqual(response['X-Request-ID'], 'trace-123')
+        self.assertEqual(logs.records[0].request_id, 'trace-123')
+        self.assertIn('view=BookingViewSet action=list', logs.output[0])
+        self.assertIn('serialization_ms=', logs.output[0])
+
+        metrics = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('http_request_duration_seconds_bucket{view="BookingViewSet",action="list",'
+                      'method="GET",status="200",le="+Inf"}', metrics)
+        self.assertRegex(metrics, r'http_request_db_queries_count\{view="BookingViewSet",action="list"\} [1-9]')
+        self.assertIn('phase_duration_seconds_count{phase="serialization"}', metrics)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = instrumentation.Histogram('test_seconds', 'Test.', ('kind',), buckets=(1, 5))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value, kind='a')
+        self.assertEqual(histogram.render().splitlines()[2:], [
+            'test_seconds_bucket{kind="a",le="1"} 2',
+            'test_seconds_bucket{kind="a",le="5"} 3',
+            'test_seconds_bucket{kind="a",le="+Inf"} 4',
+            'test_seconds_sum{kind="a"} 14.5',
+            'test_seconds_count{kind="a"} 4',
+        ])
+
+    @mock.patch.object(instrumentation.settings, 'METRICS_TOKEN', 'secret')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+
+async def read_streaming_content(response):
+    return b''.join([chunk async for chunk in response.streaming_content])
+
+
+class AsyncViewsTests(TemporaryMediaStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        response_cache.get_cache().clear()
+        self.review = Reviews.objects.create(reviewDate=date.today(), rating=5, reviewTitle='Lovely')
+        media_file, media_size = storage.save_media_bytes(mp4_bytes(b'clip'))
+        self.media_entry = ReviewsMedia.objects.create(reviewId=self.review, mediaType='video/mp4', mediaName='clip.mp4',
+                                                       mediaFile=media_file, mediaSize=media_size)
+        for name in ('Dal', 'Roti'):
+            Menu.objects.create(dishName=name, dishDescription='', dishPrice=100)
+
+    def aget(self, url, data=None, **headers):
+        return async_to_sync(self.async_client.get)(url, data, headers=headers)
+
+    def test_listings_match_sync_endpoints(self):
+        for async_name, sync_name, params in (('async-menu-list', 'menu-list', {}),
+                                              ('async-menu-list', 'menu-list', {'fields': 'dishName'}),
+                                              ('async-reviews-list', 'reviews-list', {'page_size': 1})):
+            expected = self.client.get(reverse(sync_name), params).json()
+            with self.assertLogs('FarmHouse_Website.instrumentation', 'INFO') as logs:
+                actual = self.aget(reverse(async_name), params).json()
+            if 'results' in expected:
+                expected, actual = expected['results'], actual['results']
+            for row in expected:
+                for media in row.get('media_list', []):
+                    media.pop('media_url')
+                    media.pop('thumbnail_url', None)
+            for row in actual:
+                for media in row.get('media_list', []):
+                    self.assertIn('/async/reviews/', media.pop('media_url'))
+                    media.pop('thumbnail_url', None)
+            self.assertEqual(actual, expected)
+            # Queries run by the async ORM's threads are attributed to the request
+            self.assertRegex(logs.output[0], r'queries=[1-9]')
+
+    def test_retrieve_revalidates_and_404s(self):
+        url = reverse('async-reviews-detail', kwargs={'pk': self.review.reviewId})
+        response = self.aget(url)
+        self.assertEqual(response.json()['reviewTitle'], 'Lovely')
+        self.assertEqual(len(response.json()['media_list']), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.aget(url, **{'If-None-Match': response['ETag']}).status_code, 304)
+
+        self.review.rating = 4
+        self.review.save()
+        self.assertEqual(self.aget(url, **{'If-None-Match': response['ETag']}).status_code, 200)
+        self.assertEqual(self.aget(reverse('async-reviews-detail', kwargs={'pk': 999})).status_code, 404)
+
+    def test_media_is_streamed_asynchronously(self):
+        url = reverse('async-reviews-media', kwargs={'pk': self.review.reviewId, 'mediaId': self.media_entry.mediaId})
+        response = self.aget(url, Range='bytes=4-7')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response.is_async)
+        self.assertEqual(async_to_sync(read_streaming_content)(response), mp4_bytes(b'clip')[4:8])
+
+    def test_availability_check(self):
+        check_in = date.today() + timedelta(days=10)
+        Bookings.objects.create(bookingDate=date.today(), checkInDate=check_in,
+                                checkOutDate=check_in + timedelta(days=2), paymentStatus='PAID')
+        url = reverse('async-availability')
+
+        def available(offset, nights):
+            start = check_in + timedelta(days=offset)
+            return self.aget(url, {'check_in': start.isoformat(),
+                                   'check_out': (start + timedelta(days=nights)).isoformat()}).json()['available']
+
+        self.assertFalse(available(1, 3))
+        self.assertTrue(available(2, 1))
+        self.assertEqual(self.aget(url, {'check_in': 'soon', 'check_out': 'later'}).status_code, 400)
+        self.assertEqual(self.aget(url, {'check_in': check_in.isoformat()}).status_code, 400)
+        self.assertEqual(self.aget(url, {'check_out': check_in.isoformat()}).status_code, 400)
+
+        availability.paid_stays.invalidate()
+        calendar = self.aget(url).json()
+        self.assertEqual(calendar, self.client.get(reverse('availability')).json())
+
+
+class BookingTransferTests(TestCase):
+
+    def setUp(self):
+        self.check_in = date.today() + timedelta(days=20)
+        Bookings.objects.create(bookingDate=date.today(), checkInDate=self.check_in,
+                                checkOutDate=self.check_in + timedelta(days=3), paymentStatus='PAID',
+                                guestName='Offline, "VIP"', guestPhone='9000000000')
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+
+    def row(self, offset, nights=1, **overrides):
+        start = self.check_in + timedelta(days=offset)
+        return {'checkInDate': start.isoformat(), 'checkOutDate': (start + timedelta(days=nights)).isoformat(),
+                'paymentStatus': 'PAID', 'paymentAmount': '5000', 'guestName': 'Imported',
+                'guestPhone': '9100000000', **overrides}
+
+    def test_export_streams_csv_and_ndjson(self):
+        response = self.client.get(reverse('bookings-export'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0]['guestName'], 'Offline, "VIP"')
+        self.assertNotIn('updatedAt', rows[0])
+
+        response = self.client.get(reverse('bookings-export'), {'format': 'ndjson'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(json.loads(lines[0])['checkInDate'], self.check_in.isoformat())
+
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('bookings-export')).status_code, 403)
+
+    def test_import_reports_errors_per_row(self):
+        rows = [
+            self.row(1),                                    # overlaps the booked stay
+            self.row(3),                                    # free
+            self.row(3, paymentStatus='PENDING'),           # overlaps row 2 of the batch
+            self.row(10, checkInDate='tomorrowish'),
+            self.row(-30),                                  # in the past
+            self.row(10, paymentStatus='PENDING'),          # pending stays do not block each other
+            self.row(10, paymentStatus='PENDING'),
+        ]
+        upload = SimpleUploadedFile('bookings.ndjson', ''.join(json.dumps(row) + '\n' for row in rows).encode() + b'{oops\n')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('bookings-import-bookings'), {'file': upload})
+        report = response.json()
+        self.assertEqual((report['rows'], report['created']), (8, 3))
+        self.assertEqual({error['row']: list(error['errors']) for error in report['errors']}, {
+            1: ['conflicts'], 3: ['conflicts'], 4: ['checkInDate'], 5: ['non_field_errors'], 8: ['non_field_errors'],
+        })
+        self.assertEqual(report['errors'][0]['errors']['conflicts'][0]['start'], self.check_in.isoformat())
+        self.assertEqual(Bookings.objects.filter(guestName='Imported').count(), 3)
+        self.assertEqual(len(mail.outbox) + OutboundEmail.objects.count(), 0)
+        self.assertEqual(len(utils.query_booking_conflicts(self.check_in + timedelta(days=3),
+                                                           self.check_in + timedelta(days=4))), 1)
+
+    def test_command_imports_csv_export(self):
+        export = b''.join(self.client.get(reverse('bookings-export')).streaming_content)
+        Bookings.objects.all().delete()
+        with tempfile.NamedTemporaryFile(suffix='.csv') as export_file:
+            export_file.write(export)
+            export_file.flush()
+            stdout = io.StringIO()
+            call_command('import_bookings', export_file.name, '--dry-run', stdout=stdout)
+            self.assertIn('rows=1 valid=1 created=0 errors=0', stdout.getvalue())
+            call_command('import_bookings', export_file.name, stdout=stdout)
+        self.assertEqual(Bookings.objects.get().guestName, 'Offline, "VIP"')
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(TestCase):
+
+    def test_connections_are_reused_and_bounded(self):
+        pool = ConnectionPool(size=2, timeout=0.05)
+        first = pool.acquire(FakeConnection)
+        second = pool.acquire(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection)
+
+        pool.release(first)
+        self.assertIs(pool.acquire(FakeConnection), first)
+        pool.release(second, reusable=False)
+        self.assertTrue(second.closed)
+        self.assertIsNot(pool.acquire(FakeConnection), second)
+        self.assertEqual(pool.stats(), {'size': 2, 'open': 2, 'idle': 0})
+
+    def test_unusable_and_expired_connections_are_replaced(self):
+        pool = ConnectionPool(size=1, max_lifetime=60)
+        broken = pool.acquire(FakeConnection)
+        pool.release(broken)
+        replacement = pool.acquire(FakeConnection, is_usable=lambda connection: connection is not broken)
+        self.assertTrue(broken.closed)
+
+        pool.release(replacement)
+        with mock.patch('FarmHouse_Website.db.pool.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNot(pool.acquire(FakeConnection), replacement)
+        self.assertTrue(replacement.closed)
+
+
+class ReviewSummaryTests(TestCase):
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+
+    def create_review(self, rating, days_ago=0, **fields):
+        return Reviews.objects.create(reviewDate=date.today() - timedelta(days=days_ago),
+                                      rating=rating, **fields)
+
+    def summary_totals(self):
+        return dict(ReviewSummary.objects.values().get(summaryId=review_summary.SUMMARY_ID), updatedAt=None)
+
+    def test_signals_keep_summary_in_step_with_rebuild(self):
+        reviews = [self.create_review(rating) for rating in (5, 5, 4, 2)]
+        reviews[0].rating = 3
+        reviews[0].save()
+        reviews[1].reviewTitle = 'Renamed'
+        reviews[1].save(update_fields=['reviewTitle'])
+        reviews[2].delete()
+
+        incremental = self.summary_totals()
+        review_summary.rebuild()
+        self.assertEqual(incremental, self.summary_totals())
+        self.assertEqual(review_summary.summary_payload(review_summary.get_summary()),
+                         {'count': 3, 'average': 3.33, 'histogram': {'1': 0, '2': 1, '3': 1, '4': 0, '5': 1}})
+
+    def test_summary_endpoint_reads_one_row(self):
+        for rating in (4, 5):
+            self.create_review(rating)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('reviews-summary'))
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(response.json()['average'], 4.5)
+
+        # Served from the response cache until a review changes
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_review(1)
+        self.assertEqual(self.client.get(reverse('reviews-summary')).json()['histogram']['1'], 1)
+
+    def test_top_reviews_link_first_image_thumbnail(self):
+        old = self.create_review(5, days_ago=3, reviewTitle='Old')
+        latest = self.create_review(5, days_ago=1, reviewTitle='Latest')
+        self.create_review(2, reviewTitle='Low')
+        ReviewsMedia.objects.create(reviewId=latest, mediaType='video/mp4', mediaName='clip.mp4')
+        image = ReviewsMedia.objects.create(reviewId=latest, mediaType='image/jpeg', mediaName='a.jpg')
+        ReviewsMedia.objects.create(reviewId=latest, mediaType='image/jpeg', mediaName='b.jpg')
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('reviews-top'), {'limit': 5, 'min_rating': 4})
+        top = response.json()
+        self.assertEqual([review['reviewTitle'] for review in top], ['Latest', 'Old'])
+        self.assertTrue(top[0]['thumbnail_url'].endswith(
+            reverse('reviews-media', kwargs={'pk': latest.reviewId, 'mediaId': image.mediaId}) + '?size=thumb'))
+        self.assertIsNone(top[1]['thumbnail_url'])
+        self.assertNotIn('media_list', top[0])
+        self.assertEqual(old.reviewId, top[1]['reviewId'])
+
+        self.assertEqual(self.client.get(reverse('reviews-top'), {'limit': 'all'}).status_code, 400)
+
+    def test_rebuild_command_repairs_bypassed_writes(self):
+        Reviews.objects.bulk_create([Reviews(reviewDate=date.today(), rating=4) for _ in range(3)])
+        self.assertFalse(ReviewSummary.objects.exists())
+
+        out = io.StringIO()
+        call_command('rebuild_review_summary', stdout=out)
+        self.assertIn('count=3 average=4.0', out.getvalue())
+        self.assertEqual(review_summary.get_summary().fourStarCount, 3)
+
+
+
+class ReviewBookingLinkTests(TestCase):
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+
+    def create_booking(self, check_in_offset, guest_phone='9000000000'):
+        check_in = date.today() - timedelta(days=check_in_offset)
+        return Bookings.objects.create(bookingDate=check_in, checkInDate=check_in,
+                                       checkOutDate=check_in + timedelta(days=2), guestPhone=guest_phone)
+
+    def test_review_links_latest_booking_of_guest(self):
+        self.create_booking(30)
+        latest = self.create_booking(5)
+        self.create_booking(1, guest_phone='9111111111')
+
+        response = self.client.post(reverse('reviews-list'), {'guestPhone': '9000000000', 'rating': 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Reviews.objects.get().bookingId, latest)
+
+        response = self.client.post(reverse('reviews-list'), {'guestPhone': '9222222222', 'rating': 4})
+        self.assertEqual(response.status_code, 406)
+
+    def test_payloads_carry_stay_dates_without_extra_queries(self):
+        for offset in range(5):
+            Reviews.objects.create(bookingId=self.create_booking(10 + offset), reviewDate=date.today(), rating=5)
+        stayless = Reviews.objects.create(reviewDate=date.today(), rating=3)
+
+        # Reviews joined to their bookings, media
+        with self.assertNumQueries(2):
+            reviews = self.client.get(reverse('reviews-list')).json()
+        stays = {review['reviewId']: review['stay'] for review in reviews}
+        self.assertIsNone(stays.pop(stayless.reviewId))
+        for review in Reviews.objects.exclude(reviewId=stayless.reviewId).select_related('bookingId'):
+            self.assertEqual(stays[review.reviewId], {'checkInDate': review.bookingId.checkInDate.isoformat(),
+                                                      'checkOutDate': review.bookingId.checkOutDate.isoformat()})
+
+        sparse = self.client.get(reverse('reviews-list'), {'fields': 'rating,stay'}).json()
+        self.assertEqual(set(sparse[0]), {'rating', 'stay'})
+        # The async ORM cannot load the booking lazily
+        detail_url = reverse('async-reviews-detail', kwargs={'pk': Reviews.objects.first().reviewId})
+        self.assertIn('checkInDate', async_to_sync(self.async_client.get)(detail_url).json()['stay'])
+
+    def test_deleting_a_booking_keeps_its_reviews(self):
+        review = Reviews.objects.create(bookingId=self.create_booking(10), reviewDate=date.today(), rating=5)
+        review.bookingId.delete()
+        review.refresh_from_db()
+        self.assertIsNone(review.bookingId)
+
+    def test_repair_command_unlinks_dangling_reviews(self):
+        linked = Reviews.objects.create(bookingId=self.create_booking(10), reviewDate=date.today(), rating=5)
+        # Constraints are only checked when the test's transaction ends
+        dangling = Reviews.objects.create(bookingId_id=999, reviewDate=date.today(), rating=4)
+
+        out = io.StringIO()
+        call_command('repair_review_bookings', '--dry-run', stdout=out)
+        self.assertIn('dangling=1', out.getvalue())
+        call_command('repair_review_bookings', stdout=out)
+        self.assertIn('unlinked=1', out.getvalue())
+
+        dangling.refresh_from_db()
+        linked.refresh_from_db()
+        self.assertIsNone(dangling.bookingId_id)
+        self.assertIsNotNone(linked.bookingId_id)
+
+
+class MenuCatalogTests(TestCase):
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+        menu_catalog.catalog.invalidate()
+        for name, category, source, price, description in (
+                ('Dal Tadka', 'Mains', 'Farm', 180, 'Yellow lentils'),
+                ('Paneer Tikka', 'Starters', 'Farm', 260, 'Grilled cottage cheese'),
+                ('Masala Chai', 'Drinks', 'Kitchen', 40, 'Spiced tea'),
+                ('Jeera Rice', 'Mains', 'Kitchen', 120, 'Cumin rice with dal')):
+            Menu.objects.create(dishName=name, dishCategory=category, dishSource=source, dishPrice=price,
+                                dishDescription=description)
+
+    def dish_names(self, url, params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(dish['dishName'] for dish in response.json())
+
+    def test_list_filters(self):
+        for url in (reverse('menu-list'), reverse('async-menu-list')):
+            self.assertEqual(self.dish_names(url, {'category': 'Mains'}), ['Dal Tadka', 'Jeera Rice'])
+            self.assertEqual(self.dish_names(url, {'category': 'Mains,Drinks', 'source': 'Kitchen'}),
+                             ['Jeera Rice', 'Masala Chai'])
+            self.assertEqual(self.dish_names(url, {'min_price': 100, 'max_price': 200}), ['Dal Tadka', 'Jeera Rice'])
+            self.assertEqual(self.dish_names(url, {'search': 'dal'}), ['Dal Tadka', 'Jeera Rice'])
+            self.assertEqual(self.client.get(url, {'min_price': 'cheap'}).status_code, 400)
+
+    def test_catalog_is_served_from_snapshot_until_menu_changes(self):
+        response = self.client.get(reverse('menu-catalog'))
+        categories = {group['category']: [dish['dishName'] for dish in group['dishes']]
+                      for group in response.json()['categories']}
+        self.assertEqual(categories, {'Drinks': ['Masala Chai'], 'Mains': ['Dal Tadka', 'Jeera Rice'],
+                                      'Starters': ['Paneer Tikka']})
+
+        # The version aggregate only
+        with self.assertNumQueries(2):
+            cached = self.client.get(reverse('menu-catalog'))
+            not_modified = self.client.get(reverse('menu-catalog'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(not_modified.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Menu.objects.filter(dishName='Masala Chai').get().delete()
+        response = self.client.get(reverse('menu-catalog'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Drinks', [group['category'] for group in response.json()['categories']])
+
+    def test_catalog_sees_changes_made_by_other_processes(self):
+        self.client.get(reverse('menu-catalog'))
+        # Like a save in another worker: no signal and no cache bump reaches this process
+        Menu.objects.filter(dishName='Dal Tadka').update(dishPrice=200, updatedAt=timezone.now() + timedelta(seconds=1))
+        dishes = [dish for group in self.client.get(reverse('menu-catalog')).json()['categories']
+                  for dish in group['dishes']]
+        self.assertIn(200, [dish['dishPrice'] for dish in dishes])
+
+
+class FastSerializationTests(TestCase):
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+        for index in range(3):
+            booking = Bookings.objects.create(bookingDate=date.today(), checkInDate=date.today() + timedelta(days=index),
+                                              checkOutDate=date.today() + timedelta(days=index + 2),
+                                              guestName=f'Gäst {index}', guestPhone=f'900000000{index}')
+            Reviews.objects.create(bookingId=booking, reviewDate=date.today(), rating=4, reviewTitle='Line\u2028break')
+            Menu.objects.create(dishName=f'Dish {index}', dishDescription='', dishPrice=100 + index)
+        Reviews.objects.create(reviewDate=date.today(), rating=2)
+
+    def test_renderer_matches_drf_output(self):
+        data = {'date': date(2024, 1, 2), 'datetime': timezone.now(), 'decimal': Decimal('1.50'), 'text': 'Gäst \u2029',
+                1: [None, True, 1.5]}
+        expected = JSONRenderer().render(data)
+        self.assertEqual(renderers.FastJSONRenderer().render(data), expected)
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.FastJSONRenderer().render(data), expected)
+
+    def test_parser_rejects_malformed_json(self):
+        parser = renderers.FastJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO(b'{"rating": 5}')), {'rating': 5})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"rating": NaN}'))
+
+    def test_values_serializers_match_model_serializers(self):
+        for values_serializer_class, serializer_class, queryset in (
+                (BookingsValuesSerializer, BookingsSerializer, Bookings.objects.all()),
+                (MenuValuesSerializer, MenuSerializer, Menu.objects.all()),
+                (ReviewsValuesSerializer, ReviewsSerializer, Reviews.objects.select_related('bookingId'))):
+            for requested_fields in (None, {'stay', 'rating'}, {'guestName'}, {'dishName', 'dishImage'}):
+                values_serializer = values_serializer_class(requested_fields)
+                fast = values_serializer.serialize(values_serializer.values(queryset.order_by('pk')))
+                request = RequestFactory().get('/', {'fields': ','.join(requested_fields or ())})
+                slow = serializer_class(queryset.order_by('pk'), many=True, context={'request': request}).data
+                self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(slow))
+
+    def test_paginated_lists_walk_all_rows(self):
+        for name, key in (('bookings-list', 'bookingId'), ('reviews-list', 'reviewId'), ('menu-list', 'dishId')):
+            url, params, seen = reverse(name), {'page_size': 2, 'fields': key}, []
+            while url:
+                page = self.client.get(url, params).json()
+                seen.extend(row[key] for row in page['results'])
+                url, params = page['next'], None
+            self.assertEqual(len(seen), len(set(seen)))
+            self.assertEqual(len(seen), len(self.client.get(reverse(name)).json()))
+
+
+class WriteLimitsTests(TestCase):
+
+    def setUp(self):
+        throttling.get_cache().clear()
+        Bookings.objects.create(bookingDate=date.today(), checkInDate=date.today(), checkOutDate=date.today(),
+                                guestPhone='9000000000', guestEmail='guest@example.com')
+
+    def post_booking(self, index, **overrides):
+        guest = {'guestPhone': f'91{index:08d}', 'guestEmail': f'guest{index}@example.com', **overrides}
+        return self.client.post(reverse('bookings-list'), booking_payload(check_in_offset=10 + 3 * index, **guest))
+
+    def test_token_bucket_refills_evenly(self):
+        with mock.patch.dict(throttling.settings.THROTTLE_RATES, {'test': '2/min'}):
+            self.assertEqual(throttling.take_token('test', 'a', now=0), 0)
+            self.assertEqual(throttling.take_token('test', 'a', now=0), 0)
+            self.assertEqual(throttling.take_token('test', 'a', now=0), 30)
+            self.assertEqual(throttling.take_token('test', 'b', now=0), 0)
+            self.assertEqual(throttling.take_token('test', 'a', now=30), 0)
+            self.assertEqual(throttling.take_token('test', 'a', now=45), 15)
+
+    @mock.patch.dict(throttling.settings.THROTTLE_RATES, {'bookings_ip': '2/min', 'bookings_guest': None})
+    def test_ip_bucket_answers_429_with_retry_after(self):
+        self.assertEqual([self.post_booking(index).status_code for index in range(3)], [200, 200, 429])
+        response = self.post_booking(3)
+        self.assertEqual(int(response['Retry-After']), 30)
+        # Reads are not throttled
+        self.assertEqual(self.client.get(reverse('bookings-list')).status_code, 200)
+
+        metrics = self.client.get(reverse('metrics')).content.decode()
+        self.assertRegex(metrics, r'throttle_rejections_total\{scope="bookings_ip"\} [1-9]')
+        self.assertIn('throttle_rate_per_second{scope="bookings_ip"} 0.0333', metrics)
+
+    @mock.patch.dict(throttling.settings.THROTTLE_RATES, {'bookings_ip': '2/min', 'bookings_guest': None})
+    def test_forged_forwarded_for_does_not_reset_ip_bucket(self):
+        statuses = [
+            self.client.post(reverse('bookings-list'), booking_payload(check_in_offset=10 + 3 * index),
+                             HTTP_X_FORWARDED_FOR=f'10.0.0.{index}').status_code
+            for index in range(3)
+        ]
+        self.assertEqual(statuses[2], 429)
+
+    @mock.patch.dict(throttling.settings.THROTTLE_RATES, {'reviews_ip': None, 'reviews_guest': '1/hour'})
+    def test_guest_bucket_counts_phone_and_email(self):
+        review = {'guestPhone': '9000000000', 'rating': 4}
+        self.assertEqual(self.client.post(reverse('reviews-list'), review).status_code, 200)
+        self.assertEqual(self.client.post(reverse('reviews-list'), review).status_code, 429)
+
+        with mock.patch.dict(throttling.settings.THROTTLE_RATES, {'bookings_ip': None, 'bookings_guest': '1/hour'}):
+            self.assertEqual(self.post_booking(0, guestEmail='Repeat@example.com').status_code, 200)
+            self.assertEqual(self.post_booking(1, guestEmail='repeat@example.com ').status_code, 429)
+        self.assertEqual(Reviews.objects.count(), 1)
+
+    @mock.patch.object(admission.settings, 'MEDIA_PROCESSING_MAX_PENDING', 1)
+    def test_full_compression_pool_turns_reviews_away(self):
+        self.assertTrue(admission.media_processing.try_enter())
+        self.addCleanup(admission.media_processing.leave)
+
+        response = self.client.post(reverse('reviews-list'), {'guestPhone': '9000000000', 'rating': 4})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(admission.settings.ADMISSION_RETRY_AFTER))
+        self.assertFalse(Reviews.objects.exists())
+        self.assertIn('admission_in_flight{gate="media_processing"} 1',
+                      self.client.get(reverse('metrics')).content.decode())
+
+    @mock.patch.object(admission.settings, 'MEDIA_PROCESSING_MAX_PENDING', 1)
+    @mock.patch.object(media_processing.settings, 'MEDIA_PROCESSING_MODE', 'pool')
+    def test_uploads_past_the_limit_stay_pending(self):
+        review = Reviews.objects.create(reviewDate=date.today(), rating=5)
+        media_entry = ReviewsMedia.objects.create(reviewId=review, mediaType='image/jpeg', mediaName='a.jpg',
+                                                  processingStatus=ReviewsMedia.PENDING)
+        self.assertTrue(admission.media_processing.try_enter())
+        self.addCleanup(admission.media_processing.leave)
+
+        with mock.patch.object(media_processing, 'get_executor') as get_executor:
+            media_processing.submit([media_entry.mediaId])
+        get_executor.assert_not_called()
+        media_entry.refresh_from_db()
+        self.assertEqual(media_entry.processingStatus, ReviewsMedia.PENDING)
+
+    @mock.patch.object(admission.settings, 'OUTBOX_MAX_PENDING', 2)
+    def test_outbox_backlog_turns_bookings_away(self):
+        OutboundEmail.objects.bulk_create([OutboundEmail(subject='s', body='b', fromEmail='f') for _ in range(2)])
+        with self.assertNumQueries(1):
+            response = self.post_booking(0)
+        self.assertEqual(response.status_code, 503)
+        self.assertRegex(self.client.get(reverse('metrics')).content.decode(),
+                         r'admission_rejections_total\{gate="email"\} [1-9]')
+
+
+class StartupBudgetTests(SimpleTestCase):
+
+    def test_cold_start_stays_within_budget(self):
+        report = startup.profile(repeat=1, top=5)
+        self.assertEqual(startup.budget_problems(report), [])
+        self.assertIn('django', report['packages_ms'])
+        self.assertIn('FarmHouse_Website.views', report['project_modules_ms'])
+
+    def test_budget_problems_name_eager_modules(self):
+        report = {'median_ms': {'total_ms': 900.0}, 'budget_ms': 500, 'eager_modules': ['PIL']}
+        self.assertEqual(startup.budget_problems(report), [
+            'startup took 900.0 ms, over the 500 ms budget',
+            'imported at startup instead of on first use: PIL',
+        ])
+
+    def test_parse_importtime(self):
+        output = ('import time: self [us] | cumulative | imported package\n'
+                  'import time:       120 |        120 |   PIL._version\n'
+                  'import time:       300 |        420 | PIL\n')
+        self.assertEqual(startup.parse_importtime(output), [('PIL._version', 1, 120, 120), ('PIL', 0, 300, 420)])
+
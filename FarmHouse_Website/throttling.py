@@ -0,0 +1,107 @@
+"""
+Token-bucket throttling of the booking and review writes.
+
+Every client IP, and every guest phone number and email address found in
+the request body, has a bucket per scope in the shared THROTTLE_CACHE_ALIAS
+cache, so the limits hold across worker processes. A bucket holds up to N
+tokens for a rate of 'N/period' and refills evenly over the period; each
+request takes a token, and a request finding a bucket empty gets a 429 with
+Retry-After. Two racing requests on the same bucket may both get its last
+token: the cache offers no compare-and-set.
+"""
+import hashlib
+import time
+
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from FarmHouse_Website_Backend import settings
+from . import instrumentation
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+THROTTLE_REJECTIONS = instrumentation.register(instrumentation.Counter(
+    'throttle_rejections_total', 'Requests rejected with 429 by a token bucket.', ('scope',)))
+
+
+def get_cache():
+    return caches[settings.THROTTLE_CACHE_ALIAS]
+
+
+def parse_rate(rate):
+    """
+    '10/min' -> (10, 60.0): bucket capacity and refill period in seconds.
+    None for a disabled (None or empty) rate.
+    """
+    if not rate:
+        return None
+    count, period = rate.split('/')
+    return int(count), float(PERIODS[period[0]])
+
+
+def collect_limits():
+    limits = {}
+    for scope, rate in settings.THROTTLE_RATES.items():
+        parsed = parse_rate(rate)
+        if parsed is not None:
+            limits[(scope,)] = parsed[0] / parsed[1]
+    return limits
+
+
+THROTTLE_RATE = instrumentation.register(instrumentation.Gauge(
+    'throttle_rate_per_second', 'Configured refill rate of the token buckets.', ('scope',), collect=collect_limits))
+
+
+def take_token(scope, ident, now=None):
+    """
+    Take a token from the bucket of `ident` in `scope`. Returns 0 when one
+    was available, otherwise the seconds until the next token.
+    """
+    parsed = parse_rate(settings.THROTTLE_RATES.get(scope))
+    if parsed is None:
+        return 0
+    capacity, period = parsed
+    refill_per_second = capacity / period
+    now = time.time() if now is None else now
+
+    cache = get_cache()
+    key = f'throttle:{scope}:{hashlib.md5(ident.encode()).hexdigest()}'
+    tokens, updated_at = cache.get(key) or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated_at) * refill_per_second)
+    if tokens < 1:
+        return (1 - tokens) / refill_per_second
+    # A bucket left alone for a full period is full again: let it expire
+    cache.set(key, (tokens - 1, now), int(period) + 1)
+    return 0
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttles the views' `create` action in the `<throttle_scope>_ip` and
+    `<throttle_scope>_guest` scopes of THROTTLE_RATES.
+    """
+    guest_fields = ('guestPhone', 'guestEmail')
+
+    def __init__(self):
+        self.wait_seconds = None
+        self.scope = None
+
+    def get_buckets(self, request, view):
+        yield f'{view.throttle_scope}_ip', self.get_ident(request)
+        # Only read once the IP bucket let the request in: this parses the body
+        for field in self.guest_fields:
+            value = str(request.data.get(field, '')).strip().lower()
+            if value:
+                yield f'{view.throttle_scope}_guest', f'{field}:{value}'
+
+    def allow_request(self, request, view):
+        for scope, ident in self.get_buckets(request, view):
+            wait = take_token(scope, ident)
+            if wait:
+                self.scope, self.wait_seconds = scope, wait
+                THROTTLE_REJECTIONS.inc(scope=scope)
+                return False
+        return True
+
+    def wait(self):
+        return self.wait_seconds
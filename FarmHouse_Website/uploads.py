@@ -0,0 +1,71 @@
+import hashlib
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException, UnsupportedMediaType
+
+from FarmHouse_Website_Backend import settings
+from . import media_processing
+
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Upload too large.'
+    default_code = 'request_too_large'
+
+
+class MediaUploadHandler(TemporaryFileUploadHandler):
+    """
+    Spools every uploaded file to a temporary file chunk by chunk, hashing it
+    and sniffing its type on the way, so a request never holds a whole upload
+    in memory. Oversized or unsupported uploads are rejected as soon as they
+    are detected instead of after the body has been read.
+
+    Completed files carry `sha256` and `sniffed_type` attributes.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > settings.MEDIA_UPLOAD_MAX_REQUEST_SIZE:
+            raise RequestTooLarge()
+        self.request_size = 0
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+        self.header = b''
+        self.sniffed_type = None
+
+    def receive_data_chunk(self, raw_data, start):
+        # Content-Length can be absent (chunked transfer), so count as we go
+        self.request_size += len(raw_data)
+        if start + len(raw_data) > settings.MEDIA_UPLOAD_MAX_FILE_SIZE:
+            self.reject(RequestTooLarge(f'{self.file_name} is larger than {settings.MEDIA_UPLOAD_MAX_FILE_SIZE} bytes.'))
+        if self.request_size > settings.MEDIA_UPLOAD_MAX_REQUEST_SIZE:
+            self.reject(RequestTooLarge())
+
+        if self.sniffed_type is None and len(self.header) < media_processing.SNIFF_LENGTH:
+            self.header += raw_data[:media_processing.SNIFF_LENGTH - len(self.header)]
+            if len(self.header) == media_processing.SNIFF_LENGTH:
+                self.sniff()
+
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def sniff(self):
+        self.sniffed_type = media_processing.sniff_media_type(self.header)
+        if self.sniffed_type is None:
+            self.reject(UnsupportedMediaType(self.content_type, f'{self.file_name} is not a supported image or video.'))
+
+    def reject(self, exc):
+        # The parser only closes completed files; drop the partial one now
+        self.file.close()
+        raise exc
+
+    def file_complete(self, file_size):
+        if self.sniffed_type is None:
+            # Shorter than SNIFF_LENGTH
+            self.sniff()
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.sha256 = self.digest.hexdigest()
+        uploaded_file.sniffed_type = self.sniffed_type
+        return uploaded_file
@@ -1,7 +1,9 @@
-from .views import *
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from FarmHouse_Website import async_views, instrumentation
+from FarmHouse_Website.views import AvailabilityView, BookingViewSet, MenuViewSet, ReviewsViewSet
+
 router = DefaultRouter()
 router.register(r'bookings', BookingViewSet)
 router.register(r'menu', MenuViewSet)
@@ -11,5 +13,15 @@ baseUrl = 'NirmalFarms/api'
 
 urlpatterns = [
     path(f'{baseUrl}/', include(router.urls)),
+    path(f'{baseUrl}/availability/', AvailabilityView.as_view(), name='availability'),
+    path('metrics', instrumentation.metrics_view, name='metrics'),
+
+    # Async twins of the read-heavy endpoints, for the ASGI application
+    path(f'{baseUrl}/async/menu/', async_views.menu_list, name='async-menu-list'),
+    path(f'{baseUrl}/async/reviews/', async_views.reviews_list, name='async-reviews-list'),
+    path(f'{baseUrl}/async/reviews/<int:pk>/', async_views.review_detail, name='async-reviews-detail'),
+    path(f'{baseUrl}/async/reviews/<int:pk>/media/<int:mediaId>/', async_views.review_media,
+         name='async-reviews-media'),
+    path(f'{baseUrl}/async/availability/', async_views.availability_view, name='async-availability'),
     # path(f'{baseUrl}/otpverification/', Authorization.as_view(), name="otp_verification")
 ]
@@ -1,45 +1,60 @@
 import base64
+import logging
 import random
 from datetime import datetime, timedelta
 
-from django.core.mail import EmailMessage
-from django.db.models import Q
+from django.core.mail import EmailMessage, get_connection
+from django.db.models.functions import Length
+from django.urls import reverse
 
 from FarmHouse_Website_Backend import settings
-from . import compressor
+from . import availability, instrumentation, media_processing, outbox, response_cache, storage
 from .models import Bookings, ReviewsMedia
 
+logger = logging.getLogger(__name__)
+
 def check_booking_availability(check_in_date, check_out_date, exclude_booking_id=None):
     """
     Check if dates are available for booking.
-    Returns (is_available: bool, conflicting_bookings: QuerySet)
+    Returns (has_conflicts: bool, conflicting_bookings: list)
     """
-    # Look for any confirmed bookings that overlap with the requested period
-    conflicts_query = Bookings.objects.filter(
-        Q(paymentStatus="PAID") &
-        (
-            # Case 1: A booking that starts during the requested period
-                (Q(checkInDate__gte=check_in_date) & Q(checkInDate__lt=check_out_date)) |
-                # Case 2: A booking that ends during the requested period
-                (Q(checkOutDate__gt=check_in_date) & Q(checkOutDate__lte=check_out_date)) |
-                # Case 3: A booking that completely spans the requested period
-                (Q(checkInDate__lte=check_in_date) & Q(checkOutDate__gte=check_out_date))
-        )
-    )
+    if settings.BOOKING_AVAILABILITY_CACHE:
+        conflicts = availability.paid_stays.conflicts(check_in_date, check_out_date, exclude_booking_id)
+        if conflicts is not None:
+            return len(conflicts) != 0, conflicts
 
-    # Exclude current booking if updating existing booking
-    if exclude_booking_id:
-        conflicts_query = conflicts_query.exclude(bookingId=exclude_booking_id)
+    conflicts = query_booking_conflicts(check_in_date, check_out_date, exclude_booking_id)
+    return len(conflicts) != 0, conflicts
+
+
+def query_booking_conflicts(check_in_date, check_out_date, exclude_booking_id=None):
+    """
+    Fetch the PAID bookings overlapping the requested stay from the database.
+    """
+    conflicts_query = booking_conflicts_queryset(check_in_date, check_out_date, exclude_booking_id)
 
     conflicts = []
 
-    for booking in conflicts_query.order_by('checkInDate'):
+    for check_in, check_out in conflicts_query.order_by('checkInDate').values_list('checkInDate', 'checkOutDate'):
         conflicts.append({
-            'start': booking.checkInDate,
-            'end': booking.checkOutDate
+            'start': check_in,
+            'end': check_out
         })
 
-    return len(conflicts) != 0, conflicts
+    return conflicts
+
+def booking_conflicts_queryset(check_in_date, check_out_date, exclude_booking_id=None):
+    # Two stays overlap when each one starts before the other ends
+    conflicts_query = Bookings.objects.filter(
+        paymentStatus="PAID",
+        checkInDate__lt=check_out_date,
+        checkOutDate__gt=check_in_date,
+    )
+
+    # Exclude current booking if updating existing booking
+    if exclude_booking_id:
+        conflicts_query = conflicts_query.exclude(bookingId=exclude_booking_id)
+    return conflicts_query
 
 def validate_booking_dates(check_in_date, check_out_date):
     """
@@ -80,57 +95,115 @@ def validate_booking_dates(check_in_date, check_out_date):
 def get_encoded_media(media):
     encoded_media = None
 
-    if media.name.endswith('.jpg') or media.name.endswith('.png') or media.name.endswith('.jpeg'):
-        if media.size >= settings.MAX_UPLOAD_SIZE():
-            encoded_media = compressor.compressImageWithBestQuality(media.read())
-        else:
-            encoded_media = media.read()
-    elif media.name.endswith('.mp4'):
-        if media.size >= settings.MAX_UPLOAD_SIZE():
-            encoded_media = compressor.compress_video_under_10mb(media.read())
-        else:
-            encoded_media = media.read()
+    media_bytes = media.read()
+    media_type = media_processing.sniff_media_type(media_bytes[:media_processing.SNIFF_LENGTH])
+    if media_type is not None:
+        encoded_media = media_processing.compress_media(media_bytes, media_type)
 
     return encoded_media
 
 
 def setMedia(media_list, review):
+    """
+    Store the raw uploads of a review and queue them for background compression.
+    Uploads parsed by uploads.MediaUploadHandler are already hashed and sniffed.
+    """
     try:
+        media_entries = []
         for media in media_list:
-            ReviewsMedia.objects.create(reviewId=review, mediaType=media.content_type, media=get_encoded_media(media), mediaName = media.name)
-
+            media_type = getattr(media, 'sniffed_type', None) or media.content_type
+            media_file, media_size = storage.save_media_file(media, getattr(media, 'sha256', None))
+            media_entries.append(ReviewsMedia(reviewId=review, mediaType=media_type, mediaFile=media_file,
+                                              mediaSize=media_size, mediaName=media.name,
+                                              processingStatus=ReviewsMedia.PENDING))
+
+        media_entries = ReviewsMedia.objects.bulk_create(media_entries)
+        media_ids = [media_entry.mediaId for media_entry in media_entries]
+        if None in media_ids:
+            # MySQL does not return the primary keys of bulk inserts
+            media_ids = list(ReviewsMedia.objects.filter(reviewId=review).values_list('mediaId', flat=True))
+        # bulk_create sends no post_save
+        response_cache.invalidate_on_commit('reviews')
+
+        media_processing.submit_on_commit(media_ids)
         return True
-    except Exception as e:
-        print(e)
+    except Exception:
+        logger.exception('could not store review media')
         return False
 
 def getMedia(review_id):
-    media_list = []
+    return loadReviewsMedia([review_id], inline=True).get(review_id, [])
+
+
+def loadReviewsMedia(review_ids, request=None, inline=False):
+    """
+    Load the media of several reviews in a single query.
+    Returns {review_id: [media entries]}. Metadata entries never pull the blob
+    column and carry a URL to the streaming media endpoint; inline entries keep
+    the legacy base64 shape.
+    """
+    media_map = {review_id: [] for review_id in review_ids}
+    if not media_map:
+        return media_map
+
+    media_entries = ReviewsMedia.objects.filter(reviewId__in=media_map.keys()).order_by('mediaId')
+    if inline:
+        media_entries = media_entries.only('mediaId', 'reviewId', 'mediaName', 'mediaType', 'media', 'mediaFile')
+    else:
+        media_entries = mediaMetadataQueryset(media_entries)
+
     try:
-        media_entries = ReviewsMedia.objects.filter(reviewId=review_id)
         for media_entry in media_entries:
-            media_list.append(
-                {
-                    'media_name' : media_entry.mediaName,
+            if inline:
+                entry = {
+                    'media_name': media_entry.mediaName,
                     'media_type': media_entry.mediaType,
-                    'media' : base64.b64encode(media_entry.media).decode('utf-8')
+                    'media': base64.b64encode(storage.read_media(media_entry)).decode('utf-8')
                 }
-            )
-    except Exception as e:
-        print(e)
-        media_list.append('Some error occured.')
-    finally:
-        return media_list
+            else:
+                entry = mediaMetadataEntry(media_entry, request)
+            media_map[media_entry.reviewId_id].append(entry)
+    except Exception:
+        logger.exception('could not load review media')
+        for media_list in media_map.values():
+            media_list.append('Some error occured.')
 
+    return media_map
 
-def sendConfirmationEmail(receiver, name, checkin, checkout, phone):
 
-    try:
-        print("Sending to:", receiver)
+def mediaMetadataQueryset(media_entries):
+    # Never pulls the blob column, only its length
+    return media_entries.defer('media').annotate(media_size=Length('media'))
+
 
-        email1 = EmailMessage(
-            subject="🏨 Booking Confirmation – Nirmal Farms",
-            body=f""""Dear {name},
+def mediaMetadataEntry(media_entry, request, route='reviews-media'):
+    """
+    Metadata of one media entry loaded through mediaMetadataQueryset, with
+    the URL of the `route` streaming endpoint.
+    """
+    entry = {
+        'media_id': media_entry.mediaId,
+        'media_name': media_entry.mediaName,
+        'media_type': media_entry.mediaType,
+        'media_size': media_entry.mediaSize or media_entry.media_size,
+        'processing_status': media_entry.processingStatus,
+        'media_url': request.build_absolute_uri(
+            reverse(route, kwargs={'pk': media_entry.reviewId_id, 'mediaId': media_entry.mediaId})
+        ),
+    }
+    if media_processing.is_image(media_entry.mediaType):
+        # Falls back to the original until the variants are rendered
+        entry['thumbnail_url'] = entry['media_url'] + '?size=thumb'
+    return entry
+
+
+def buildConfirmationEmails(receiver, name, checkin, checkout, phone):
+    """
+    Build the guest confirmation and the staff notification for a booking.
+    """
+    email1 = EmailMessage(
+        subject="🏨 Booking Confirmation – Nirmal Farms",
+        body=f""""Dear {name},
 
                     We are delighted to inform you that your booking at Nirmal Farms has been successfully confirmed! 🌿
 
@@ -146,25 +219,44 @@ def sendConfirmationEmail(receiver, name, checkin, checkout, phone):
                     The Nirmal Farms Team
                     📞 9870204394
                     📞 9870204424""",
-            from_email=settings.EMAIL_HOST_USER,
-            to=[receiver]
-        )
+        from_email=settings.EMAIL_HOST_USER,
+        to=[receiver]
+    )
 
-        email2 = EmailMessage(
-            subject="🏨 New Booking Request - Nirmal Farms",
-            body=f""""Name : {name},
+    email2 = EmailMessage(
+        subject="🏨 New Booking Request - Nirmal Farms",
+        body=f""""Name : {name},
                       gmail : {receiver},
                       phone number : {phone},
                       checkin date : {checkin},
                       checkout dat e: {checkout}""",
-            from_email=settings.EMAIL_HOST_USER,
-            to=[settings.EMAIL_HOST_USER]
-        )
-        
-        if email1.send(fail_silently=False) and email2.send(fail_silently=False):
-            print("email sent")
+        from_email=settings.EMAIL_HOST_USER,
+        to=[settings.EMAIL_HOST_USER]
+    )
+
+    return [email1, email2]
+
+
+def queueConfirmationEmail(receiver, name, checkin, checkout, phone):
+    """
+    Queue the booking emails in the outbox. Call inside the booking's
+    transaction so the emails exist if and only if the booking does.
+    """
+    return outbox.enqueue(buildConfirmationEmails(receiver, name, checkin, checkout, phone))
+
+
+def sendConfirmationEmail(receiver, name, checkin, checkout, phone):
+
+    try:
+        logger.info('sending confirmation email to %s', receiver)
+
+        emails = buildConfirmationEmails(receiver, name, checkin, checkout, phone)
+        with instrumentation.phase('email'):
+            sent = get_connection(fail_silently=False).send_messages(emails)
+        if sent == len(emails):
+            logger.info('confirmation email sent to %s', receiver)
             return True
-        
+
         return False
-    except Exception as e:
-        print(e)
+    except Exception:
+        logger.exception('could not send confirmation email to %s', receiver)
@@ -1,11 +1,41 @@
+import logging
 from datetime import datetime, date
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from FarmHouse_Website.serializer import *
+from rest_framework.views import APIView
+from django.db.models import Count, Max
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from FarmHouse_Website import (admission, availability, booking_transfer, compressor, locking, menu_catalog,
+                               response_cache, review_summary, storage, streaming, uploads, utils)
+from FarmHouse_Website.filters import MenuFilter
+from FarmHouse_Website.models import Bookings, Menu, Reviews, ReviewsMedia, ReviewsMediaVariant
+from FarmHouse_Website.serializer import (BookingsSerializer, BookingsValuesSerializer, MenuSerializer,
+                                          MenuValuesSerializer, ReviewsSerializer, ReviewsValuesSerializer)
+from FarmHouse_Website.mixins import (ConditionalGetMixin, SparseFieldsetMixin, ValuesListMixin, WriteLimitsMixin,
+                                      sparse_queryset)
+from FarmHouse_Website.pagination import BookingsCursorPagination, MenuCursorPagination, ReviewsCursorPagination
 
-class BookingViewSet(viewsets.ModelViewSet):
+logger = logging.getLogger(__name__)
+
+class BookingViewSet(ConditionalGetMixin, SparseFieldsetMixin, ValuesListMixin, WriteLimitsMixin,
+                     viewsets.ModelViewSet):
     queryset = Bookings.objects.all()
     serializer_class = BookingsSerializer
+    values_serializer_class = BookingsValuesSerializer
+    throttle_scope = 'bookings'
+    admission_gates = (admission.email,)
+    pagination_class = BookingsCursorPagination
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['bookingId', 'checkInDate']
+    ordering = ['bookingId']
+    always_select_fields = ('checkInDate',)
 
     def create(self, request, *args, **kwargs):
 
@@ -16,7 +46,7 @@ class BookingViewSet(viewsets.ModelViewSet):
             check_out_date = serializer.validated_data['checkOutDate']
 
             validity_status, message = utils.validate_booking_dates(check_in_date, check_out_date)
-            print(message)
+            logger.info('booking date check: %s', message)
 
             if not validity_status:
                 return Response({'error': message}, status=status.HTTP_406_NOT_ACCEPTABLE)
@@ -26,58 +56,260 @@ class BookingViewSet(viewsets.ModelViewSet):
                 return Response(data=conflicts, status=status.HTTP_409_CONFLICT)
 
             serializer.validated_data['bookingDate'] = date.today()
-            confirmed_booking = serializer.save()
-            if  confirmed_booking :
-                if utils.sendConfirmationEmail(confirmed_booking.guestEmail,confirmed_booking.guestName ,confirmed_booking.checkInDate, confirmed_booking.checkOutDate, confirmed_booking.guestPhone) :
-                    return Response(serializer.data, status=status.HTTP_200_OK)
-                else :
-                    return Response("Error sending confirmation email", status = status.HTTP_500_INTERNAL_SERVER_ERROR)
+            with locking.locked_stay(check_in_date, check_out_date):
+                # Re-check against the database now that no overlapping booking can commit
+                conflicts = utils.query_booking_conflicts(check_in_date, check_out_date)
+                if conflicts:
+                    return Response(data=conflicts, status=status.HTTP_409_CONFLICT)
+
+                confirmed_booking = serializer.save()
+                utils.queueConfirmationEmail(confirmed_booking.guestEmail, confirmed_booking.guestName, confirmed_booking.checkInDate, confirmed_booking.checkOutDate, confirmed_booking.guestPhone)
+            return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
 
-class MenuViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser],
+            renderer_classes=[streaming.CSVRenderer, streaming.NDJSONRenderer])
+    def export(self, request):
+        # ?format=csv|ndjson, CSV by default
+        export_format = request.accepted_renderer.format
+        response = StreamingHttpResponse(booking_transfer.export_bookings(Bookings.objects.all(), export_format),
+                                         content_type=request.accepted_renderer.media_type)
+        response['Content-Disposition'] = f'attachment; filename="bookings.{export_format}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsAdminUser])
+    def import_bookings(self, request):
+        # A multipart `file` ending in .csv, .ndjson or .jsonl; ?dry_run=true only validates
+        upload = request.FILES.get('file')
+        import_format = booking_transfer.detect_format(upload.name) if upload else None
+        if import_format is None:
+            return Response({'error': 'Upload a .csv, .ndjson or .jsonl file as `file`.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = request.query_params.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        lines = (line.decode('utf-8-sig') for line in upload)
+        report = booking_transfer.import_bookings(booking_transfer.read_records(lines, import_format), dry_run)
+        logger.info('booking import: rows=%s created=%s errors=%s', report['rows'], report['created'],
+                    len(report['errors']))
+        return Response(report, status=status.HTTP_200_OK)
+
+class MenuViewSet(ConditionalGetMixin, SparseFieldsetMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Menu.objects.all()
     serializer_class = MenuSerializer
+    values_serializer_class = MenuValuesSerializer
+    pagination_class = MenuCursorPagination
+    filter_backends = [MenuFilter]
+
+    @response_cache.cached_list('menu')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @action(detail=False, methods=['get'])
+    def catalog(self, request):
+        """
+        The whole menu grouped by category, from the in-process snapshot of
+        the current menu version.
+        """
+        snapshot = menu_catalog.catalog.get()
+        response = HttpResponse(snapshot.content, content_type='application/json')
+        response['ETag'] = snapshot.etag
+        response['Last-Modified'] = http_date(snapshot.last_modified)
+        response['Cache-Control'] = 'no-cache'
+        return get_conditional_response(request, etag=snapshot.etag, last_modified=snapshot.last_modified,
+                                        response=response)
+
+def requested_variant(query_params, headers):
+    """
+    The (size, format) image derivative picked by ?size=thumb|medium|full, or
+    None for the original. WebP when the client accepts it, JPEG otherwise,
+    unless ?variant_format=webp|jpeg names one (not ?format=, which DRF
+    reads as a renderer choice and answers with 404).
+    """
+    size = query_params.get('size')
+    if size not in compressor.IMAGE_VARIANT_SIZES:
+        return None
+    variant_format = query_params.get('variant_format')
+    if variant_format not in compressor.IMAGE_VARIANT_FORMATS:
+        variant_format = 'webp' if 'image/webp' in headers.get('Accept', '') else 'jpeg'
+    return size, variant_format
 
-class ReviewsViewSet(viewsets.ModelViewSet):
+
+def review_media_aggregates():
+    """
+    Validator aggregates covering the media of the reviews: uploads, deletions
+    and processing status changes, computed in the reviews' own query.
+    """
+    return {'count': Count('pk', distinct=True), 'media_max_pk': Max('reviewsmedia__mediaId'),
+            'media_count': Count('reviewsmedia'), 'media_last_modified': Max('reviewsmedia__updatedAt')}
+
+
+# Pagination orders by reviewDate; the stay dates come from the joined booking
+REVIEW_SELECT_FIELDS = ('reviewDate', 'bookingId', 'bookingId__checkInDate', 'bookingId__checkOutDate')
+
+
+def review_queryset(queryset, requested_fields):
+    """
+    Reviews with the stay dates of their booking joined in the same query,
+    restricted to the requested fields (all of them by default).
+    """
+    if requested_fields and 'stay' not in requested_fields:
+        return sparse_queryset(queryset, requested_fields, ('reviewDate',))
+    review_fields = requested_fields or {field.name for field in Reviews._meta.concrete_fields}
+    return sparse_queryset(queryset.select_related('bookingId'), review_fields, REVIEW_SELECT_FIELDS)
+
+
+class ReviewsViewSet(ConditionalGetMixin, SparseFieldsetMixin, ValuesListMixin, WriteLimitsMixin,
+                     viewsets.ModelViewSet):
     queryset = Reviews.objects.all()
     serializer_class = ReviewsSerializer
+    values_serializer_class = ReviewsValuesSerializer
+    throttle_scope = 'reviews'
+    admission_gates = (admission.media_processing,)
+    pagination_class = ReviewsCursorPagination
+
+    def get_queryset(self):
+        return review_queryset(self.queryset.all(), self.get_requested_fields())
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Must be set before the body is parsed
+        request.upload_handlers = [uploads.MediaUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
 
         if serializer.is_valid(raise_exception=True):
-
-            if not Bookings.objects.filter(guestPhone = request.data['guestPhone']).exists():
+            # The guest's latest booking, from the guestPhone index
+            booking = Bookings.objects.filter(guestPhone=request.data.get('guestPhone')) \
+                .order_by('-bookingId').only('bookingId').first()
+            if booking is None:
                 return Response(status=status.HTTP_406_NOT_ACCEPTABLE)
 
             try:
-                serializer.validated_data['bookingId'] = Bookings.objects.filter(guestPhone=request.data['guestPhone']).last().bookingId
-                serializer.validated_data['reviewDate'] = datetime.today()
-                saved_review = serializer.save()
-                
-                if utils.setMedia(media_list=request.FILES.getlist('media_list'),
-                    review=Reviews.objects.get(reviewId=saved_review.reviewId)):
+                saved_review = serializer.save(bookingId=booking, reviewDate=datetime.today())
+
+                if utils.setMedia(media_list=request.FILES.getlist('media_list'), review=saved_review):
                     return Response(status=status.HTTP_200_OK)
                 else:
                     return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            except Exception as e:
-                print(e)
+            except Exception:
+                logger.exception('could not save review')
                 return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
                 
+    @response_cache.cached_list('reviews')
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = ReviewsSerializer(queryset, many=True)
-        reviews = serializer.data
+        values_serializer = self.get_values_serializer()
+        queryset = values_serializer.values(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        rows = list(page if page is not None else queryset)
+        reviews = values_serializer.serialize(rows)
 
-        for review in reviews:
-            review['media_list'] = utils.getMedia(review['reviewId'])
+        if self.wants_media():
+            media_map = self.load_media(request, [row['reviewId'] for row in rows])
+            for review, row in zip(reviews, rows):
+                review['media_list'] = media_map[row['reviewId']]
 
+        if page is not None:
+            return self.get_paginated_response(reviews)
         return Response(data=reviews, status=status.HTTP_200_OK)
 
     def retrieve(self, request, *args, **kwargs):
-        queryset = self.get_queryset().get(reviewId=kwargs.get('pk'))
-        serializer = ReviewsSerializer(queryset, many=False)
+        instance = self.get_queryset().get(reviewId=kwargs.get('pk'))
+        serializer = self.get_serializer(instance, many=False)
         review = serializer.data
-        review['media_list'] = utils.getMedia(review['reviewId'])
+        if self.wants_media():
+            review['media_list'] = self.load_media(request, [instance.reviewId])[instance.reviewId]
         return Response(data=review, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    @response_cache.cached_list('reviews')
+    def summary(self, request):
+        """
+        Review count, average rating and histogram per star, read from the
+        precomputed ReviewSummary row.
+        """
+        return Response(review_summary.summary_payload(review_summary.get_summary()))
+
+    @action(detail=False, methods=['get'])
+    @response_cache.cached_list('reviews')
+    def top(self, request):
+        """
+        The latest ?limit= reviews rated at least ?min_rating=, each with the
+        URL of its first image's thumbnail.
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', review_summary.TOP_REVIEWS_LIMIT)),
+                        review_summary.TOP_REVIEWS_MAX_LIMIT)
+            min_rating = request.query_params.get('min_rating')
+            min_rating = int(min_rating) if min_rating else None
+        except ValueError:
+            return Response({'error': 'limit and min_rating must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'limit must be positive.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(review_summary.top_reviews(request, limit, min_rating))
+
+    @action(detail=True, methods=['get'], url_path=r'media/(?P<mediaId>[0-9]+)', url_name='media',
+            renderer_classes=[JSONRenderer, streaming.PassthroughRenderer])
+    def media(self, request, pk=None, mediaId=None):
+        variant = requested_variant(request.query_params, request.headers)
+        if variant is not None:
+            size, variant_format = variant
+            variant = ReviewsMediaVariant.objects.filter(
+                mediaId__reviewId=pk, mediaId=mediaId, variantSize=size, variantFormat=variant_format
+            ).only('variantFile').first()
+            if variant is not None:
+                name = variant.variantFile.name
+                file_obj, size, etag = storage.open_blob(name)
+                response = self.stream_media(request, file_obj, size, f'image/{variant_format}', etag, name)
+                patch_vary_headers(response, ['Accept'])
+                return response
+
+        media_entry = get_object_or_404(ReviewsMedia, reviewId=pk, mediaId=mediaId)
+        file_obj, size, etag = storage.open_media(media_entry)
+        return self.stream_media(request, file_obj, size, media_entry.mediaType or 'application/octet-stream', etag,
+                                 media_entry.mediaFile.name)
+
+    def stream_media(self, request, file_obj, size, content_type, etag, name=None):
+        return streaming.media_response(request, file_obj, size, content_type, etag, name)
+
+    def get_validator_aggregates(self):
+        aggregates = super().get_validator_aggregates()
+        if self.wants_media():
+            aggregates.update(review_media_aggregates())
+        return aggregates
+
+    def wants_media(self):
+        requested_fields = self.get_requested_fields()
+        return not requested_fields or 'media_list' in requested_fields
+
+    def load_media(self, request, review_ids):
+        # ?inline_media=true keeps the legacy base64 payload for older clients
+        inline = request.query_params.get('inline_media', '').lower() in ('1', 'true', 'yes')
+        return utils.loadReviewsMedia(review_ids, request=request, inline=inline)
+
+
+class AvailabilityView(APIView):
+    """
+    Booked/free nights between ?from= and ?to= (YYYY-MM-DD, `to` exclusive),
+    defaulting to the next 365 days. Served from the in-process occupancy
+    bitmap and revalidated with ETag.
+    """
+
+    def get(self, request, *args, **kwargs):
+        try:
+            start_date, end_date = availability.calendar_range(request.query_params)
+        except ValueError:
+            return Response({'error': 'Invalid date format. Please use YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        start_date, end_date, bitmap = availability.paid_stays.occupancy(start_date, end_date)
+        etag = availability.calendar_etag(start_date, bitmap)
+
+        if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(availability.calendar_payload(start_date, end_date, bitmap))
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
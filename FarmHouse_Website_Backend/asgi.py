@@ -2,6 +2,13 @@
 ASGI config for FarmHouse_Website_Backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with any ASGI server, e.g.
+
+    uvicorn FarmHouse_Website_Backend.asgi:application --workers 4
+    daphne FarmHouse_Website_Backend.asgi:application
+
+The async views under NirmalFarms/api/async/ then run on the event loop;
+the sync viewsets keep working, each request in a thread.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
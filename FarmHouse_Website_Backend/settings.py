@@ -11,13 +11,17 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
 from pathlib import Path
-from dotenv import load_dotenv
-
-load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Deployments set the environment themselves: python-dotenv is only imported
+# when there is a .env file to read, next to manage.py or at DOTENV_PATH.
+DOTENV_PATH = Path(os.environ.get('DOTENV_PATH', BASE_DIR / '.env'))
+if DOTENV_PATH.is_file():
+    from dotenv import load_dotenv
+    load_dotenv(DOTENV_PATH)
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -44,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware
+    'FarmHouse_Website.instrumentation.InstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -79,20 +85,64 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'FarmHouse_Website_Backend.wsgi.application'
+# Serves the async views under NirmalFarms/api/async/ without a thread per request
+ASGI_APPLICATION = 'FarmHouse_Website_Backend.asgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'manasdev$default',
-        'USER': 'manasdev',
-        'PASSWORD': 'Rajnikant@1',
-        'HOST': 'manasdev.mysql.pythonanywhere-services.com',
-        'PORT': '3306',
+def env_flag(name, default):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes')
+
+# DB_ENGINE=sqlite runs on a local SQLite file (DB_NAME) for offline work
+DB_ENGINE = os.environ.get('DB_ENGINE', 'mysql')
+# > 0 draws MySQL connections from a per-process pool of that many (see FarmHouse_Website/db/pool.py)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Take the write lock when a transaction starts: two deferred
+                # transactions that both read first fail with "database is
+                # locked" when they upgrade to writing, whatever the timeout
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': int(os.environ.get('DB_SQLITE_TIMEOUT', 20)),
+            },
+            # A file, not the in-memory default: threads of the concurrency
+            # tests share it like the workers of a real deployment
+            'TEST': {'NAME': os.environ.get('DB_TEST_NAME', BASE_DIR / 'test_db.sqlite3')},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'FarmHouse_Website.db.mysql_pooled' if DB_POOL_SIZE else 'django.db.backends.mysql',
+            'NAME': os.environ.get('DB_NAME', 'manasdev$default'),
+            'USER': os.environ.get('DB_USER', 'manasdev'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', 'Rajnikant@1'),
+            'HOST': os.environ.get('DB_HOST', 'manasdev.mysql.pythonanywhere-services.com'),
+            'PORT': os.environ.get('DB_PORT', '3306'),
+            # Without the pool, reuse a thread's connection across requests instead
+            # of paying the TCP + auth handshake each time; stay under the server's
+            # wait_timeout. With the pool, always 0: connections go back to the pool
+            # when a request ends, and threads keeping theirs would starve it
+            # (PoolTimeout) as soon as they outnumber DB_POOL_SIZE.
+            'CONN_MAX_AGE': 0 if DB_POOL_SIZE else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            # Ping reused connections once per request so a dropped one is replaced
+            'CONN_HEALTH_CHECKS': env_flag('DB_CONN_HEALTH_CHECKS', 'true'),
+            'POOL': {
+                'SIZE': DB_POOL_SIZE,
+                'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                'MAX_LIFETIME': float(os.environ.get('DB_POOL_MAX_LIFETIME', 240)),
+            },
+            'OPTIONS': {
+                'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 10)),
+            },
+        }
     }
-}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -134,15 +184,114 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Review media is stored content-addressed (SHA-256) outside the database.
+# Swap the 'media_blobs' backend for any Django Storage.
+MEDIA_BLOB_ROOT = os.environ.get('MEDIA_BLOB_ROOT', BASE_DIR / 'media_store')
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    'media_blobs': {
+        'BACKEND': 'FarmHouse_Website.storage.ContentAddressedStorage',
+        'OPTIONS': {
+            'location': MEDIA_BLOB_ROOT,
+        },
+    },
+}
+
+# Stored files that no media row or variant points to any more are deleted,
+# but only once untouched for this long: a request storing the same content
+# may not have committed its row yet (see `manage.py collect_media_blobs`)
+MEDIA_BLOB_GRACE_SECONDS = int(os.environ.get('MEDIA_BLOB_GRACE_SECONDS', 3600))
+
+# Review uploads are spooled to disk (FILE_UPLOAD_TEMP_DIR) and rejected with
+# 413 past these limits, in bytes
+MEDIA_UPLOAD_MAX_FILE_SIZE = int(os.environ.get('MEDIA_UPLOAD_MAX_FILE_SIZE', 200 * 1024 * 1024))
+MEDIA_UPLOAD_MAX_REQUEST_SIZE = int(os.environ.get('MEDIA_UPLOAD_MAX_REQUEST_SIZE', 500 * 1024 * 1024))
+
+# Set to e.g. 'X-Accel-Redirect' to let the web server send media files;
+# MEDIA_SENDFILE_PREFIX is the internal location mapped to MEDIA_BLOB_ROOT
+MEDIA_SENDFILE_HEADER = os.environ.get('MEDIA_SENDFILE_HEADER')
+MEDIA_SENDFILE_PREFIX = os.environ.get('MEDIA_SENDFILE_PREFIX', '/protected-media/')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Local memory by default; set REDIS_URL to share the cache between workers,
+# which also makes response cache invalidation visible to every process
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+# Menu and review listings: cache alias, entry lifetime and how long other
+# requests wait for the one rebuilding an entry (seconds)
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 300
+RESPONSE_CACHE_LOCK_TIMEOUT = 10
+
 REST_FRAMEWORK = {
+    # orjson-backed when orjson is installed (pip install orjson), DRF's own JSON otherwise
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-    ]
+        'FarmHouse_Website.renderers.FastJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'FarmHouse_Website.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Proxies in front of the app that append to X-Forwarded-For. With 0 the
+    # per-IP throttles key on REMOTE_ADDR, never on a header clients can forge
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+}
+
+# Requests slower than this are logged at WARNING; /metrics requires
+# `Authorization: Bearer <METRICS_TOKEN>` when it is set
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', 1.0))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {
+            '()': 'FarmHouse_Website.instrumentation.RequestIdFilter',
+        },
+    },
+    'formatters': {
+        'structured': {
+            'format': 'time=%(asctime)s level=%(levelname)s logger=%(name)s request_id=%(request_id)s %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['request_id'],
+            'formatter': 'structured',
+        },
+    },
+    'loggers': {
+        'FarmHouse_Website': {
+            'handlers': ['console'],
+            'level': os.environ.get('LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
 }
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -152,6 +301,48 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'nirmalfarmsbookingconfirmation@gmail.com'
 EMAIL_HOST_PASSWORD = os.environ.get('APP_PASSWORD')
 
+# Booking emails are queued in the OutboundEmail table and sent by
+# `python manage.py send_queued_emails`
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_BASE_SECONDS = 30
+OUTBOX_MAX_RETRY_DELAY = 3600
+OUTBOX_POLL_INTERVAL = 5
+
+# Answer availability checks from an in-process index of PAID stays instead of
+# querying the database. Other processes' writes become visible within the TTL.
+BOOKING_AVAILABILITY_CACHE = False
+BOOKING_AVAILABILITY_CACHE_TTL = 60
+
+# 'pool': compress uploads in a ProcessPoolExecutor right after the request.
+# 'queue': leave them PENDING for `python manage.py process_media`.
+MEDIA_PROCESSING_MODE = 'pool'
+MEDIA_PROCESSING_WORKERS = 2
+
+# Admission control: past these limits booking and review writes get a 503
+# with Retry-After (seconds). Uploads handed to the compression pool and not
+# finished yet, per process; PENDING emails in the outbox. 0 disables a limit.
+MEDIA_PROCESSING_MAX_PENDING = int(os.environ.get('MEDIA_PROCESSING_MAX_PENDING', 64))
+OUTBOX_MAX_PENDING = int(os.environ.get('OUTBOX_MAX_PENDING', 1000))
+ADMISSION_RETRY_AFTER = 30
+
+# Cold start budget of `python manage.py profile_startup --check` and of the
+# test suite: milliseconds for django.setup() plus the URLconf import, and
+# modules that must only be imported on first use.
+STARTUP_BUDGET_MS = int(os.environ.get('STARTUP_BUDGET_MS', 1500))
+STARTUP_LAZY_MODULES = ['PIL', 'imageio_ffmpeg', 'concurrent.futures.process']
+
+# Token buckets of the booking and review writes (429 with Retry-After when
+# empty), per client IP and per guest phone/email: 'N/period' allows bursts
+# of N refilled evenly over the period; None disables a bucket.
+THROTTLE_CACHE_ALIAS = 'default'
+THROTTLE_RATES = {
+    'bookings_ip': os.environ.get('THROTTLE_BOOKINGS_IP', '20/hour'),
+    'bookings_guest': os.environ.get('THROTTLE_BOOKINGS_GUEST', '5/hour'),
+    'reviews_ip': os.environ.get('THROTTLE_REVIEWS_IP', '20/hour'),
+    'reviews_guest': os.environ.get('THROTTLE_REVIEWS_GUEST', '5/hour'),
+}
+
 
 def MAX_UPLOAD_SIZE():
     return 10485760